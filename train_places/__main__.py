@@ -1,24 +1,130 @@
 """Start telegram and place hunter bots asynchronously.
 
 Both bots needs environment variables, you can find them out
-in bot.py and hunter.py.
+in bot.py and hunter.py. Variables are loaded from .env before bots start.
+
+Modes:
+    all: Telegram bot and place hunter in one process (default).
+    bot: Telegram bot only.
+    hunter: Standalone place hunter workers, they share routes with each other
+            and with hunter of all mode, see hunter/shards.py.
+
+Hunter mode needs environment variables:
+    HUNTER_PROCESSES: Number of hunter worker processes (default = 1).
+
+Examples:
+    $ python3 -m train_places
+    $ python3 -m train_places hunter
 
 """
 
 import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+
 from dotenv import load_dotenv
 
-from .bots.tg_bot import dispatcher, executor
+from .bots.tg_bot import create_dispatcher, executor
+from .hunter.drivers import get_drivers_pool
 from .hunter.hunter import start_searching
+from .hunter.parser import shutdown_parse_executor
+from .hunter.rzd_api import close_session
+from .utils.metrics import start_metrics_server, stop_metrics_server
+from .utils.notifier import close_notifiers
+from .utils.utils import close_db_connection
 
 
 def main():
-    """Start telegram and place hunter bots asynchronously."""
+    """Start bots in mode from command line."""
     load_dotenv()
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'all'
+    if mode == 'all':
+        run_all()
+    elif mode == 'bot':
+        run_bot()
+    elif mode == 'hunter':
+        run_hunter()
+    else:
+        sys.exit(f'Unknown mode {mode}, use all, bot or hunter')
+
+
+def run_all():
+    """Start telegram and place hunter bots asynchronously."""
     place_hunt = asyncio.get_event_loop()
-    place_hunt.create_task(start_searching())
-    executor.start_polling(dispatcher, loop=place_hunt)
-    place_hunt.close()
+    place_hunt.run_until_complete(start_metrics_server())
+    hunting = place_hunt.create_task(start_searching())
+    executor.start_polling(create_dispatcher(), loop=place_hunt)
+    # Stop hunter before shared browsers and connections are released
+    hunting.cancel()
+    try:
+        place_hunt.run_until_complete(hunting)
+    except asyncio.CancelledError:
+        pass
+    shutdown(place_hunt)
+
+
+def run_bot():
+    """Start telegram bot only."""
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(start_metrics_server())
+    executor.start_polling(create_dispatcher(), loop=loop)
+    shutdown(loop)
+
+
+def run_hunter():
+    """Start HUNTER_PROCESSES standalone hunter workers.
+
+    The first worker runs in this process and serves metrics.
+    """
+    worker_id = os.environ.get('HUNTER_WORKER_ID')
+    processes = []
+    for process_index in range(1, int(os.environ.get('HUNTER_PROCESSES', 1))):
+        if worker_id:
+            os.environ['HUNTER_WORKER_ID'] = f'{worker_id}-{process_index}'
+        process = multiprocessing.Process(target=run_hunter_worker, args=(False,))
+        process.start()
+        processes.append(process)
+    if worker_id:
+        os.environ['HUNTER_WORKER_ID'] = worker_id
+    try:
+        run_hunter_worker(serve_metrics=True)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def run_hunter_worker(serve_metrics: bool):
+    """Run place hunter until SIGTERM or SIGINT.
+
+    Args:
+        serve_metrics: Start /metrics endpoint in this process.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    if serve_metrics:
+        loop.run_until_complete(start_metrics_server())
+    hunting = loop.create_task(start_searching())
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, hunting.cancel)
+    try:
+        loop.run_until_complete(hunting)
+    except asyncio.CancelledError:
+        pass
+    shutdown(loop)
+
+
+def shutdown(loop: asyncio.AbstractEventLoop):
+    """Release browsers, parser processes and connections."""
+    get_drivers_pool().close()
+    shutdown_parse_executor()
+    loop.run_until_complete(stop_metrics_server())
+    loop.run_until_complete(close_notifiers())
+    loop.run_until_complete(close_session())
+    loop.run_until_complete(close_db_connection())
+    loop.close()
 
 
 if __name__ == '__main__':
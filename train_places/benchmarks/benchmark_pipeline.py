@@ -0,0 +1,342 @@
+"""Parse-and-check pipeline benchmark.
+
+Every stage of search page processing is timed separately on recorded rzd.ru
+pages from tests and on synthetic pages scaled to hundreds of trains with
+many subscribers per page:
+    check_for_bad_url: Bad url check of fetched page.
+    collect_trains: Train records collection from parsed page.
+    check_trains_data: Whole check of one search (parse included).
+    index_page: Page index build for checks of all page subscribers.
+    check_trains: Checks of all page subscribers on collected trains (index included).
+
+Throughput (operations per second), mean operation time and peak Python
+memory (tracemalloc, lxml tree itself isn't counted) of every stage are
+reported. Results can be saved as baseline, following runs
+are compared with it and stages that became slower or hungrier than
+threshold allows are flagged as regressions. Timings depend on machine, so
+baseline should be saved on the same machine the runs are compared on.
+
+Speed of shared machines changes in seconds, so stage calls are interleaved
+with reference workload, that doesn't depend on project code, and stages are
+compared by relative speed (operations made in time of one reference call).
+Allowed slowdown is widened by noise of stage (spread of its rounds).
+
+Module needs environment variables:
+    PARSE_WORKERS: Number of parser processes (default = 0, pages are parsed
+                   in benchmark process, so parser processes don't hide parse time).
+
+Examples:
+    $ python3 -m train_places.benchmarks.benchmark_pipeline
+    $ python3 -m train_places.benchmarks.benchmark_pipeline --save-baseline
+    $ python3 -m train_places.benchmarks.benchmark_pipeline --threshold 0.3
+
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import pathlib
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import lxml.html
+
+from train_places.hunter import evaluator, hunter, parser
+from train_places.hunter.records import Search, Trains
+
+
+BENCHMARKS_DIR = pathlib.Path(__file__).parent.absolute()
+RESPONSES_DIR = BENCHMARKS_DIR.parent / 'tests' / 'rzd_responses'
+BASELINE_PATH = BENCHMARKS_DIR / 'baseline.json'
+
+FIXTURES = ('normal_response', 'yesterday_trains', 'wrong_date')
+# Number of trains of synthetic page -> number of page subscribers
+SCALED_PAGES = {100: 100, 500: 1000}
+# Number of measuring rounds of every stage
+ROUNDS = 15
+# Recorded page parsed by reference workload
+REFERENCE_FIXTURE = 'wrong_date'
+
+# Stage result -> {'ops_per_sec': float, 'mean_ms': float, 'relative': float,
+#                  'noise': float, 'peak_kb': float}
+Results = Dict[str, Dict[str, float]]
+
+loop = asyncio.get_event_loop()
+
+
+def main():
+    """Run benchmark, compare results with baseline or save them as baseline."""
+    args = parse_args()
+    os.environ.setdefault('PARSE_WORKERS', '0')
+    results = run_benchmark(args.min_time)
+    print_results(results)
+
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        print(f'Baseline saved to {args.baseline}')
+        return
+    if not os.path.exists(args.baseline):
+        print('No baseline to compare with, save it with --save-baseline')
+        return
+    with open(args.baseline, 'r') as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    regressions = find_regressions(baseline, results, args.threshold)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+    print('No regressions')
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    arg_parser = argparse.ArgumentParser(description='Parse-and-check pipeline benchmark')
+    arg_parser.add_argument('--min-time', type=float, default=1,
+                            help='Min measuring time of every stage in seconds')
+    arg_parser.add_argument('--baseline', default=str(BASELINE_PATH),
+                            help='Path to baseline json file')
+    arg_parser.add_argument('--save-baseline', action='store_true',
+                            help='Save results as new baseline')
+    arg_parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative slowdown or memory growth')
+    return arg_parser.parse_args()
+
+
+def run_benchmark(min_time: float) -> Results:
+    """Run all stages on all pages.
+
+    Args:
+        min_time: Min measuring time of every stage in seconds.
+
+    Returns:
+        results: Results by "stage[page]" name.
+    """
+    pages = {name: read_fixture(name) for name in FIXTURES}
+    normal_response = pages['normal_response']
+    subscribers = {name: 1 for name in FIXTURES}
+    for trains_count, subscribers_count in SCALED_PAGES.items():
+        name = f'scaled_{trains_count}_trains'
+        pages[name] = make_scaled_page(normal_response, trains_count)
+        subscribers[name] = subscribers_count
+
+    reference_page = pages[REFERENCE_FIXTURE]
+    results = {}
+    for name, page in pages.items():
+        for stage, (func, ops) in make_stages(page, subscribers[name]).items():
+            results[f'{stage}[{name}]'] = measure(
+                func, ops, lambda: run_reference(reference_page), min_time)
+    return results
+
+
+def run_reference(page: str) -> None:
+    """Parse page and sort texts of its blocks, only lxml and interpreter are involved."""
+    root = lxml.html.document_fromstring(page)
+    sorted(element.text_content().strip() for element in root.iter('div'))
+
+
+def make_stages(page: str, subscribers_count: int) -> Dict[str, Tuple[Callable[[], Any], int]]:
+    """Make stage functions for page.
+
+    Args:
+        page: Search page.
+        subscribers_count: Number of page subscribers.
+
+    Returns:
+        stages: Stage name -> (function, number of operations made by one call).
+    """
+    root = lxml.html.document_fromstring(page)
+    _, trains = parser.parse_search_page(page)
+    searches = make_searches(trains, subscribers_count)
+    first_search = searches[0]
+
+    stages = {
+        'check_for_bad_url': (lambda: hunter.check_for_bad_url(page), 1),
+        'collect_trains': (lambda: parser.collect_trains(root), 1),
+        'check_trains_data': (lambda: loop.run_until_complete(hunter.check_trains_data(
+            page, ','.join(first_search.train_numbers), str(first_search.price_limit))), 1),
+        'index_page': (lambda: evaluator.PageIndex(trains).get_places(evaluator.ANY_CARS), 1),
+        'check_trains': (lambda: evaluator.evaluate_searches(trains, searches), len(searches)),
+    }
+    return stages
+
+
+def measure(func: Callable[[], Any], ops: int, reference: Callable[[], Any],
+            min_time: float) -> Dict[str, float]:
+    """Measure throughput, relative speed and peak memory of function.
+
+    Every round function and reference are called in turn for the same time,
+    so both run at the same machine speed. Median round is taken, rounds slowed
+    down by other processes don't move results. Peak memory is measured on
+    a separate call, because tracemalloc slows code down.
+
+    Args:
+        func: Stage function.
+        ops: Number of operations made by one call.
+        reference: Reference workload.
+        min_time: Min measuring time in seconds.
+
+    Returns:
+        result: Operations per second, mean operation time in ms, operations per
+            reference call, relative interquartile range of rounds and peak memory in KB.
+    """
+    func()  # warm up
+    reference()
+    call_durations = []
+    speed_ratios = []
+    for _ in range(ROUNDS):
+        round_duration = time_calls(func, min_time / ROUNDS / 2)
+        call_durations.append(round_duration)
+        speed_ratios.append(time_calls(reference, min_time / ROUNDS / 2) / round_duration)
+    call_duration = statistics.median(call_durations)
+    speed_ratio = statistics.median(speed_ratios)
+    speed_ratios.sort()
+    noise = (speed_ratios[ROUNDS * 3 // 4] - speed_ratios[ROUNDS // 4]) / speed_ratio
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'ops_per_sec': round(ops / call_duration, 2),
+        'mean_ms': round(call_duration / ops * 1000, 4),
+        'relative': round(ops * speed_ratio, 4),
+        'noise': round(noise, 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def time_calls(func: Callable[[], Any], min_time: float) -> float:
+    """Call function until min time passes, return mean call duration in seconds."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        duration = time.perf_counter() - start
+        if duration >= min_time:
+            return duration / calls
+
+
+def read_fixture(name: str) -> str:
+    """Read recorded rzd.ru page from tests."""
+    with open(RESPONSES_DIR / f'{name}.html', 'r') as page_file:
+        return page_file.read()
+
+
+def make_scaled_page(page: str, trains_count: int) -> str:
+    """Make search page with given number of trains.
+
+    Trains of recorded page are copied with new unique train numbers.
+
+    Args:
+        page: Recorded search page with trains.
+        trains_count: Number of trains of new page.
+
+    Returns:
+        scaled_page: New search page.
+    """
+    root = lxml.html.document_fromstring(page)
+    train_divs = [
+        train_div for train_div in root.xpath(parser.TRAINS_XPATH)
+        if train_div.xpath(parser.TRAIN_NUMBER_XPATH)
+    ]
+    trains_box = train_divs[0].getparent()
+    for train_div in train_divs:
+        trains_box.remove(train_div)
+    for train_index in range(trains_count):
+        train_div = copy.deepcopy(train_divs[train_index % len(train_divs)])
+        train_div.xpath(parser.TRAIN_NUMBER_XPATH)[0].text = f'{train_index + 1:03d}Б'
+        trains_box.append(train_div)
+    return lxml.html.tostring(root, encoding='unicode')
+
+
+def make_searches(trains: Trains, subscribers_count: int) -> List[Search]:
+    """Make page subscribers with random trains and price limits.
+
+    Args:
+        trains: Trains of page.
+        subscribers_count: Number of subscribers.
+
+    Returns:
+        searches: Subscribers searches, the same for every run.
+    """
+    random_gen = random.Random(subscribers_count)
+    numbers = [train.number for train in trains.with_places + trains.without_places + trains.gone]
+    if not numbers:
+        numbers = ['780А']
+    return [
+        Search(
+            search_id=f'tg-{search_index}',
+            url='',
+            train_numbers=', '.join(random_gen.sample(numbers, min(3, len(numbers)))),
+            price_limit=random_gen.choice((1, 2000, 5000, 10000)),
+        )
+        for search_index in range(subscribers_count)
+    ]
+
+
+def find_regressions(baseline: Results, results: Results, threshold: float) -> List[str]:
+    """Compare results with baseline.
+
+    Stages are compared by relative speed, allowed slowdown is widened by
+    noise of baseline or results, the bigger one. Baselines saved without
+    relative speed are compared by throughput.
+
+    Args:
+        baseline: Baseline results.
+        results: Fresh results.
+        threshold: Allowed relative slowdown or memory growth.
+
+    Returns:
+        regressions: Descriptions of regressed stages.
+    """
+    regressions = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        baseline_result = baseline[stage]
+        if 'relative' in baseline_result:
+            noise = max(baseline_result['noise'], result['noise'])
+            if result['relative'] < baseline_result['relative'] * (1 - threshold - noise):
+                regressions.append(f'{stage}: {result["relative"]} relative ops, '
+                                   f'baseline {baseline_result["relative"]} relative ops, '
+                                   f'noise {noise}')
+        elif result['ops_per_sec'] < baseline_result['ops_per_sec'] * (1 - threshold):
+            regressions.append(f'{stage}: {result["ops_per_sec"]} ops/s, '
+                               f'baseline {baseline_result["ops_per_sec"]} ops/s')
+        if result['peak_kb'] > baseline_result['peak_kb'] * (1 + threshold):
+            regressions.append(f'{stage}: {result["peak_kb"]} KB peak, '
+                               f'baseline {baseline_result["peak_kb"]} KB peak')
+    return regressions
+
+
+def print_results(results: Results) -> None:
+    """Print results table."""
+    print(f'{"stage":<60} {"ops/s":>12} {"mean ms":>10} {"relative":>12} {"noise":>6} '
+          f'{"peak KB":>10}')
+    for stage, result in results.items():
+        print(f'{stage:<60} {result["ops_per_sec"]:>12} {result["mean_ms"]:>10} '
+              f'{result["relative"]:>12} {result["noise"]:>6} {result["peak_kb"]:>10}')
+
+
+def save_results(results: Results, path: str) -> None:
+    """Save results as baseline with python version, timings depend on it."""
+    baseline = {
+        'python': sys.version.split()[0],
+        'results': results,
+    }
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
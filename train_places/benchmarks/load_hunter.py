@@ -0,0 +1,259 @@
+"""Hunter load driver.
+
+Seeds synthetic tg-* searches into local Redis and runs hunter sweeps against
+rzd simulator (started in the same process), so the whole hunter loop is
+measured offline. Nothing is sent to telegram: user and log messages are
+recorded by a fake bot.
+
+For every number of searches reports:
+    sweep time (mean and max),
+    number of found places and find latency (from the moment searched train
+    got places in simulator to the moment message was sent, median and p95),
+    number of errors,
+    peak process memory (RSS).
+
+Seeded searches are removed after every run.
+
+Module needs environment variables:
+    DB_HOST: Redis database host, use local database.
+    DB_PORT: Redis database port.
+    DB_PASS: Redis database password.
+    Others as in hunter module, hunter is imported. Fetch backend is always http,
+    api url points to simulator.
+
+Examples:
+    $ python3 -m train_places.benchmarks.load_hunter
+    $ python3 -m train_places.benchmarks.load_hunter --searches 10 100 --duration 60 \\
+        --error-rate 0.05
+
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+from train_places.benchmarks import rzd_simulator
+from train_places.bots import tg_bot
+from train_places.hunter import rzd_api, shards
+from train_places.utils import notifier, utils
+
+
+SEARCH_ID_PREFIX = 'tg-load-'
+
+# Route, train numbers and seed unix time of search
+SeededSearch = Tuple[rzd_simulator.Route, List[str], float]
+
+
+class RecordingBot:
+    """Bot that records messages instead of sending them."""
+
+    def __init__(self):
+        self.messages: List[Tuple[str, str, float]] = []
+
+    async def send_message(self, chat_id: str, text: str, **kwargs) -> None:
+        self.messages.append((str(chat_id), text, time.time()))
+
+
+def main():
+    """Run hunter load test for every number of searches."""
+    args = parse_args()
+    os.environ['RZD_FETCH_BACKEND'] = 'http'
+    os.environ['RZD_SELENIUM_FALLBACK'] = '0'
+    os.environ['RZD_TIMETABLE_URL'] = \
+        f'http://localhost:{args.port}{rzd_simulator.TIMETABLE_PATH}'
+    os.environ.setdefault('RZD_API_POLL_DELAY', '0.2')
+    os.environ.setdefault('RZD_RPS', '1000')
+    os.environ.setdefault('RZD_BURST', '100')
+    os.environ.setdefault('HUNTER_WORKERS', '50')
+    os.environ.setdefault('MIN_POLL_INTERVAL', '1')
+    os.environ.setdefault('MAX_POLL_INTERVAL', '5')
+    os.environ.setdefault('NOTIFIER_CHAT_INTERVAL', '0')
+
+    loop = asyncio.get_event_loop()
+    simulator = rzd_simulator.make_simulator(args)
+    runner = web.AppRunner(rzd_simulator.make_app(simulator))
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, port=args.port).start())
+    try:
+        for searches_count in args.searches:
+            report = loop.run_until_complete(
+                run_load(simulator, searches_count, args.routes_share, args.duration))
+            print_report(report)
+    finally:
+        loop.run_until_complete(rzd_api.close_session())
+        loop.run_until_complete(runner.cleanup())
+        loop.run_until_complete(utils.close_db_connection())
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    arg_parser = argparse.ArgumentParser(description='Hunter load driver')
+    arg_parser.add_argument('--searches', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                            help='Numbers of searches to test')
+    arg_parser.add_argument('--routes-share', type=float, default=0.1,
+                            help='Number of routes relative to number of searches')
+    arg_parser.add_argument('--duration', type=float, default=60,
+                            help='Test duration for every number of searches in seconds')
+    arg_parser.add_argument('--port', type=int, default=8080, help='Simulator port')
+    rzd_simulator.add_simulator_args(arg_parser)
+    return arg_parser.parse_args()
+
+
+async def run_load(simulator: rzd_simulator.Simulator, searches_count: int,
+                   routes_share: float, duration: float) -> dict:
+    """Seed searches, run hunter sweeps for duration and remove searches.
+
+    Args:
+        simulator: Running rzd simulator.
+        searches_count: Number of searches.
+        routes_share: Number of routes relative to number of searches.
+        duration: Test duration in seconds.
+
+    Returns:
+        report: Load test results.
+    """
+    # Hunter is imported here, so environment is set before
+    from train_places.hunter import hunter
+
+    user_bot, log_bot = RecordingBot(), RecordingBot()
+    tg_bot._bot, utils._log_bot = user_bot, log_bot  # type: ignore
+
+    routes_count = max(1, int(searches_count * routes_share))
+    seeded = await seed_searches(simulator, searches_count, routes_count)
+    requests_before = simulator.requests_count
+    sweep_times = []
+    end_time = time.monotonic() + duration
+    try:
+        while time.monotonic() < end_time:
+            sweep_start = time.monotonic()
+            searches = await hunter.collect_searches()
+            if not searches:
+                break
+            await hunter.search_places(searches)
+            sweep_times.append(time.monotonic() - sweep_start)
+            await asyncio.sleep(0.1)
+        await notifier.close_notifiers()
+    finally:
+        await remove_searches(list(seeded))
+
+    find_latencies = []
+    for chat_id, _, sent_time in user_bot.messages:
+        search_id = f'tg-{chat_id}'
+        if search_id not in seeded:
+            continue
+        route, train_numbers, seed_time = seeded[search_id]
+        open_times = [
+            simulator.get_open_since(route, train_number, seed_time)
+            for train_number in train_numbers
+        ]
+        open_times = [open_time for open_time in open_times if open_time is not None]
+        if open_times:
+            find_latencies.append(sent_time - min(open_times))
+
+    return {
+        'searches': searches_count,
+        'routes': routes_count,
+        'sweeps': len(sweep_times),
+        'sweep_mean': statistics.mean(sweep_times) if sweep_times else 0,
+        'sweep_max': max(sweep_times, default=0),
+        'found': len(user_bot.messages),
+        'find_median': statistics.median(find_latencies) if find_latencies else 0,
+        'find_p95': get_percentile(find_latencies, 0.95),
+        'errors': len(log_bot.messages),
+        'rzd_requests': simulator.requests_count - requests_before,
+        'peak_rss_mb': get_peak_rss_mb(),
+    }
+
+
+async def seed_searches(simulator: rzd_simulator.Simulator, searches_count: int,
+                        routes_count: int) -> Dict[str, SeededSearch]:
+    """Seed searches into db like tg_bot does.
+
+    Searches are spread over routes of tomorrow, every search waits for
+    1-3 random trains with any price.
+
+    Args:
+        simulator: Rzd simulator.
+        searches_count: Number of searches.
+        routes_count: Number of routes.
+
+    Returns:
+        seeded: Search id -> (route, train numbers, seed unix time).
+    """
+    db = await utils.get_db_connection()
+    random_gen = random.Random(searches_count)
+    date = (datetime.date.today() + datetime.timedelta(days=1)).strftime('%d.%m.%Y')
+    routes = [(str(2000000 + route_index), str(2004000 + route_index), date)
+              for route_index in range(routes_count)]
+    seeded = {}
+    pipe = db.pipeline()
+    for search_index in range(searches_count):
+        search_id = f'{SEARCH_ID_PREFIX}{searches_count}-{search_index}'
+        route = routes[search_index % routes_count]
+        code0, code1, dt0 = route
+        train_numbers = random_gen.sample(simulator.train_numbers, random_gen.randint(1, 3))
+        pipe.hmset_dict(search_id, {
+            'url': f'https://pass.rzd.ru/tt/ru#code0={code0}|code1={code1}|dt0={dt0}',
+            'train_numbers': ', '.join(train_numbers),
+            'price_limit': 1,
+            'start_search_time': str(datetime.datetime.now()),
+        })
+        pipe.sadd(utils.SEARCHES_KEY, search_id)
+        seeded[search_id] = (route, train_numbers, time.time())
+    await pipe.execute()
+    return seeded
+
+
+async def remove_searches(search_ids: List[str]) -> None:
+    """Remove seeded searches and their notification claims from db."""
+    db = await utils.get_db_connection()
+    batch_size = int(os.environ.get('DB_BATCH_SIZE', 500))
+    for batch_start in range(0, len(search_ids), batch_size):
+        batch = search_ids[batch_start:batch_start + batch_size]
+        transaction = db.multi_exec()
+        transaction.delete(*batch)
+        transaction.delete(*(shards.NOTIFICATION_CLAIM_PREFIX + search_id for search_id in batch))
+        transaction.srem(utils.SEARCHES_KEY, *batch)
+        await transaction.execute()
+
+
+def get_percentile(values: List[float], share: float) -> float:
+    """Get percentile of values, 0 if there are no values."""
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def get_peak_rss_mb() -> float:
+    """Get peak memory of process in MB."""
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    if sys.platform == 'darwin':
+        return peak_rss / 1024 / 1024
+    return peak_rss / 1024
+
+
+def print_report(report: dict) -> None:
+    """Print load test results."""
+    print(
+        f'searches: {report["searches"]}, routes: {report["routes"]}, '
+        f'sweeps: {report["sweeps"]}, rzd requests: {report["rzd_requests"]}\n'
+        f'  sweep time: mean {report["sweep_mean"]:.2f}s, max {report["sweep_max"]:.2f}s\n'
+        f'  found: {report["found"]}, find latency: median {report["find_median"]:.2f}s, '
+        f'p95 {report["find_p95"]:.2f}s\n'
+        f'  errors: {report["errors"]}, peak memory: {report["peak_rss_mb"]:.1f} MB'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""Rzd simulator.
+
+Local stand-in for pass.rzd.ru, so the whole hunter loop can be load-tested
+offline. Routes are templated from recorded pages of tests, train dates are
+replaced with route date.
+
+Simulator serves:
+    /timetable/public/ru: Timetable api like rzd_api module uses. First request
+                          returns RID, RID polls return trains after loading time.
+    any other path: Search page for selenium backend. Page shows
+                    "Подбираем поезда" loader and renders trains after loading time.
+
+Route is taken from code0, code1 and dt0 parameters of query or fragment,
+like rzd.ru does. Seats availability changes over time: time is split on
+periods and every train of every route is randomly opened or closed for
+every period, the same way for api and page.
+
+Latency, loading time, errors and timeouts are configurable, see --help.
+
+Examples:
+    $ python3 -m train_places.benchmarks.rzd_simulator --port 8080
+    $ RZD_FETCH_BACKEND=http RZD_TIMETABLE_URL=http://localhost:8080/timetable/public/ru \\
+        python3 -m train_places
+
+"""
+
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import pathlib
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+import lxml.html
+
+from train_places.hunter import parser, rzd_api
+
+
+RESPONSES_DIR = pathlib.Path(__file__).parent.parent.absolute() / 'tests' / 'rzd_responses'
+TIMETABLE_PATH = '/timetable/public/ru'
+
+# code0, code1, dt0
+Route = Tuple[str, str, str]
+
+
+class Simulator:
+    """Rzd simulator state and settings.
+
+    Args:
+        latency: Base answer delay in seconds.
+        jitter: Max random addition to answer delay in seconds.
+        loading_time: Time from search request to ready trains in seconds.
+        change_period: Duration of one seats availability period in seconds.
+        open_share: Share of trains with places in every period.
+        error_rate: Share of requests answered with 503 error.
+        timeout_rate: Share of requests that hang for timeout_delay.
+        timeout_delay: Hang duration of timed out requests in seconds.
+        seed: Random seed of availability and errors.
+    """
+
+    def __init__(self, latency: float = 0.1, jitter: float = 0.05, loading_time: float = 0.5,
+                 change_period: float = 30, open_share: float = 0.1, error_rate: float = 0,
+                 timeout_rate: float = 0, timeout_delay: float = 60, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.loading_time = loading_time
+        self.change_period = change_period
+        self.open_share = open_share
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_delay = timeout_delay
+        self.seed = seed
+        self.start_time = time.time()
+        self.requests_count = 0
+        self._random = random.Random(seed)
+        self._rids = itertools.count(1)
+        # RID -> (route, ready time)
+        self._searches: Dict[int, Tuple[Route, float]] = {}
+
+        with open(RESPONSES_DIR / 'normal_response.html', 'r') as page_file:
+            self._page_template = page_file.read()
+        with open(RESPONSES_DIR / 'timetable.json', 'r') as timetable_file:
+            self._timetable_template = json.load(timetable_file)['tp'][0]
+        self.train_numbers = [
+            train['number'] for train in self._timetable_template['list']]
+        self._cars_template = next(
+            train['cars'] for train in self._timetable_template['list'] if train['cars'])
+
+    def get_period(self, moment: Optional[float] = None) -> int:
+        """Get number of availability period of moment (unix time)."""
+        moment = time.time() if moment is None else moment
+        return int((moment - self.start_time) // self.change_period)
+
+    def is_train_open(self, route: Route, train_number: str, period: int) -> bool:
+        """Check if train has places in availability period."""
+        period_random = random.Random(f'{self.seed}|{"|".join(route)}|{train_number}|{period}')
+        return period_random.random() < self.open_share
+
+    def get_open_since(self, route: Route, train_number: str, moment: float,
+                       max_periods: int = 1000) -> Optional[float]:
+        """Get first moment since given one when train has places.
+
+        Args:
+            route: Route.
+            train_number: Train number.
+            moment: Unix time to start from.
+            max_periods: Max number of periods to look through.
+
+        Returns:
+            open_since: Unix time. None if train isn't opened in max periods.
+        """
+        first_period = self.get_period(moment)
+        for period in range(first_period, first_period + max_periods):
+            if self.is_train_open(route, train_number, period):
+                period_start = self.start_time + period * self.change_period
+                return max(moment, period_start)
+        return None
+
+    def make_timetable(self, route: Route) -> dict:
+        """Make route timetable for current availability period."""
+        period = self.get_period()
+        timetable = copy.deepcopy(self._timetable_template)
+        timetable['fromCode'], timetable['whereCode'], timetable['date'] = route
+        for train in timetable['list']:
+            train['date0'] = route[2]
+            if self.is_train_open(route, train['number'], period):
+                train['cars'] = copy.deepcopy(self._cars_template)
+            else:
+                train['cars'] = []
+        return timetable
+
+    def make_page(self, route: Route) -> str:
+        """Make route search page for current availability period.
+
+        Trains are hidden in template and rendered by script after loading time.
+        """
+        period = self.get_period()
+        root = lxml.html.document_fromstring(self._page_template)
+        trains_box = None
+        for train_div in root.xpath(parser.TRAINS_XPATH):
+            number_spans = train_div.xpath(parser.TRAIN_NUMBER_XPATH)
+            if not number_spans:
+                continue
+            train_number = number_spans[0].text_content().strip()
+            classes = ['route-item']
+            if not self.is_train_open(route, train_number, period):
+                classes.append('route-item__train-without-places')
+            train_div.set('class', ' '.join(classes))
+            trains_box = train_div.getparent()
+        if trains_box is not None:
+            trains = list(trains_box)
+            for child in trains:
+                trains_box.remove(child)
+            loader = lxml.html.fromstring('<div class="sim-loader">Подбираем поезда</div>')
+            template = lxml.html.fromstring('<template id="sim-trains"></template>')
+            template.extend(trains)
+            script = lxml.html.fromstring(f'''<script>
+setTimeout(function () {{
+  var template = document.getElementById("sim-trains");
+  var box = template.parentNode;
+  box.innerHTML = template.innerHTML;
+}}, {int(self.loading_time * 1000)});
+</script>''')
+            trains_box.extend([loader, template, script])
+        return lxml.html.tostring(root, encoding='unicode')
+
+    async def answer_delay(self) -> Optional[web.Response]:
+        """Wait for answer latency, inject errors and timeouts.
+
+        Returns:
+            error_response: Response that should be sent instead of normal one.
+        """
+        self.requests_count += 1
+        await asyncio.sleep(self.latency + self._random.random() * self.jitter)
+        chance = self._random.random()
+        if chance < self.timeout_rate:
+            await asyncio.sleep(self.timeout_delay)
+        elif chance < self.timeout_rate + self.error_rate:
+            return web.Response(status=503, text='Service Unavailable')
+        return None
+
+    async def handle_timetable(self, request: web.Request) -> web.Response:
+        """Timetable api handler."""
+        error_response = await self.answer_delay()
+        if error_response:
+            return error_response
+
+        rid = request.query.get('rid')
+        if rid:
+            search = self._searches.get(int(rid))
+            if not search:
+                return make_json_response({'result': 'Error', 'message': 'Unknown RID'})
+            route, ready_time = search
+            if time.time() < ready_time:
+                return make_json_response({'result': 'RID', 'RID': int(rid)})
+            del self._searches[int(rid)]
+            return make_json_response({'result': 'OK', 'tp': [self.make_timetable(route)]})
+
+        route = get_route(dict(request.query))
+        if not route:
+            return make_json_response({'result': 'Error', 'message': 'Bad route'})
+        rid = next(self._rids)
+        self._searches[rid] = (route, time.time() + self.loading_time)
+        return make_json_response({'result': 'RID', 'RID': rid})
+
+    async def handle_page(self, request: web.Request) -> web.Response:
+        """Search page handler.
+
+        Route in url fragment isn't sent by browser, so page without route
+        in query moves fragment to query with script.
+        """
+        error_response = await self.answer_delay()
+        if error_response:
+            return error_response
+        route = get_route(dict(request.query))
+        if not route:
+            return web.Response(text=FRAGMENT_REDIRECT_PAGE, content_type='text/html')
+        return web.Response(text=self.make_page(route), content_type='text/html')
+
+
+# Moves route from fragment to query, so simulator can see it
+FRAGMENT_REDIRECT_PAGE = '''<html><body><script>
+if (location.hash) {
+  location.replace(location.pathname + "?" + location.hash.slice(1).split("|").join("&"));
+}
+</script></body></html>'''
+
+
+def get_route(params: Dict[str, str]) -> Optional[Route]:
+    """Get route from request parameters."""
+    if not all(params.get(param) for param in rzd_api.SEARCH_PARAMS):
+        return None
+    return params['code0'], params['code1'], params['dt0']
+
+
+def make_json_response(data: dict) -> web.Response:
+    """Make json response with text/html content type, like rzd does."""
+    return web.Response(text=json.dumps(data, ensure_ascii=False), content_type='text/html')
+
+
+def make_app(simulator: Simulator) -> web.Application:
+    """Make simulator web application."""
+    app = web.Application()
+    app.router.add_get(TIMETABLE_PATH, simulator.handle_timetable)
+    app.router.add_get('/{tail:.*}', simulator.handle_page)
+    return app
+
+
+def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    arg_parser = argparse.ArgumentParser(description='Rzd simulator')
+    arg_parser.add_argument('--port', type=int, default=8080)
+    add_simulator_args(arg_parser)
+    return arg_parser.parse_args(args)
+
+
+def add_simulator_args(arg_parser: argparse.ArgumentParser) -> None:
+    """Add simulator settings to command line arguments."""
+    arg_parser.add_argument('--latency', type=float, default=0.1,
+                            help='Base answer delay in seconds')
+    arg_parser.add_argument('--jitter', type=float, default=0.05,
+                            help='Max random addition to answer delay in seconds')
+    arg_parser.add_argument('--loading-time', type=float, default=0.5,
+                            help='Time of "Подбираем поезда" phase in seconds')
+    arg_parser.add_argument('--change-period', type=float, default=30,
+                            help='Duration of seats availability period in seconds')
+    arg_parser.add_argument('--open-share', type=float, default=0.1,
+                            help='Share of trains with places in every period')
+    arg_parser.add_argument('--error-rate', type=float, default=0,
+                            help='Share of requests answered with 503 error')
+    arg_parser.add_argument('--timeout-rate', type=float, default=0,
+                            help='Share of requests that hang')
+    arg_parser.add_argument('--timeout-delay', type=float, default=60,
+                            help='Hang duration in seconds')
+    arg_parser.add_argument('--seed', type=int, default=0)
+
+
+def make_simulator(args: argparse.Namespace) -> Simulator:
+    """Make simulator from command line arguments."""
+    return Simulator(
+        latency=args.latency,
+        jitter=args.jitter,
+        loading_time=args.loading_time,
+        change_period=args.change_period,
+        open_share=args.open_share,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_delay=args.timeout_delay,
+        seed=args.seed,
+    )
+
+
+def main():
+    """Run rzd simulator."""
+    args = parse_args()
+    web.run_app(make_app(make_simulator(args)), port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,51 +8,58 @@ Bot needs environment varibles:
     DB_HOST: Redis database host.
     DB_PORT: Redis database port.
     DB_PASS: Redis database password.
+    DB_POOL_SIZE: Max number of Redis database connections (default = 10).
     LOGS_KEY: Redis database key for list where logs will be stored (default = search_logs)
+    MAX_CHAT_SEARCHES: Max number of searches in one chat (default = 5).
 
 Handler list:
-    errors_handler, send_welcome, send_help, cancel_handler,
-    start_search, get_url, get_numbers, get_limit, answer_searching
+    errors_handler, send_welcome, send_help, cancel_handler, start_search,
+    list_searches, get_url, get_numbers, get_limit, answer_searching
 
 All handlers except errors_handler returns None value.
 
+Importing the module creates nothing: bot is created on first use and
+dispatcher with handlers is made by create_dispatcher.
+
 """
 
 import datetime
 import json
 import os
+import time
+from typing import List
 
 from aiogram import Bot, Dispatcher, executor, types
 from aiogram.contrib.fsm_storage.redis import RedisStorage2
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
+from aiogram.dispatcher.middlewares import BaseMiddleware
 from aiogram.utils.exceptions import TerminatedByOtherGetUpdates
 from dotenv import load_dotenv
 
+from train_places.hunter.records import Search, parse_car_filter
 from train_places.phrases import phrases
-from train_places.utils import utils
-
+from train_places.utils import metrics, utils
 
-load_dotenv()
 
-# Logger bot
-log_bot = utils.get_logger_bot()
 # Logger name. Use it for errors handling with utils.handle_exception(LOGGER_NAME)
 LOGGER_NAME = 'trains_bot_logger'
+# Lifetime of search that user didn't finish to create, in seconds
+DRAFT_SEARCH_TTL = 24 * 60 * 60
 
-# DB conncetion
-redis_db = utils.get_db_connection()
-
-# bot settings
-bot = Bot(token=os.environ['TG_BOT_TOKEN'], proxy=os.environ.get('TG_PROXY'))
-dispatcher = Dispatcher(
-    bot=bot,
-    storage=RedisStorage2(
-        host=os.environ['DB_HOST'],
-        port=os.environ['DB_PORT'],
-        password=os.environ['DB_PASS']
-    ),
-)
+_bot = None
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Middleware that measures handling time of every update."""
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        data['handling_start_time'] = time.monotonic()
+
+    async def on_post_process_update(self, update: types.Update, results: list, data: dict):
+        start_time = data.get('handling_start_time')
+        if start_time:
+            metrics.HANDLER_SECONDS.observe(time.monotonic() - start_time)
 
 
 class SearchConv(StatesGroup):
@@ -61,15 +68,64 @@ class SearchConv(StatesGroup):
     typing_url = State()
     typing_numbers = State()
     choosing_limit = State()
+    choosing_cars = State()
     searching = State()
 
 
+# States of search creation conversation
+CREATION_STATES = (
+    SearchConv.typing_url.state,
+    SearchConv.typing_numbers.state,
+    SearchConv.choosing_limit.state,
+    SearchConv.choosing_cars.state,
+)
+
+
 def main():
     """Start bot polling."""
-    executor.start_polling(dispatcher)
+    load_dotenv()
+    executor.start_polling(create_dispatcher())
+
+
+def get_bot() -> Bot:
+    """Get telegram bot (Singletone)."""
+    global _bot
+    if not _bot:
+        _bot = Bot(token=os.environ['TG_BOT_TOKEN'], proxy=os.environ.get('TG_PROXY'))
+    return _bot
+
+
+def create_dispatcher() -> Dispatcher:
+    """Create dispatcher with Redis states storage, middlewares and handlers.
+
+    Returns:
+        dispatcher: Bot dispatcher ready for polling.
+    """
+    dispatcher = Dispatcher(
+        bot=get_bot(),
+        storage=RedisStorage2(
+            host=os.environ['DB_HOST'],
+            port=os.environ['DB_PORT'],
+            password=os.environ['DB_PASS']
+        ),
+    )
+    dispatcher.middleware.setup(MetricsMiddleware())
+
+    dispatcher.register_errors_handler(errors_handler)
+    dispatcher.register_message_handler(send_welcome, state='*', commands=['start'])
+    dispatcher.register_message_handler(send_help, state='*', commands=['help'])
+    dispatcher.register_message_handler(cancel_handler, state='*', commands=['cancel'])
+    dispatcher.register_message_handler(start_search, state='*', commands=['start_search'])
+    dispatcher.register_message_handler(list_searches, state='*', commands=['searches'])
+    dispatcher.register_message_handler(get_url, state=SearchConv.typing_url)
+    dispatcher.register_message_handler(get_numbers, state=SearchConv.typing_numbers)
+    dispatcher.register_message_handler(get_limit, state=SearchConv.choosing_limit)
+    dispatcher.register_message_handler(get_car_filter, state=SearchConv.choosing_cars)
+    # Handler of not predicted messages goes last
+    dispatcher.register_message_handler(answer_searching, state='*')
+    return dispatcher
 
 
-@dispatcher.errors_handler()
 async def errors_handler(update: types.Update, exception: Exception) -> bool:
     """Bot errors handler.
 
@@ -83,11 +139,10 @@ async def errors_handler(update: types.Update, exception: Exception) -> bool:
     if type(exception) == TerminatedByOtherGetUpdates:
         return True
 
-    await utils.handle_exception(log_bot, LOGGER_NAME)
+    await utils.handle_exception(utils.get_logger_bot(), LOGGER_NAME)
     return True
 
 
-@dispatcher.message_handler(state='*', commands=['start'])
 async def send_welcome(message: types.Message, state: FSMContext):
     """Start command handler for all states. Sends welcome message.
 
@@ -101,7 +156,6 @@ async def send_welcome(message: types.Message, state: FSMContext):
     await message.answer(phrases.welcome)
 
 
-@dispatcher.message_handler(state='*', commands=['help'])
 async def send_help(message: types.Message, state: FSMContext):
     """Help command handler for all states. Sends help message.
 
@@ -117,61 +171,153 @@ async def send_help(message: types.Message, state: FSMContext):
     await message.answer(phrases.help_half_2, disable_web_page_preview=True)
 
 
-@dispatcher.message_handler(state='*', commands=['cancel'])
 async def cancel_handler(message: types.Message, state: FSMContext):
-    """Cancel command handler for all states. Cancels all states.
+    """Cancel command handler for all states. Cancels search creation or searches.
+
+    Search being created is cancelled if user is creating one. Otherwise search
+    with number from command argument (/cancel 2) is cancelled, all chat
+    searches are cancelled if there is no argument.
 
     Args:
         message: Message from user.
         state: User state in conversation.
     """
     current_state = await state.get_state()
+    chat_key = f'tg-{message.chat.id}'
 
-    # TODO make refactoring here:
-    if current_state == 'SearchConv:typing_url':
+    if current_state in CREATION_STATES:
+        await remove_draft_search(state)
+        await state.finish()
+        await message.answer(phrases.cancel_msg)
+        return
+
+    searches = await get_chat_searches(chat_key)
+    if not searches:
+        await message.answer(phrases.useless_cancel)
+        return
+
+    search_number = message.get_args()
+    if search_number:
+        if not search_number.isdigit() or not 0 < int(search_number) <= len(searches):
+            await message.answer(phrases.bad_search_number)
+            return
+        await utils.remove_search_from_db(searches[int(search_number) - 1].search_id)
         await message.answer(phrases.cancel_msg)
     else:
-        if not await check_for_existing_search(f'tg-{message.chat.id}'):
-            await message.answer(phrases.useless_cancel)
-        else:
-            await utils.remove_search_from_db(f'tg-{message.chat.id}')
-            await message.answer(phrases.cancel_msg)
+        for search in searches:
+            await utils.remove_search_from_db(search.search_id)
+        await message.answer(phrases.all_searches_cancelled)
 
     if current_state is not None:
-        await state.set_state(None)
+        await state.finish()
 
 
-@dispatcher.message_handler(state='*', commands=['start_search'])
-async def start_search(message: types.Message):
+async def start_search(message: types.Message, state: FSMContext):
     """Start search command handler for all states.
 
-    Handler checks for exisitng search, starts new search conversation
-    if there are none.
+    Handler starts new search conversation if chat has less than
+    MAX_CHAT_SEARCHES searches.
 
     Args:
         message: Message from user.
+        state: User state in conversation.
     """
-    if await check_for_existing_search(f'tg-{message.chat.id}'):
-        await message.answer(phrases.second_search)
+    searches = await get_chat_searches(f'tg-{message.chat.id}')
+    max_searches = int(os.environ.get('MAX_CHAT_SEARCHES', 5))
+    if len(searches) >= max_searches:
+        await message.answer(phrases.too_many_searches.format(max_searches=max_searches))
         return
 
+    if await state.get_state() in CREATION_STATES:
+        await remove_draft_search(state)
+    await state.finish()
     await SearchConv.typing_url.set()
     await message.answer(phrases.waiting_url)
 
 
-async def check_for_existing_search(chat_id):
-    """Check for exisiting user's search in db.
+async def list_searches(message: types.Message, state: FSMContext):
+    """Searches command handler for all states. Sends list of chat searches.
 
     Args:
-        chat_id: User chat id with platform prefix ('tg-' for telegram).
+        message: Message from user.
+        state: User state in conversation.
     """
-    if redis_db.exists(chat_id):
-        return True
+    searches = await get_chat_searches(f'tg-{message.chat.id}')
+    if not searches:
+        await message.answer(phrases.no_searches)
+        return
+    lines = [phrases.searches_list]
+    for search_number, search in enumerate(searches, start=1):
+        search_phrase = phrases.search_item if search.price_limit != 1 \
+            else phrases.search_item_without_limit
+        search_line = search_phrase.format(
+            search_number=search_number, train_numbers=', '.join(search.train_numbers),
+            price_limit=search.price_limit)
+        if search.car_classes or search.min_seats > 1:
+            search_line += phrases.search_item_car_filter.format(
+                car_classes=', '.join(sorted(search.car_classes)) or phrases.any_car_class,
+                min_seats=search.min_seats)
+        lines.append(search_line)
+    await message.answer('\n'.join(lines))
+
+
+async def get_chat_searches(chat_key: str) -> List[Search]:
+    """Get completed searches of chat in order of creation.
+
+    Ids of removed searches are dropped from chat searches. Search made before
+    several searches per chat were allowed is stored under chat key.
+
+    Args:
+        chat_key: User chat id with platform prefix ('tg-' for telegram).
+
+    Returns:
+        searches: Chat searches, searches being created are skipped.
+    """
+    db = await utils.get_db_connection()
+    chat_searches_key = utils.get_chat_searches_key(chat_key)
+    search_ids = sorted(
+        [chat_key] + await db.smembers(chat_searches_key), key=get_search_number)
+    pipe = db.pipeline()
+    for search_id in search_ids:
+        pipe.hgetall(search_id)
+    searches_info = await pipe.execute()
+
+    searches = []
+    removed_search_ids = []
+    for search_id, search_info in zip(search_ids, searches_info):
+        if not search_info:
+            removed_search_ids.append(search_id)
+            continue
+        search = Search.from_db(search_id, search_info)
+        if search:
+            searches.append(search)
+    if removed_search_ids:
+        await db.srem(chat_searches_key, *removed_search_ids)
+    return searches
+
+
+def get_search_number(search_id: str) -> int:
+    """Get number of search in chat from search id, old search of chat has number 0."""
+    _, _, search_number = search_id.partition(':')
+    return int(search_number or 0)
+
+
+async def remove_draft_search(state: FSMContext) -> None:
+    """Remove search that is being created from db.
+
+    Args:
+        state: User state in conversation.
+    """
+    search_id = (await state.get_data()).get('search_id')
+    if search_id:
+        await utils.remove_search_from_db(search_id)
 
 
-@dispatcher.message_handler(state=SearchConv.typing_url)
 async def get_url(message: types.Message, state: FSMContext):
-    """Parse search url from user message.
+    """Parse search url from user message and create new search.
+
+    Search gets id from chat key and chat search number, like "tg-123:2".
+    Search is kept for DRAFT_SEARCH_TTL until it's completed.
 
     Args:
         message: Message from user.
@@ -182,21 +328,29 @@ async def get_url(message: types.Message, state: FSMContext):
         await message.answer(phrases.wrong_url_webpage)
         return
 
+    chat_key = f'tg-{message.chat.id}'
     got_url_time = str(datetime.datetime.now())
-    redis_db.hmset(
-        f'tg-{message.chat.id}',
+    db = await utils.get_db_connection()
+    search_number = await db.incr(f'{utils.SEARCH_COUNTER_PREFIX}{chat_key}')
+    search_id = f'{chat_key}:{search_number}'
+    transaction = db.multi_exec()
+    transaction.hmset_dict(
+        search_id,
         {
             'url': url,
-            'id': f'tg-{message.chat.id}',
+            'id': search_id,
             'got_url_time': got_url_time
         }
     )
+    transaction.expire(search_id, DRAFT_SEARCH_TTL)
+    transaction.sadd(utils.get_chat_searches_key(chat_key), search_id)
+    await transaction.execute()
+    await state.update_data(search_id=search_id)
 
     await SearchConv.next()
     await message.answer(phrases.waiting_train_numbers)
 
 
-@dispatcher.message_handler(state=SearchConv.typing_numbers)
 async def get_numbers(message: types.Message, state: FSMContext):
     """Parse train numbers from user message.
 
@@ -205,13 +359,14 @@ async def get_numbers(message: types.Message, state: FSMContext):
         state: User state in conversation.
     """
     train_numbers = utils.parse_train_numbers(message.text)
-    redis_db.hset(f'tg-{message.chat.id}', 'train_numbers', ','.join(train_numbers))
+    search_id = (await state.get_data())['search_id']
+    db = await utils.get_db_connection()
+    await db.hset(search_id, 'train_numbers', ','.join(train_numbers))
 
     await SearchConv.next()
     await message.answer(phrases.waiting_price_limit)
 
 
-@dispatcher.message_handler(state=SearchConv.choosing_limit)
 async def get_limit(message: types.Message, state: FSMContext):
     """Parse price limit from user message.
 
@@ -224,39 +379,67 @@ async def get_limit(message: types.Message, state: FSMContext):
     except ValueError:
         await message.answer(phrases.bad_price)
         return
-    chat_id = f'tg-{message.chat.id}'
+    await state.update_data(price_limit=price_limit)
+
+    await SearchConv.next()
+    await message.answer(phrases.waiting_car_filter)
+
+
+async def get_car_filter(message: types.Message, state: FSMContext):
+    """Parse car classes and min number of seats from user message, start search.
+
+    Args:
+        message: Message from user.
+        state: User state in conversation.
+    """
+    car_filter = parse_car_filter(message.text)
+    if not car_filter:
+        await message.answer(phrases.bad_car_filter)
+        return
+    car_classes, min_seats = car_filter
+    conversation_data = await state.get_data()
+    search_id = conversation_data['search_id']
     start_search_time = str(datetime.datetime.now())
-    redis_db.hmset(
-        f'tg-{message.chat.id}',
+    db = await utils.get_db_connection()
+    # Search is complete, so it is kept until it's finished and added to searches
+    # index for place hunter
+    transaction = db.multi_exec()
+    transaction.hmset_dict(
+        search_id,
         {
-            'price_limit': price_limit,
+            'price_limit': conversation_data['price_limit'],
+            'car_classes': ','.join(car_classes),
+            'min_seats': min_seats,
             'start_search_time': start_search_time
         }
     )
+    transaction.persist(search_id)
+    transaction.sadd(utils.SEARCHES_KEY, search_id)
+    utils.publish_search_event(transaction, utils.SEARCH_CREATED, search_id)
+    await transaction.execute()
     logs_key = os.environ.get('LOGS_KEY', 'search_logs')
-    update_search_logs(chat_id, logs_key)
+    await update_search_logs(search_id, logs_key)
 
-    await SearchConv.next()
+    await state.finish()
+    await SearchConv.searching.set()
     await message.answer(phrases.start_placehunt)
 
 
-def update_search_logs(chat_id, logs_key):
+async def update_search_logs(search_id, logs_key):
     """Update search logs from new user search.
 
     Fetch user search from db and push it to db log key (list of logs)
 
     Args:
-        chat_id: User chat id with platform prefix ('tg-' for telegram).
+        search_id: Db key for search.
         logs_key: Db key for log list.
     """
-    data_of_search = redis_db.hgetall(chat_id)
-    dump = json.dumps({
-        key.decode('UTF-8'): value.decode('UTF-8') for key, value in data_of_search.items()
-    })
-    redis_db.rpush(logs_key, dump)
+    db = await utils.get_db_connection()
+    data_of_search = await db.hgetall(search_id)
+    dump = json.dumps(data_of_search)
+    await db.rpush(logs_key, dump)
 
 
-@dispatcher.message_handler(state='*')
 async def answer_searching(message: types.Message, state: FSMContext):
     """All not predicted messages handler. Sends little help to user.
 
@@ -19,6 +19,8 @@ class ActiveSearch(Base):
     url = Column(String(500))
     train_numbers = Column(String)
     price_limit = Column(Integer)
+    car_classes = Column(String)
+    min_seats = Column(Integer)
     query_time = Column(DateTime)
 
     def __repr__(self):
@@ -32,6 +34,8 @@ class SearchLog(Base):
     url = Column(String(500))
     train_numbers = Column(String)
     price_limit = Column(Integer)
+    car_classes = Column(String)
+    min_seats = Column(Integer)
     query_time = Column(DateTime)
 
     def __repr__(self):
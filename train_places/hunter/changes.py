@@ -0,0 +1,124 @@
+"""Route changes tracker module.
+
+Most routes don't change between sweeps, so hunter keeps a snapshot of
+every route availability and checks only searches that could get another
+check answer: new searches and searches with changed trains.
+
+Search check answer depends only on trains with search train numbers, so
+searches without changed trains are safely skipped. Searches of changed trains
+are taken from search index by train numbers, see search_index module.
+
+"""
+
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+from train_places.hunter.records import Search, Trains
+from train_places.hunter.search_index import RouteSearches
+
+
+# Train number -> statuses, departure times, prices and seats of trains with that number
+Snapshot = Dict[str, Tuple[
+    Tuple[str, str, Tuple[Tuple[str, int], ...], Tuple[Tuple[str, int], ...]], ...]]
+
+
+class RouteState:
+    """Last known availability of route."""
+
+    __slots__ = ('fingerprint', 'snapshot', 'changed')
+
+    def __init__(self, fingerprint: int, snapshot: Snapshot):
+        self.fingerprint = fingerprint
+        self.snapshot = snapshot
+        # Route availability changed at the last selection
+        self.changed = False
+
+
+class RouteChangesTracker:
+    """Route snapshots keeper that selects searches to check."""
+
+    def __init__(self):
+        self._routes: Dict[str, RouteState] = {}
+
+    def select_searches_to_check(self, url: str, trains: Trains,
+                                 route: RouteSearches) -> List[Search]:
+        """Select route searches that could get another check answer.
+
+        All searches are considered checked after selection, so use
+        `RouteSearches.forget_check` if check of some search failed.
+
+        Args:
+            url: Normalized search url.
+            trains: Fresh trains of route.
+            route: Indexed searches of route.
+
+        Returns:
+            searches_to_check: Unchecked searches and searches with changed trains.
+        """
+        snapshot = take_snapshot(trains)
+        fingerprint = hash(frozenset(snapshot.items()))
+        state = self._routes.get(url)
+
+        if not state:
+            self._routes[url] = RouteState(fingerprint, snapshot)
+            route.pop_unchecked()
+            return list(route.searches.values())
+        if state.fingerprint == fingerprint:
+            changed_numbers: FrozenSet[str] = frozenset()
+        else:
+            changed_numbers = get_changed_numbers(state.snapshot, snapshot)
+            state.fingerprint, state.snapshot = fingerprint, snapshot
+        state.changed = bool(changed_numbers)
+
+        searches_to_check = {search.search_id: search for search in route.pop_unchecked()}
+        for search in route.get_train_searches(changed_numbers):
+            searches_to_check.setdefault(search.search_id, search)
+        return list(searches_to_check.values())
+
+    def is_route_changed(self, url: str) -> bool:
+        """Check if route availability changed at the last selection of its searches."""
+        state = self._routes.get(url)
+        return bool(state and state.changed)
+
+    def forget_other_routes(self, urls: Iterable[str]) -> None:
+        """Drop snapshots of routes without searches.
+
+        Args:
+            urls: Normalized urls of routes with searches.
+        """
+        urls = set(urls)
+        for url in list(self._routes):
+            if url not in urls:
+                del self._routes[url]
+
+
+def take_snapshot(trains: Trains) -> Snapshot:
+    """Take route availability snapshot.
+
+    Args:
+        trains: Trains of route.
+
+    Returns:
+        snapshot: Statuses, departure times, prices and seats of trains by train number.
+    """
+    snapshot: Dict[str, list] = {}
+    for train in trains.with_places + trains.gone + trains.without_places:
+        snapshot.setdefault(train.normalized_number, []).append(
+            (train.status, train.time, tuple(train.prices.items()),
+             tuple(train.seats.items())))
+    return {number: tuple(states) for number, states in snapshot.items()}
+
+
+def get_changed_numbers(old_snapshot: Snapshot, new_snapshot: Snapshot) -> FrozenSet[str]:
+    """Get numbers of trains that appeared, disappeared or changed.
+
+    Args:
+        old_snapshot: Previous route snapshot.
+        new_snapshot: Fresh route snapshot.
+
+    Returns:
+        changed_numbers: Normalized train numbers.
+    """
+    return frozenset(
+        number for number in old_snapshot.keys() | new_snapshot.keys()
+        if old_snapshot.get(number) != new_snapshot.get(number)
+    )
@@ -0,0 +1,165 @@
+"""Selenium drivers pool module.
+
+Starting of headless Chrome takes 1-3 seconds and hundreds of MB of RAM,
+so hunter keeps a few long-lived browser sessions and reuses them for
+all searches instead of starting new browser for every search url.
+
+Selenium api is blocking, so all driver calls should be made in threads
+with `run_in_thread` to keep event loop responsive.
+
+Selenium is imported on first driver start, so modules that only import
+the pool (tests, tools, http backend) don't pay for it.
+
+Module needs environment variables:
+    GOOGLE_CHROME_BIN: Chrome browser path.
+    CHROMEDRIVER_PATH: Chrome driver path (easy guide: https://youtu.be/Ven-pqwk3ec?t=184).
+    DRIVERS_POOL_SIZE: Max number of running browsers (default = 1).
+    DRIVER_MAX_PAGES: Browser will be restarted after this number of loaded pages
+                      to free leaked memory (default = 100).
+    SEARCH_PAGE_TIMEOUT: Page load timeout in seconds (default = 30).
+
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+import functools
+import os
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, TYPE_CHECKING
+
+from train_places.utils import metrics
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+
+_drivers_pool = None
+
+
+class DriverStartError(Exception):
+    """Driver can't be started."""
+
+    def __init__(self, msg: str):
+        super().__init__(msg)
+        self.msg = msg
+
+
+class DriversPool:
+    """Pool of long-lived Chrome sessions.
+
+    Driver is taken from pool with `async with pool.driver() as driver:`.
+    Drivers are checked for health before giving them out, broken drivers and
+    drivers that loaded more than `max_pages` pages are quitted and replaced
+    by new ones.
+    """
+
+    def __init__(self, size: int, max_pages: int):
+        self.size = size
+        self.max_pages = max_pages
+        self._idle: List['WebDriver'] = []
+        self._pages: Dict['WebDriver', int] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @asynccontextmanager
+    async def driver(self) -> AsyncIterator['WebDriver']:
+        """Take driver from pool and return it back after use.
+
+        Driver is quitted instead of returning if any exception raised inside
+        the context, next search will get a new one.
+
+        Raises:
+            DriverStartError: Driver can't be started.
+        """
+        if not self._semaphore:
+            self._semaphore = asyncio.Semaphore(self.size)
+        async with self._semaphore:
+            driver = await self._take_healthy_driver()
+            try:
+                yield driver
+            except BaseException:
+                await run_in_thread(self._quit, driver)
+                raise
+            self._pages[driver] += 1
+            if self._pages[driver] >= self.max_pages:
+                await run_in_thread(self._quit, driver)
+            else:
+                self._idle.append(driver)
+
+    def close(self) -> None:
+        """Quit all idle drivers."""
+        while self._idle:
+            self._quit(self._idle.pop())
+
+    async def _take_healthy_driver(self) -> 'WebDriver':
+        """Get idle healthy driver or start new one."""
+        while self._idle:
+            driver = self._idle.pop()
+            if await run_in_thread(is_driver_alive, driver):
+                return driver
+            await run_in_thread(self._quit, driver)
+        from selenium.common.exceptions import WebDriverException
+        try:
+            with metrics.DRIVER_START_SECONDS.time():
+                driver = await run_in_thread(start_driver)
+        except WebDriverException as ex:
+            raise DriverStartError(ex.msg) from ex
+        self._pages[driver] = 0
+        return driver
+
+    def _quit(self, driver: 'WebDriver') -> None:
+        """Quit driver and forget about it."""
+        self._pages.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+def get_drivers_pool() -> DriversPool:
+    """Get drivers pool (Singletone)."""
+    global _drivers_pool
+    if not _drivers_pool:
+        _drivers_pool = DriversPool(
+            size=int(os.environ.get('DRIVERS_POOL_SIZE', 1)),
+            max_pages=int(os.environ.get('DRIVER_MAX_PAGES', 100)),
+        )
+    return _drivers_pool
+
+
+def start_driver() -> 'WebDriver':
+    """Start headless Chrome driver.
+
+    Raises:
+        WebDriverException: Driver can't be started.
+    """
+    from selenium import webdriver
+
+    # ChromeBrowser (heroku offical supports it) easy guide: https://youtu.be/Ven-pqwk3ec?t=184)
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.binary_location = os.environ.get('GOOGLE_CHROME_BIN')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--gpu-disable')
+    chrome_options.add_argument('log-level=2')
+    driver = webdriver.Chrome(
+        executable_path=os.environ.get('CHROMEDRIVER_PATH'),
+        options=chrome_options)
+    driver.set_page_load_timeout(float(os.environ.get('SEARCH_PAGE_TIMEOUT', 30)))
+    # If you want firefox driver use it this way:
+    # driver = webdriver.Firefox(executable_path=os.environ.get('FIREFOX_EXECUTABLE'))
+    return driver
+
+
+def is_driver_alive(driver: 'WebDriver') -> bool:
+    """Check that browser behind the driver still responds."""
+    try:
+        driver.window_handles
+    except Exception:
+        return False
+    return True
+
+
+async def run_in_thread(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run blocking Selenium call in default thread pool executor."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
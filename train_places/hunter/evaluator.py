@@ -0,0 +1,192 @@
+"""Route evaluator module.
+
+All searches of a route are checked against one parsed page in one pass.
+Page is indexed once for every car filter of route searches (car classes and
+min number of seats): for every train number min prices of fitting cars of
+trains with places are sorted and paired with the first page position of
+a train that is not more expensive. So price limit check of a search is
+a binary search in that array instead of a loop over trains and car types.
+
+Checks are the same for every search and go in order:
+    wrong train numbers: none of search trains is on the page,
+    places: the first train on the page with places and min price within limit,
+    all gone: all search trains are gone.
+
+"""
+
+from bisect import bisect_right
+import math
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from train_places.hunter.records import Search, Train, Trains
+from train_places.phrases import phrases
+
+
+# Price limit of searches where price doesn't matter
+ANY_PRICE = 1
+
+# Car classes (empty for any class) and min number of seats
+CarFilter = Tuple[FrozenSet[str], int]
+ANY_CARS: CarFilter = (frozenset(), 1)
+
+
+class TrainPlaces:
+    """Trains with places of one number, prepared for price limit checks."""
+
+    __slots__ = ('min_prices', 'first_positions')
+
+    def __init__(self, min_prices: List[float], first_positions: List[int]):
+        # Sorted min prices of trains
+        self.min_prices = min_prices
+        # Min page position of trains with min price up to min_prices[i]
+        self.first_positions = first_positions
+
+    def find_first_position(self, price_limit: int) -> Optional[int]:
+        """Find page position of the first train with min price within price limit."""
+        if price_limit == ANY_PRICE:
+            return self.first_positions[-1]
+        cheaper_count = bisect_right(self.min_prices, price_limit)
+        if not cheaper_count:
+            return None
+        return self.first_positions[cheaper_count - 1]
+
+
+class FilteredPlaces:
+    """Trains with places of one page that fit car filter."""
+
+    __slots__ = ('min_prices', 'places')
+
+    def __init__(self, trains_with_places: List[Train], car_filter: CarFilter):
+        # Min price of fitting cars of every train by page position, None if no car fits
+        self.min_prices = [get_min_price(train, car_filter) for train in trains_with_places]
+        positions: Dict[str, List[Tuple[float, int]]] = {}
+        for position, train in enumerate(trains_with_places):
+            min_price = self.min_prices[position]
+            if min_price is not None:
+                positions.setdefault(train.normalized_number, []).append((min_price, position))
+        self.places: Dict[str, TrainPlaces] = {}
+        for number, number_positions in positions.items():
+            number_positions.sort()
+            first_positions = []
+            first_position = len(trains_with_places)
+            for _, position in number_positions:
+                first_position = min(first_position, position)
+                first_positions.append(first_position)
+            self.places[number] = TrainPlaces(
+                [min_price for min_price, _ in number_positions], first_positions)
+
+
+class PageIndex:
+    """Trains of one page indexed by car filter and normalized train number."""
+
+    __slots__ = ('trains', '_filtered_places')
+
+    def __init__(self, trains: Trains):
+        self.trains = trains
+        # Searches with the same car filter share one index
+        self._filtered_places: Dict[CarFilter, FilteredPlaces] = {}
+
+    def get_places(self, car_filter: CarFilter) -> FilteredPlaces:
+        """Get trains with places that fit car filter, index is built on first use."""
+        filtered_places = self._filtered_places.get(car_filter)
+        if not filtered_places:
+            filtered_places = FilteredPlaces(self.trains.with_places, car_filter)
+            self._filtered_places[car_filter] = filtered_places
+        return filtered_places
+
+    def evaluate(self, search: Search) -> Optional[str]:
+        """Check search against page trains.
+
+        Args:
+            search: User search.
+
+        Returns:
+            answer: Check answer. None if there is no news for user.
+        """
+        trains = self.trains
+        if not trains:
+            return None
+        numbers = search.normalized_numbers
+        if numbers.isdisjoint(trains.numbers):
+            if len(numbers) == 1:
+                return phrases.bad_train_number
+            return phrases.bad_train_numbers
+
+        filtered_places = self.get_places(search.car_filter)
+        first_position = None
+        for number in numbers:
+            train_places = filtered_places.places.get(number)
+            if not train_places:
+                continue
+            position = train_places.find_first_position(search.price_limit)
+            if position is not None and (first_position is None or position < first_position):
+                first_position = position
+        if first_position is not None:
+            train = trains.with_places[first_position]
+            if search.price_limit == ANY_PRICE:
+                return phrases.place_found.format(train_number=train.number, time=train.time)
+            return phrases.place_found_with_price.format(
+                train_number=train.number, time=train.time,
+                spaced_price=put_spaces_into_price(
+                    int(filtered_places.min_prices[first_position])))  # type: ignore
+
+        if numbers <= trains.gone_numbers:
+            return phrases.all_trains_gone
+        return None
+
+
+def evaluate_searches(trains: Trains, searches: Iterable[Search]) -> List[Tuple[Search, str]]:
+    """Check all route searches against one page.
+
+    Args:
+        trains: Trains collected from route page.
+        searches: Route searches.
+
+    Returns:
+        answers: Searches with news for users and their answers.
+    """
+    page_index = PageIndex(trains)
+    answers = []
+    for search in searches:
+        answer = page_index.evaluate(search)
+        if answer:
+            answers.append((search, answer))
+    return answers
+
+
+def get_min_price(train: Train, car_filter: CarFilter) -> Optional[float]:
+    """Get min price of train cars that fit car filter.
+
+    Args:
+        train: Train with places.
+        car_filter: Car classes (empty for any class) and min number of seats.
+
+    Returns:
+        min_price: Min price, inf if train fits but page doesn't show prices.
+                   None if no car fits.
+    """
+    if car_filter == ANY_CARS:
+        return min(train.prices.values(), default=math.inf)
+    car_classes, min_seats = car_filter
+    fitting_prices = []
+    for car_class in car_classes or train.car_classes.keys():
+        class_places = train.car_classes.get(car_class)
+        if not class_places:
+            continue
+        price, seats = class_places
+        # Train is considered fitting if page doesn't show number of seats
+        if seats is None or seats >= min_seats:
+            fitting_prices.append(price)
+    return min(fitting_prices, default=None)
+
+
+def put_spaces_into_price(price: int) -> str:
+    """Put spaces into price.
+
+    Args:
+        price: Place price.
+
+    Returns:
+        new_price: Price with spaces.
+    """
+    return f'{price:,}'.replace(',', ' ')
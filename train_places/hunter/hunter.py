@@ -3,6 +3,13 @@
 Bot needs environment varibles:
     GOOGLE_CHROME_BIN: Chrome browser path.
     CHROMEDRIVER_PATH: Chrome driver path (easy guide: https://youtu.be/Ven-pqwk3ec?t=184).
+    DRIVERS_POOL_SIZE: Max number of running browsers (default = 1).
+    DRIVER_MAX_PAGES: Browser restarts after this number of loaded pages (default = 100).
+    HUNTER_WORKERS: Max number of searches checked at once (default = DRIVERS_POOL_SIZE).
+    RZD_FETCH_BACKEND: Search page fetch backend, selenium or http (default = selenium).
+    RZD_SELENIUM_FALLBACK: Use selenium if http backend request failed, 1 or 0 (default = 1).
+    SEARCH_PAGE_TIMEOUT: Deadline for search page loading in seconds (default = 30).
+    PARSE_WORKERS: Number of search page parser processes (default = 1).
     TG_PROXY: Bot proxy (default = None).
     TG_BOT_TOKEN: Bot token.
     TG_LOG_BOT_TOKEN Telegram log bot token.
@@ -10,134 +17,444 @@ Bot needs environment varibles:
     DB_HOST: Redis database host.
     DB_PORT: Redis database port.
     DB_PASS: Redis database password.
+    DB_POOL_SIZE: Max number of Redis database connections (default = 10).
+    DB_BATCH_SIZE: Number of searches fetched from db in one pipeline (default = 500).
+    HUNTER_REQUESTS_PER_MINUTE: Global budget of rzd requests (default = 30).
+    MIN_POLL_INTERVAL: Min route poll interval in seconds (default = 20).
+    MAX_POLL_INTERVAL: Max route poll interval in seconds (default = 3600).
+    RZD_RPS: Max number of rzd requests per second (default = 1).
+    RZD_BURST: Max number of rzd requests made at once after idle time (default = 3).
+    RZD_BREAKER_FAILURES: Number of consecutive rzd failures that pause requests (default = 5).
+    RZD_BREAKER_RESET_TIMEOUT: Pause of rzd requests in seconds (default = 60).
+    NOTIFIER_WORKERS: Number of telegram message sender tasks (default = 4).
+    NOTIFIER_RATE: Max number of telegram messages per second (default = 30).
+    NOTIFIER_CHAT_INTERVAL: Min interval between messages to one chat in seconds (default = 1).
+    NOTIFIER_MAX_RETRIES: Max number of telegram message send retries (default = 5).
+    METRICS_PORT: Port of /metrics endpoint (default = None, endpoint isn't started).
+    ROUTE_CACHE_TTL: Parsed route page lifetime in seconds, 0 disables cache (default = 10).
+    ROUTE_CACHE_MAX_BYTES: Max size of cached route pages (default = 10 MB).
+    ROUTE_CACHE_REDIS: Share cached route pages through Redis, 1 or 0 (default = 0).
+    HUNTER_WORKER_ID: Unique hunter worker id (default = hostname-pid).
+    HUNTER_LEASE: Hunter worker lease in seconds (default = 30).
+    SEARCHES_RECONCILE_INTERVAL: Interval of live searches reconcile in seconds (default = 300).
 """
 
 import asyncio
 import datetime
-from itertools import product
 import os
-from typing import Optional, Tuple, List, Callable, Awaitable
+import time
+from typing import Optional, Tuple, List, Dict, TYPE_CHECKING
 
-from bs4 import BeautifulSoup, Tag
 from dotenv import load_dotenv
-from redis.exceptions import TimeoutError
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, WebDriverException
 
-from train_places.bots.tg_bot import bot
-from train_places.phrases import phrases
-from train_places.utils import utils
+from train_places.bots import tg_bot
+from train_places.hunter import (
+    changes, drivers, evaluator, live_searches, parser, route_cache, rzd_api, scheduler,
+    search_index, shards, throttling)
+from train_places.hunter.records import Search, Trains
+from train_places.utils import metrics, notifier, utils
 
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
 
-load_dotenv()
 
-# Logger bot
-log_bot = utils.get_logger_bot()
 # Logger name. Use it for errors handling with utils.handle_exception(LOGGER_NAME)
 LOGGER_NAME = 'place_hunter_logger'
 
-# DB conncetion
-redis_db = utils.get_db_connection()
+# Active searches by route and train number
+searches_index = search_index.SearchIndex()
+# Routes availability snapshots, used to skip checks of unchanged routes
+route_changes = changes.RouteChangesTracker()
 
-# Different patterns for different servers
-DIGIT_GROUPING_SEPARATORS = (b',', b'\xc2\xa0')
-separator = DIGIT_GROUPING_SEPARATORS[0]
+# Search page is ready when one of these elements is rendered
+PAGE_READY_SELECTOR = ', '.join((
+    '.j-trains-box .route-item',  # trains list
+    '.j-trains-box .alert-err',  # bad date
+    '.j-trains-box .message',  # route wasn't chosen
+))
+# Max pause between sweeps, search events end it earlier
+MAX_SWEEP_DELAY = 5
+# Pause between sweeps when there are no searches
+IDLE_SWEEP_DELAY = 10
+
+
+class SearchPageTimeout(Exception):
+    """Search page wasn't ready before the deadline."""
+
+
+class BrowserError(Exception):
+    """Local browser failed to start or crashed, rzd isn't to blame."""
 
 
 def main():
     """Run place hunter."""
+    load_dotenv()
     place_hunt = asyncio.get_event_loop()
     place_hunt.create_task(start_searching())
     place_hunt.close()
 
 
 async def start_searching():
-    """Run place hunter main task."""
-    while True:
-        try:
-            searches = await collect_searches()
-            if not searches:
-                await asyncio.sleep(10)
-                continue
-            await search_places(searches)
-        except Exception:
-            await utils.handle_exception(log_bot, LOGGER_NAME)
-        await asyncio.sleep(5)
+    """Run place hunter main task.
+
+    Hunter works as one of shard workers, it checks only its own routes and
+    keeps its lease alive, see shards module. Searches are kept in memory and
+    updated with search events, see live_searches module, hunter waits for
+    events between sweeps, so new and cancelled searches are handled at once.
+    """
+    shard_worker = shards.get_shard_worker()
+    heartbeats = asyncio.ensure_future(shards.keep_alive(shard_worker))
+    hunter_searches = live_searches.get_live_searches()
+    search_events = asyncio.ensure_future(live_searches.listen_search_events(hunter_searches))
+    try:
+        await index_searches()
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        await utils.handle_exception(utils.get_logger_bot(), LOGGER_NAME)
+    try:
+        while True:
+            delay = IDLE_SWEEP_DELAY
+            try:
+                searches = await refresh_searches()
+                if searches:
+                    await search_places(searches)
+                    next_due = scheduler.get_route_scheduler().seconds_until_next_due()
+                    delay = min(next_due if next_due is not None else MAX_SWEEP_DELAY,
+                                MAX_SWEEP_DELAY)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await utils.handle_exception(utils.get_logger_bot(), LOGGER_NAME)
+            await hunter_searches.wait_for_events(delay)
+    finally:
+        search_events.cancel()
+        heartbeats.cancel()
+        await shard_worker.leave()
+
+
+async def index_searches() -> None:
+    """Add searches made before searches index appeared to the index.
+
+    Whole keyspace is scanned by search patterns, so it's done once on start.
+    """
+    db = await utils.get_db_connection()
+    search_patterns = ['tg-*', 'vk-*']
+    batch_size = int(os.environ.get('DB_BATCH_SIZE', 500))
+    for search_pattern in search_patterns:
+        search_ids = [search_id async for search_id in db.iscan(
+            match=search_pattern, count=batch_size)]
+        searches = await fetch_searches(search_ids)
+        if searches:
+            await db.sadd(utils.SEARCHES_KEY, *searches)
+
+
+async def refresh_searches() -> Dict[str, Search]:
+    """Update live searches with searches from events or reconcile them with db.
+
+    Returns:
+        searches: Active searches of all users.
+    """
+    hunter_searches = live_searches.get_live_searches()
+    changed_ids = hunter_searches.pop_changed_ids()
+    if hunter_searches.is_reconcile_due():
+        hunter_searches.reconcile(await collect_searches())
+    elif changed_ids:
+        hunter_searches.update(changed_ids, await fetch_searches(changed_ids))
+        metrics.ACTIVE_SEARCHES.set(len(hunter_searches.searches))
+    return hunter_searches.searches
 
 
-async def collect_searches() -> dict:
+async def collect_searches() -> Dict[str, Search]:
     """Collect searches from db.
 
+    Search ids are taken from searches index, search hashes are fetched in
+    pipelined batches. Ids of searches that were removed are dropped from index.
+
     Returns:
-        searches: Collected searches.
+        searches: Collected searches. Unfinished searches are skipped.
     """
-    search_keys = await collect_search_keys()
-    searches = {}
-    for search_key in search_keys:
-        searches[search_key.decode('UTF-8')] = {
-            key.decode('UTF-8'): value.decode('UTF-8')
-            for key, value in redis_db.hgetall(search_key).items()
-        }
-        await asyncio.sleep(0)
+    db = await utils.get_db_connection()
+    with metrics.REDIS_SECONDS.time(operation='smembers'):
+        search_ids = await db.smembers(utils.SEARCHES_KEY)
+    searches = await fetch_searches(search_ids)
+    removed_search_ids = set(search_ids) - set(searches)
+    if removed_search_ids:
+        with metrics.REDIS_SECONDS.time(operation='srem'):
+            await db.srem(utils.SEARCHES_KEY, *removed_search_ids)
+    metrics.ACTIVE_SEARCHES.set(len(searches))
     return searches
 
 
-async def collect_search_keys():
-    """Collect search keys by search patterns from db.
+async def fetch_searches(search_ids: List[str]) -> Dict[str, Search]:
+    """Fetch searches from db in pipelined batches.
+
+    Args:
+        search_ids: Db keys of searches.
 
     Returns:
-        keys: Search keys.
+        searches: Fetched searches. Unfinished and missing searches are skipped.
     """
-    keys = []
-    search_patterns = ['tg-*', 'vk-*']
-    for search_pattern in search_patterns:
-        try:
-            # All scan methods returns cursor position and then list of keys: (0, [key1, key2])
-            search_keys = redis_db.scan(0, match=search_pattern, count=10000)[1]
-        except TimeoutError:
-            await asyncio.sleep(2)
-            return keys
-        if search_keys:
-            keys.extend(search_keys)
-        await asyncio.sleep(2)
-    return keys
-
-
-async def search_places(searches: dict) -> None:
+    db = await utils.get_db_connection()
+    batch_size = int(os.environ.get('DB_BATCH_SIZE', 500))
+    searches = {}
+    for batch_start in range(0, len(search_ids), batch_size):
+        batch = search_ids[batch_start:batch_start + batch_size]
+        pipe = db.pipeline()
+        for search_id in batch:
+            pipe.hgetall(search_id)
+        with metrics.REDIS_SECONDS.time(operation='fetch_searches'):
+            searches_info = await pipe.execute()
+        for search_id, search_info in zip(batch, searches_info):
+            search = Search.from_db(search_id, search_info)
+            if search:
+                searches[search_id] = search
+    return searches
+
+
+async def search_places(searches: Dict[str, Search]) -> None:
     """Search places in searches and notify user about its appearance.
 
+    Searches with the same url share one page fetch, searches are kept in
+    search index by route and train number, see search_index module. Only routes
+    of this shard worker that are due by route scheduler are checked, see shards
+    and scheduler modules. Routes are checked concurrently, number of
+    simultaneous checks is limited by HUNTER_WORKERS.
+
     Args:
         searches: Active searches of all users.
     """
-    for search_id, search_info in searches.items():
-        if search_info.get('price_limit') is None:
-            continue
-        answer = await check_search(search_info)
-        if answer:
-            await bot.send_message(chat_id=search_id[3:], text=answer)
-            await utils.remove_search_from_db(search_id)
-        await asyncio.sleep(5)
+    workers_count = os.environ.get('HUNTER_WORKERS', os.environ.get('DRIVERS_POOL_SIZE', 1))
+    workers = asyncio.Semaphore(int(workers_count))
+    shard_worker = shards.get_shard_worker()
+    added_urls = searches_index.update(searches)
+    routes = {
+        url: route for url, route in searches_index.routes.items() if shard_worker.owns(url)
+    }
+    route_scheduler = scheduler.get_route_scheduler()
+    # Routes with new searches are checked at once
+    route_scheduler.update_routes(
+        {url: len(route.searches) for url, route in routes.items()}, due_urls=added_urls)
+    route_changes.forget_other_routes(routes)
+    with metrics.SWEEP_SECONDS.time():
+        checked_searches = await asyncio.gather(*[
+            search_places_on_route(url, routes[url], workers)
+            for url in route_scheduler.pop_due_routes()
+        ])
+    metrics.SWEEP_SEARCHES.observe(sum(checked_searches))
+
+
+async def search_places_on_route(url: str, route: search_index.RouteSearches,
+                                 workers: asyncio.Semaphore) -> int:
+    """Fetch route page once and check route searches on it.
+
+    Fresh page is taken from route cache, see route_cache module. Only searches
+    that could get another answer since last check are checked, see changes
+    module, all of them are checked in one pass, see evaluator module. Next
+    route check is scheduled here. Exceptions are handled here, so one broken
+    route doesn't stop the others.
 
+    Args:
+        url: Normalized search url.
+        route: Indexed searches of route.
+        workers: Semaphore that limits number of simultaneous checks.
 
-async def check_search(search: dict) -> Optional[str]:
-    """Check single user search for places and return answer.
+    Returns:
+        checked_searches_count: Number of checked searches.
+    """
+    route_scheduler = scheduler.get_route_scheduler()
+    # Normalized url is only a key, fetch url exactly as user sent it
+    search_url = route.search_url
+    async with workers:
+        try:
+            page = await route_cache.get_route_cache().get_or_fetch(
+                url, lambda: fetch_route(search_url))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            route_scheduler.reschedule(url)
+            await utils.handle_exception(utils.get_logger_bot(), LOGGER_NAME)
+            return 0
+    if not page:
+        route_scheduler.reschedule(url)
+        return 0
+    bad_url_answer, trains = page
+    if bad_url_answer:
+        route.pop_unchecked()
+        searches_to_check = list(route.searches.values())
+        route_scheduler.reschedule(url)
+    else:
+        searches_to_check = route_changes.select_searches_to_check(url, trains, route)
+        now = datetime.datetime.utcnow() + datetime.timedelta(hours=3)
+        route_scheduler.reschedule(
+            url, changed=route_changes.is_route_changed(url),
+            departure=scheduler.get_nearest_departure(
+                search_url, trains, route.by_train.keys(), now),
+            now=now,
+        )
+
+    try:
+        if bad_url_answer:
+            answers = [(search, bad_url_answer) for search in searches_to_check]
+        else:
+            answers = evaluator.evaluate_searches(trains, searches_to_check)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        for search in searches_to_check:
+            route.forget_check(search)
+        await utils.handle_exception(utils.get_logger_bot(), LOGGER_NAME)
+        return 0
+
+    for search, answer in answers:
+        try:
+            await notify_user(search, answer)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            route.forget_check(search)
+            await utils.handle_exception(utils.get_logger_bot(), LOGGER_NAME)
+    return len(searches_to_check)
+
+
+async def notify_user(search: Search, answer: str) -> None:
+    """Queue search result for user, finished search is removed after message is sent.
+
+    Message is sent by notifier workers, so checks don't wait for telegram,
+    see notifier module. Search isn't queued twice while its message is pending,
+    and notification is claimed in db, so other hunter worker can't send it too.
+
+    Args:
+        search: User search.
+        answer: Answer to send to user.
+    """
+    user_notifier = notifier.get_notifier(tg_bot.get_bot(), on_error=handle_notification_error)
+    if user_notifier.is_pending(search.search_id):
+        return
+    # User could cancel or restart search while it was being checked
+    if not await is_search_actual(search):
+        return
+    if not await shards.claim_notification(search.search_id, search.start_search_time):
+        return
+
+    async def remove_search():
+        await utils.remove_search_from_db(search.search_id)
+
+    async def forget_search():
+        # Search will be checked and notified again
+        searches_index.forget_check(search)
+        await shards.release_notification(search.search_id, search.start_search_time)
+
+    user_notifier.notify(search.chat_id, answer, on_sent=remove_search,
+                         on_failed=forget_search, key=search.search_id)
+
+
+async def handle_notification_error() -> None:
+    """Handle exception of user message sending."""
+    await utils.handle_exception(utils.get_logger_bot(), LOGGER_NAME)
+
+
+async def is_search_actual(search: Search) -> bool:
+    """Check that search in db is still the same search that was collected.
+
+    Args:
+        search: Collected search.
+
+    Returns:
+        actual: True if search wasn't cancelled or restarted.
+    """
+    db = await utils.get_db_connection()
+    with metrics.REDIS_SECONDS.time(operation='hget'):
+        start_search_time = await db.hget(search.search_id, 'start_search_time')
+    if not start_search_time:
+        return False
+    return start_search_time == search.start_search_time
+
+
+async def fetch_route(url: str) -> Optional[Tuple[Optional[str], Trains]]:
+    """Fetch and parse search page with configured fetch backend.
+
+    Backends:
+        selenium: Load pass.rzd.ru page in Chrome and parse it.
+        http: Request rzd timetable api directly, Selenium is used as a fallback
+              if api request fails (unless RZD_SELENIUM_FALLBACK is 0).
+
+    Every backend request is rate limited and route isn't fetched while rzd
+    circuit breaker is open, see throttling module. Breaker gets one result per
+    route fetch, whatever backends were tried. Urls that can't be converted to
+    api request and local browser failures aren't rzd failures, so they aren't
+    recorded.
 
     Args:
-        search: User search info.
+        url: Search url.
 
     Returns:
-        answer: Answer to send to user. None if there is no places found.
+        page: Answer about bad url and collected trains. None if page wasn't fetched.
     """
-    response = await make_rzd_request(search['url'])
+    breaker = throttling.get_rzd_breaker()
+    if not breaker.allow_request():
+        return None
+    try:
+        page = await fetch_route_with_backends(url)
+    except (rzd_api.SearchUrlError, BrowserError):
+        return None
+    if page:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+    return page
+
+
+async def fetch_route_with_backends(url: str) -> Optional[Tuple[Optional[str], Trains]]:
+    """Fetch and parse search page, try selenium if http backend failed.
+
+    Args:
+        url: Search url.
+
+    Returns:
+        page: Answer about bad url and collected trains. None if rzd didn't answer.
+
+    Raises:
+        rzd_api.SearchUrlError: Url can't be converted to api request and
+                                selenium fallback is off.
+        BrowserError: Local browser failed.
+    """
+    if os.environ.get('RZD_FETCH_BACKEND', 'selenium') == 'http':
+        selenium_fallback = os.environ.get('RZD_SELENIUM_FALLBACK', '1') == '1'
+        try:
+            await throttling.get_rzd_limiter().acquire()
+            timetable = await rzd_api.fetch_timetable(url)
+        except rzd_api.SearchUrlError:
+            # Search page tells user what is wrong with url
+            if not selenium_fallback:
+                raise
+            timetable = None
+        if timetable is not None:
+            return parse_timetable(timetable)
+        if not selenium_fallback:
+            return None
+
+    await throttling.get_rzd_limiter().acquire()
+    response = await make_rzd_request(url)
     if not response:
         return None
+    return await parse_page(response)
+
+
+def parse_timetable(timetable: dict) -> Tuple[Optional[str], Trains]:
+    """Parse route timetable from rzd api, the same way as search page.
 
-    answer = check_for_bad_url(response)
-    if answer:
-        return answer
+    Args:
+        timetable: Route timetable.
 
-    answer = await check_trains_data(response, search['train_numbers'], search['price_limit'])
-    return answer
+    Returns:
+        bad_url_answer: Answer about bad url. None if url is ok.
+        trains: Collected trains, empty if url is bad.
+    """
+    bad_url_answer = parser.check_for_bad_date(rzd_api.get_timetable_messages(timetable))
+    if bad_url_answer:
+        return bad_url_answer, Trains()
+    return None, rzd_api.collect_timetable_trains(timetable)
 
 
 async def make_rzd_request(url) -> Optional[str]:
@@ -147,24 +464,26 @@ async def make_rzd_request(url) -> Optional[str]:
         url: Search url.
 
     Returns:
-        response: Page data.
+        response: Page data. None if rzd page wasn't loaded.
+
+    Raises:
+        BrowserError: Browser failed to start or crashed, error is already logged.
     """
-    # ChromeBrowser (heroku offical supports it) easy guide: https://youtu.be/Ven-pqwk3ec?t=184)
-    chrome_options = webdriver.ChromeOptions()
-    chrome_options.binary_location = os.environ.get('GOOGLE_CHROME_BIN')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--gpu-disable')
-    chrome_options.add_argument('log-level=2')
+    from selenium.common.exceptions import TimeoutException
+
+    driver_start_time = datetime.datetime.utcnow() + datetime.timedelta(hours=3)
+    timings: Dict[str, float] = {}
     try:
-        driver_start_time = datetime.datetime.utcnow() + datetime.timedelta(hours=3)
-        driver = webdriver.Chrome(
-            executable_path=os.environ.get('CHROMEDRIVER_PATH'),
-            options=chrome_options)
-        # If you want firefox driver use it this way:
-        # driver = webdriver.Firefox(executable_path=os.environ.get('FIREFOX_EXECUTABLE'))
-    except WebDriverException as ex:
+        async with drivers.get_drivers_pool().driver() as driver:
+            try:
+                data = await load_search_page(driver, url, timings)
+            except SearchPageTimeout:
+                # Driver is fine, page is just too slow, so it's not quitted
+                phases = ', '.join(
+                    f'{phase}: {duration:.1f}s' for phase, duration in timings.items())
+                print(f'Search page timed out ({phases})')
+                return None
+    except drivers.DriverStartError as ex:
         driver_broked_time = datetime.datetime.utcnow() + datetime.timedelta(hours=3)
         delta = driver_broked_time - driver_start_time
         delta_msg = f'\nBots downtime is {delta.seconds} seconds'
@@ -183,273 +502,132 @@ async def make_rzd_request(url) -> Optional[str]:
             # and handling
             print(text)
         else:
-            await utils.handle_exception(log_bot, LOGGER_NAME, text=delta_msg)
-        return None
-    except Exception:
-        await utils.handle_exception(log_bot, LOGGER_NAME)
-        return None
-
-    try:
-        driver.get(url)
-        # We must close driver if any exception raised, to save RAM
+            await utils.handle_exception(utils.get_logger_bot(), LOGGER_NAME, text=delta_msg)
+        raise BrowserError(ex.msg) from ex
+    # Pool quits driver if any exception raised, to save RAM
     except TimeoutException:
-        driver.close()
         return None
+    except asyncio.CancelledError:
+        raise
     except Exception as ex:
-        await utils.handle_exception(log_bot, LOGGER_NAME)
-        driver.close()
-
+        await utils.handle_exception(utils.get_logger_bot(), LOGGER_NAME)
         try:
             # ex.msg check is here coz sometimes driver dont write it in traceback
-            await log_bot.send_message(os.environ.get('TG_LOG_CHAT_ID'), ex.msg)  # type: ignore
+            await utils.get_logger_bot().send_message(
+                os.environ.get('TG_LOG_CHAT_ID'), ex.msg)  # type: ignore
         except Exception:
             pass
-        return None
-
-    await asyncio.sleep(2)
-    while True:
-        data = driver.page_source
-        if data.count('Подбираем поезда') < 2:
-            break
-        await asyncio.sleep(1)
-    driver.close()
+        raise BrowserError(repr(ex)) from ex
     return data
 
 
-def check_for_bad_url(response: str) -> Optional[str]:
-    """Check response for bad url, returns answer if url is bad, None otherwise."""
-    bad_date_msg = 'за пределами периода'
-    ticket_purchase_limit = '90 дней'
-    way_not_chosed = BeautifulSoup(response, 'lxml').select_one('.row .j-trains-box .message')
-    # rzd.ru shows bad date message if the date is yesterday date (so all trains
-    # are gone for this search) and bad date msg with ticket purchase limit in other
-    # wrong date cases
-    if way_not_chosed or (bad_date_msg in response and ticket_purchase_limit in response):
-        return phrases.bad_date_or_route
-    elif bad_date_msg in response:
-        return phrases.all_trains_gone
-    return None
-
-
-async def check_trains_data(response: str, raw_train_numbers: str,
-                            price_limit: str) -> Optional[str]:
-    """Check search url response data for places or mistakes.
-    
-    Args:
-        response: Fetched response.
-        raw_train_numbers: Search train numbers.
-        price_limit: Search price limit.
-    
-    Returns:
-        answer: Check answer. None if all checks passed, so there is no new places found.
-    """
-    trains_with_places, trains_that_gone, trains_without_places = await collect_trains(response)
-    if not trains_with_places and not trains_that_gone and not trains_with_places:
-        return None
-    train_numbers = [train_number for train_number in raw_train_numbers.split(',')]
-
-    for check in get_search_checks():
-        status, answer = await check(
-            train_numbers=train_numbers, price_limit=int(price_limit),
-            trains_with_places=trains_with_places, trains_that_gone=trains_that_gone,
-            trains_without_places=trains_without_places)
-        if status:
-            return answer
-        await asyncio.sleep(0)
-    return None
-
-
-def get_search_checks() -> Tuple[Callable[..., Awaitable[Tuple[bool, str]]]]:
-    """Get train checks."""
-    checks = (
-        check_for_wrong_train_numbers,
-        check_for_places,
-        check_for_all_gone
-    )
-    return checks  # type: ignore # mypy demands too much coz all callbacks have different args
+async def load_search_page(driver: 'WebDriver', url: str, timings: Dict[str, float]) -> str:
+    """Load search page and wait for trains list.
 
-
-async def collect_trains(data: str) -> Tuple[List[Tag], List[str], List[str]]:
-    """Collect all trains type from search page data.
-
-    Train types: train with places, train that gone, train without places
+    Page is ready when rzd.ru renders trains list or error message instead of
+    "Подбираем поезда" loader.
 
     Args:
-        data: Search page data.
+        driver: Selenium driver from pool.
+        url: Search url.
+        timings: Dict to store duration of every loading phase in seconds:
+                 load, ready_wait and page_source.
 
     Returns:
-        trains_with_places: Trains that have vacant places.
-                            Tag type of trains for subsequent selections.
-        trains_that_gone: Trains that gone.
-        trains_without_places: Trains without vacant places.
-    """
-    soup = BeautifulSoup(data, 'lxml')
-
-    train_with_places_divs = soup.select('div.route-item')
-    train_that_gone_divs = soup.select('div.route-item__train-is-gone')
-    train_without_places_divs = soup.select('div.route-item__train-without-places')
+        data: Page data.
 
-    trains_with_places = []
-    for train_div in train_with_places_divs:
-        await asyncio.sleep(0)
-        if train_div in train_that_gone_divs:
-            continue
-        if train_div in train_without_places_divs:
-            continue
-        trains_with_places.append(train_div)
-
-    trains_that_gone = [str(train_div) for train_div in train_that_gone_divs]
-
-    trains_without_places = []
-    for train_div in train_without_places_divs:
-        await asyncio.sleep(0)
-        if train_div in train_that_gone_divs:
-            continue
-        trains_without_places.append(str(train_div))
-    return trains_with_places, trains_that_gone, trains_without_places
-
-
-async def check_for_wrong_train_numbers(
-        train_numbers: List[str], trains_with_places: List[Tag],
-        trains_that_gone: List[str], trains_without_places: List[str],
-        **kwargs) -> Tuple[bool, str]:
-    """Check train numbers for collected trains entry.
+    Raises:
+        SearchPageTimeout: Trains list wasn't rendered before the deadline.
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.expected_conditions import presence_of_element_located
+    from selenium.webdriver.support.ui import WebDriverWait
 
-    Check is passed if at least one train number found on page.
+    deadline = time.monotonic() + float(os.environ.get('SEARCH_PAGE_TIMEOUT', 30))
 
-    Args:
-        train_numbers: Train numbers from user search.
-        trains_with_places: Trains that have vacant places.
-                            Tag type of trains for subsequent selections.
-        trains_that_gone: Trains that gone.
-        trains_without_places: Trains without vacant places.
+    phase_start = time.monotonic()
+    try:
+        await drivers.run_in_thread(driver.get, url)
+    except TimeoutException:
+        timings['load'] = time.monotonic() - phase_start
+        raise SearchPageTimeout(url)
+    timings['load'] = time.monotonic() - phase_start
+    metrics.PAGE_LOAD_SECONDS.observe(timings['load'])
 
-    Returns:
-        answer: Answer about bad train numbers.
-    """
-    status, answer = True, ''
-    all_trains_data = str(trains_with_places) + ''.join(trains_that_gone) \
-        + ''.join(trains_without_places)
-    for train_number in train_numbers:
-        await asyncio.sleep(0)
-        if train_number in all_trains_data:
-            status = False
-            break
-    if status:
-        if len(train_numbers) == 1:
-            answer = phrases.bad_train_number
-        else:
-            answer = phrases.bad_train_numbers
-    return status, answer
+    phase_start = time.monotonic()
+    wait = WebDriverWait(driver, max(deadline - time.monotonic(), 0), poll_frequency=0.25)
+    find_ready_element = presence_of_element_located((By.CSS_SELECTOR, PAGE_READY_SELECTOR))
+    polls = 0
 
+    def is_page_ready(driver: 'WebDriver'):
+        nonlocal polls
+        polls += 1
+        return find_ready_element(driver)
 
-async def check_for_places(train_numbers: List[str], trains_with_places: List[Tag],
-                           price_limit: int, **kwargs) -> Tuple[bool, str]:
-    r"""Check trains for vacant places with price limit.
+    try:
+        await drivers.run_in_thread(wait.until, is_page_ready)
+    except TimeoutException:
+        timings['ready_wait'] = time.monotonic() - phase_start
+        raise SearchPageTimeout(url)
+    finally:
+        metrics.PAGE_READY_POLLS.observe(polls)
+    timings['ready_wait'] = time.monotonic() - phase_start
+
+    phase_start = time.monotonic()
+    data = await drivers.run_in_thread(getattr, driver, 'page_source')
+    timings['page_source'] = time.monotonic() - phase_start
+    return data
 
-    If price limit == 1 check is not performed.
 
-    For development use in case of broked time selector:
-    import re
-    time_pattern = r'route_time\">\d{1,2}:\d{2}'
-    time = re.search(time_pattern, train_data)[0][-5:]
+def check_for_bad_url(response: str) -> Optional[str]:
+    """Check response for bad url, returns answer if url is bad, None otherwise."""
+    bad_url_answer, _ = parser.parse_search_page(response)
+    return bad_url_answer
 
-    Args:
-        train_numbers: Train numbers from user search.
-        trains_with_places: Trains that have vacant places.
-                            Tag type of trains for selections.
-        price_limit: Price limit for place price.
 
-    Returns:
-        Answer: Answer about finding suitable places.
-    """
-    status, answer = False, ''
-    for train_data, train_number in product(trains_with_places, train_numbers):
-        await asyncio.sleep(0)
-        if train_number not in str(train_data):
-            continue
-        status = True
-        time = train_data.select_one('span.train-info__route_time').text.strip()
-        if price_limit == 1:
-            answer = phrases.place_found.format(train_number=train_number, time=time)
-            break
-        price = await check_for_satisfying_price(train_data, price_limit)
-        if not price:
-            status = False
-            continue
-        spaced_price = await put_spaces_into_price(price)
-        answer = phrases.place_found_with_price.format(
-            train_number=train_number, time=time,
-            spaced_price=spaced_price)
-        break
-    return status, answer
-
-
-async def check_for_satisfying_price(train_data: Tag, price_limit: int) -> Optional[int]:
-    """Check train place for satisfying prices.
+async def parse_page(response: str) -> Tuple[Optional[str], Trains]:
+    """Parse search page once, so it can be checked for every route search.
 
     Args:
-        train_data: Tag of train data.
-        price_limit: Price limit of search.
+        response: Fetched response.
 
     Returns:
-        price: Satisfying place price.
+        bad_url_answer: Answer about bad url. None if url is ok.
+        trains: Collected trains, empty if url is bad.
     """
-    global separator
-    for span_price in train_data.select('span.route-cartype-price-rub'):
-        await asyncio.sleep(0)
-        try:
-            price = int(span_price.text.strip().encode('UTF-8').replace(separator, b''))
-        except ValueError:
-            separator = DIGIT_GROUPING_SEPARATORS[1]
-            price = int(span_price.text.strip().encode('UTF-8').replace(separator, b''))
-        if price <= price_limit:
-            return price
-    return None
-
+    return await parser.parse_search_page_in_executor(response)
 
-async def put_spaces_into_price(price: int) -> str:
-    """Put spaces into price.
 
+async def check_trains_data(response: str, raw_train_numbers: str,
+                            price_limit: str) -> Optional[str]:
+    """Check search url response data for places or mistakes.
+    
     Args:
-        price: Place price.
-
+        response: Fetched response.
+        raw_train_numbers: Search train numbers.
+        price_limit: Search price limit.
+    
     Returns:
-        new_price: Price with spaces.
+        answer: Check answer. None if all checks passed, so there is no new places found.
     """
-    new_price = str(price)
-    price_parts = []
-    while len(new_price) > 3:
-        price_parts.append(new_price[-3:])
-        new_price = new_price[:-3]
-    price_parts.append(new_price)
-    price_parts.reverse()
-    new_price = ' '.join(price_parts)
-    return new_price
+    _, trains = await parse_page(response)
+    search = Search(search_id='', url='', train_numbers=raw_train_numbers,
+                    price_limit=int(price_limit))
+    return check_trains(trains, search)
 
 
-async def check_for_all_gone(train_numbers: List[str], trains_that_gone: List[str],
-                             **kwargs) -> Tuple[bool, str]:
-    """Check train numbers for entry in gone trains.
+def check_trains(trains: Trains, search: Search) -> Optional[str]:
+    """Check collected trains of search page for places or mistakes.
 
     Args:
-        train_numbers: Train numbers from user search.
-        trains_that_gone: Trains that gone.
+        trains: Trains collected from search page.
+        search: User search.
 
     Returns:
-        answer: Answer about the departure of all searched trains.
+        answer: Check answer. None if all checks passed, so there is no new places found.
     """
-    status, answer = False, ''
-    gone_trains = []
-    for train, train_number in product(trains_that_gone, train_numbers):
-        await asyncio.sleep(0)
-        if train_number not in train:
-            continue
-        gone_trains.append(train_number)
-    if len(gone_trains) == len(train_numbers):
-        status = True
-        answer = phrases.all_trains_gone
-    return status, answer
+    return evaluator.PageIndex(trains).evaluate(search)
 
 
 if __name__ == "__main__":
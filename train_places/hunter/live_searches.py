@@ -0,0 +1,134 @@
+"""Live searches module.
+
+Bot publishes search lifecycle events to db channel in the same transaction
+that changes search, see utils.publish_search_event. Hunter keeps active
+searches in memory and refetches only searches from events, so new searches
+are checked and cancelled searches are dropped on the next sweep without
+collecting all searches from db.
+
+Pub/sub doesn't keep events while hunter isn't subscribed, so live searches
+are reconciled with searches index after every subscription and periodically
+as a safety net.
+
+Module needs environment variables:
+    SEARCHES_RECONCILE_INTERVAL: Interval of live searches reconcile in seconds (default = 300).
+
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+from train_places.hunter.records import Search
+from train_places.utils import utils
+
+
+# Pause before subscription is restored after connection loss in seconds
+RESUBSCRIBE_DELAY = 5
+
+_live_searches = None
+
+
+class LiveSearches:
+    """Active searches kept up to date with search events."""
+
+    def __init__(self, reconcile_interval: float):
+        # Search id -> active search
+        self.searches: Dict[str, Search] = {}
+        self.reconcile_interval = reconcile_interval
+        # Ids of searches changed since last refresh
+        self._changed_ids: Set[str] = set()
+        self._reconcile_time = 0.0
+        self._events: Optional[asyncio.Event] = None
+
+    def handle_event(self, event: dict) -> None:
+        """Remember search from event, it's refetched on the next refresh."""
+        self._changed_ids.add(event['search_id'])
+        self._get_events().set()
+
+    def request_reconcile(self) -> None:
+        """Reconcile live searches with db on the next refresh."""
+        self._reconcile_time = 0.0
+        self._get_events().set()
+
+    def is_reconcile_due(self) -> bool:
+        """Check that live searches should be collected from db again."""
+        return time.monotonic() >= self._reconcile_time
+
+    def pop_changed_ids(self) -> List[str]:
+        """Take ids of changed searches, wait for the next events after that."""
+        changed_ids = list(self._changed_ids)
+        self._changed_ids.clear()
+        self._get_events().clear()
+        return changed_ids
+
+    def reconcile(self, searches: Dict[str, Search]) -> None:
+        """Replace live searches with searches collected from db.
+
+        Events are dropped before searches are collected, see `pop_changed_ids`,
+        searches from them are already in collected searches.
+
+        Args:
+            searches: Active searches of all users.
+        """
+        self.searches = searches
+        self._reconcile_time = time.monotonic() + self.reconcile_interval
+
+    def update(self, search_ids: List[str], searches: Dict[str, Search]) -> None:
+        """Update changed searches, searches that weren't fetched are removed.
+
+        Args:
+            search_ids: Ids of changed searches.
+            searches: Changed searches fetched from db.
+        """
+        for search_id in search_ids:
+            search = searches.get(search_id)
+            if search:
+                self.searches[search_id] = search
+            else:
+                self.searches.pop(search_id, None)
+
+    async def wait_for_events(self, timeout: float) -> None:
+        """Wait for search events or reconcile request up to timeout in seconds."""
+        try:
+            await asyncio.wait_for(self._get_events().wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _get_events(self) -> asyncio.Event:
+        # Event is created in running loop, hunter workers make their own loops
+        if not self._events:
+            self._events = asyncio.Event()
+        return self._events
+
+
+def get_live_searches() -> LiveSearches:
+    """Get live searches of hunter (Singletone)."""
+    global _live_searches
+    if not _live_searches:
+        _live_searches = LiveSearches(float(os.environ.get('SEARCHES_RECONCILE_INTERVAL', 300)))
+    return _live_searches
+
+
+async def listen_search_events(live_searches: LiveSearches) -> None:
+    """Apply search events to live searches until cancelled.
+
+    Subscription is restored after connection loss, events published meanwhile
+    are lost, so live searches are reconciled after every subscription.
+
+    Args:
+        live_searches: Live searches of hunter.
+    """
+    while True:
+        try:
+            db = await utils.get_db_connection()
+            channel, = await db.subscribe(utils.SEARCH_EVENTS_CHANNEL)
+            live_searches.request_reconcile()
+            while await channel.wait_message():
+                live_searches.handle_event(await channel.get_json())
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            print(f'Search events subscription failed: {ex!r}')
+        await asyncio.sleep(RESUBSCRIBE_DELAY)
@@ -0,0 +1,213 @@
+"""Search page parser module.
+
+Search page is parsed once with lxml, all data needed for search checks
+is collected into compact train records, so checks don't touch html at all.
+
+Parsing is CPU-bound, so it is made in separate processes to keep event loop
+(and telegram bot that shares it) responsive.
+
+Module needs environment variables:
+    PARSE_WORKERS: Number of parser processes, 0 to parse in the event loop
+                   process (default = 1).
+
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import os
+from typing import Dict, Optional, Tuple
+
+import lxml.html
+
+from train_places.hunter.records import (
+    Train, Trains, TRAIN_GONE, TRAIN_WITH_PLACES, TRAIN_WITHOUT_PLACES)
+from train_places.phrases import phrases
+from train_places.utils import metrics
+
+
+_parse_executor = None
+
+
+def has_class(class_name: str) -> str:
+    """Get XPath condition for html class (like css .class_name selector)."""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {class_name} ")'
+
+
+# Same as ".row .j-trains-box .message" css selector, but trains box is searched first,
+# that is much faster than checking every descendant of every row
+WAY_NOT_CHOSED_XPATH = (
+    f'//*[{has_class("j-trains-box")}][ancestor::*[{has_class("row")}]]'
+    f'//*[{has_class("message")}]'
+)
+TRAINS_XPATH = f'//div[{has_class("route-item")}]'
+TRAIN_NUMBER_XPATH = f'.//span[{has_class("route-trnum")}]'
+TRAIN_TIME_XPATH = f'.//span[{has_class("train-info__route_time")}]'
+CAR_TYPES_XPATH = f'.//div[{has_class("route-carType-item")}]'
+# Classes of car type div spans, spans are collected in one pass over car type div
+CAR_TYPE_CLASS = 'serv-cat'
+CAR_PRICE_CLASS = 'route-cartype-price-rub'
+CAR_SEATS_CLASS = 'route-cartype-places-left'
+CAR_SPAN_CLASSES = frozenset((CAR_TYPE_CLASS, CAR_PRICE_CLASS, CAR_SEATS_CLASS))
+
+
+async def parse_search_page_in_executor(response: str) -> Tuple[Optional[str], Trains]:
+    """Parse search page in parser process.
+
+    Only raw page goes to parser process and only compact train records come back.
+
+    Args:
+        response: Fetched response.
+
+    Returns:
+        bad_url_answer: Answer about bad url. None if url is ok.
+        trains: Collected trains, empty if url is bad.
+    """
+    executor = get_parse_executor()
+    with metrics.PARSE_SECONDS.time():
+        if not executor:
+            return parse_search_page(response)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, parse_search_page, response)
+
+
+def get_parse_executor() -> Optional[ProcessPoolExecutor]:
+    """Get parser processes executor (Singletone). None if PARSE_WORKERS is 0."""
+    global _parse_executor
+    if not _parse_executor:
+        workers = int(os.environ.get('PARSE_WORKERS', 1))
+        if not workers:
+            return None
+        _parse_executor = ProcessPoolExecutor(max_workers=workers)
+    return _parse_executor
+
+
+def shutdown_parse_executor() -> None:
+    """Stop parser processes."""
+    global _parse_executor
+    if _parse_executor:
+        _parse_executor.shutdown()
+        _parse_executor = None
+
+
+def parse_search_page(response: str) -> Tuple[Optional[str], Trains]:
+    """Parse search page in one pass.
+
+    Args:
+        response: Fetched response.
+
+    Returns:
+        bad_url_answer: Answer about bad url. None if url is ok.
+        trains: Collected trains, empty if url is bad.
+    """
+    root = lxml.html.document_fromstring(response)
+    if root.xpath(WAY_NOT_CHOSED_XPATH):
+        return phrases.bad_date_or_route, Trains()
+    bad_url_answer = check_for_bad_date(response)
+    if bad_url_answer:
+        return bad_url_answer, Trains()
+    return None, collect_trains(root)
+
+
+def check_for_bad_date(text: str) -> Optional[str]:
+    """Check rzd messages for bad date, returns answer if date is bad, None otherwise."""
+    bad_date_msg = 'за пределами периода'
+    ticket_purchase_limit = '90 дней'
+    # rzd.ru shows bad date message if the date is yesterday date (so all trains
+    # are gone for this search) and bad date msg with ticket purchase limit in other
+    # wrong date cases
+    if bad_date_msg in text and ticket_purchase_limit in text:
+        return phrases.bad_date_or_route
+    elif bad_date_msg in text:
+        return phrases.all_trains_gone
+    return None
+
+
+def collect_trains(root: lxml.html.HtmlElement) -> Trains:
+    """Collect all trains from parsed search page.
+
+    Args:
+        root: Parsed search page.
+
+    Returns:
+        trains: Trains with places, trains that gone and trains without places.
+    """
+    trains = (collect_train(train_div) for train_div in root.xpath(TRAINS_XPATH))
+    return Trains(train for train in trains if train)
+
+
+def collect_train(train_div: lxml.html.HtmlElement) -> Optional[Train]:
+    """Collect train record from train div of search page.
+
+    Args:
+        train_div: Train div.
+
+    Returns:
+        train: Train record. None if div is not a train (rzd.ru page has some templates).
+    """
+    number_spans = train_div.xpath(TRAIN_NUMBER_XPATH)
+    if not number_spans:
+        return None
+    time_spans = train_div.xpath(TRAIN_TIME_XPATH)
+
+    train_classes = train_div.get('class', '').split()
+    if 'route-item__train-is-gone' in train_classes:
+        status = TRAIN_GONE
+    elif 'route-item__train-without-places' in train_classes:
+        status = TRAIN_WITHOUT_PLACES
+    else:
+        status = TRAIN_WITH_PLACES
+
+    prices: Dict[str, int] = {}
+    seats: Dict[str, int] = {}
+    for car_type_div in train_div.xpath(CAR_TYPES_XPATH):
+        car_spans = collect_car_spans(car_type_div)
+        price_span = car_spans.get(CAR_PRICE_CLASS)
+        if price_span is None:
+            continue
+        car_type_span = car_spans.get(CAR_TYPE_CLASS)
+        car_type = car_type_span.text_content().strip() if car_type_span is not None else ''
+        price = parse_number(price_span.text_content())
+        prices[car_type] = min(price, prices.get(car_type, price))
+        seats_span = car_spans.get(CAR_SEATS_CLASS)
+        if seats_span is not None:
+            seats[car_type] = seats.get(car_type, 0) + parse_number(seats_span.text_content())
+
+    return Train(
+        number=number_spans[0].text_content().strip(),
+        time=time_spans[0].text_content().strip() if time_spans else '',
+        status=status,
+        prices=prices,
+        seats=seats,
+    )
+
+
+def collect_car_spans(car_type_div: lxml.html.HtmlElement) -> Dict[str, lxml.html.HtmlElement]:
+    """Collect the first span of every class of car type div in one pass.
+
+    Args:
+        car_type_div: Car type div of train.
+
+    Returns:
+        car_spans: Span class -> span.
+    """
+    car_spans: Dict[str, lxml.html.HtmlElement] = {}
+    for span in car_type_div.iter('span'):
+        for span_class in span.get('class', '').split():
+            if span_class in CAR_SPAN_CLASSES and span_class not in car_spans:
+                car_spans[span_class] = span
+    return car_spans
+
+
+def parse_number(raw_number: str) -> int:
+    """Parse number from search page text.
+
+    Digit grouping separators differ between rzd.ru servers (comma, no-break
+    space), so all non-digit characters are dropped, like "Мест: " of seats.
+
+    Args:
+        raw_number: Price or seats text from search page, like "4 579".
+
+    Returns:
+        number: Parsed number.
+    """
+    return int(''.join(char for char in raw_number if char.isdigit()))
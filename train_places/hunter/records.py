@@ -0,0 +1,216 @@
+"""Place hunter records module.
+
+Searches from db and trains from search page are converted to these records
+once, so checks work with exact set and dict lookups instead of substring
+search in html or decoded db strings.
+
+"""
+
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from train_places.utils import utils
+
+
+# Train statuses
+TRAIN_WITH_PLACES = 'with_places'
+TRAIN_GONE = 'gone'
+TRAIN_WITHOUT_PLACES = 'without_places'
+
+# Users often type latin letters instead of cyrillic ones in train numbers
+LATIN_TO_CYRILLIC = str.maketrans('ABCEHKMOPTXY', 'АВСЕНКМОРТХУ')
+
+# Car classes users can choose -> car types of rzd.ru that belong to them
+CAR_CLASSES = {
+    'плацкарт': ('плацкартный', 'плацкарт'),
+    'купе': ('купе', 'купе-переговорная'),
+    'св': ('св',),
+    'люкс': ('люкс',),
+    'сидячий': ('сидячий', 'эконом', 'эконом+', 'бизнес класс', 'первый класс'),
+    'общий': ('общий',),
+}
+CAR_TYPE_CLASSES = {
+    car_type: car_class for car_class, car_types in CAR_CLASSES.items()
+    for car_type in car_types
+}
+
+
+def normalize_train_number(train_number: str) -> str:
+    """Normalize train number for exact comparison.
+
+    Sometimes rzd.ru changing train numbers from "135*C" to "135C" nearly 5 minutes
+    before train departure, so both variants are normalized to "135С".
+
+    Args:
+        train_number: Train number from user or from search page.
+
+    Returns:
+        normalized_number: Train number without spaces and stars in upper case
+                           with cyrillic letters.
+    """
+    return train_number.strip().upper().translate(LATIN_TO_CYRILLIC).replace('*', '')
+
+
+def get_car_class(car_type: str) -> str:
+    """Get car class of rzd.ru car type, unknown car type is a class itself.
+
+    Args:
+        car_type: Car type from search page, like "Плацкартный".
+
+    Returns:
+        car_class: Car class in lower case, like "плацкарт".
+    """
+    car_type = car_type.strip().lower()
+    return CAR_TYPE_CLASSES.get(car_type, car_type)
+
+
+def parse_car_filter(text: str) -> Optional[Tuple[List[str], int]]:
+    """Parse car classes and min number of seats from user message.
+
+    Message is a list of car classes and optional number of seats, like
+    "купе, св 2". "Любые" means any car class.
+
+    Args:
+        text: Message from user.
+
+    Returns:
+        car_classes: Chosen car classes, empty if any class fits.
+        min_seats: Min number of seats in train of chosen classes.
+        None if message can't be parsed.
+    """
+    car_classes: List[str] = []
+    min_seats = 1
+    for word in text.replace(',', ' ').lower().split():
+        if word.isdigit() and int(word) > 0:
+            min_seats = int(word)
+        elif word in CAR_CLASSES:
+            car_classes.append(word)
+        elif word not in ('любые', 'любой'):
+            return None
+    return list(dict.fromkeys(car_classes)), min_seats
+
+
+class Train:
+    """Train record of search page.
+
+    Prices are min prices of cars with places by car type in page order, seats
+    are numbers of free seats by car type (empty if page doesn't show them).
+    Car classes index is built from them, so car class filters are checked
+    with dict lookups.
+    """
+
+    __slots__ = ('number', 'normalized_number', 'time', 'status', 'prices', 'seats',
+                 'car_classes')
+
+    def __init__(self, number: str, time: str, status: str, prices: Dict[str, int],
+                 seats: Optional[Dict[str, int]] = None):
+        self.number = number
+        self.normalized_number = normalize_train_number(number)
+        self.time = time
+        self.status = status
+        self.prices = prices
+        self.seats = seats or {}
+        # Car class -> min price and number of free seats (None if unknown)
+        self.car_classes: Dict[str, Tuple[int, Optional[int]]] = {}
+        for car_type, price in prices.items():
+            car_class = get_car_class(car_type)
+            car_seats = self.seats.get(car_type)
+            if car_class in self.car_classes:
+                class_price, class_seats = self.car_classes[car_class]
+                price = min(price, class_price)
+                if car_seats is not None and class_seats is not None:
+                    car_seats += class_seats
+                else:
+                    car_seats = None
+            self.car_classes[car_class] = price, car_seats
+
+    def __repr__(self):
+        return f'<Train(number={self.number}, time={self.time}, status={self.status})>'
+
+
+class Trains:
+    """All trains of search page.
+
+    Train types: train with places, train that gone, train without places.
+    """
+
+    __slots__ = ('with_places', 'gone', 'without_places', 'numbers', 'gone_numbers')
+
+    def __init__(self, trains: Iterable[Train] = ()):
+        self.with_places: List[Train] = []
+        self.gone: List[Train] = []
+        self.without_places: List[Train] = []
+        trains_by_status = {
+            TRAIN_WITH_PLACES: self.with_places,
+            TRAIN_GONE: self.gone,
+            TRAIN_WITHOUT_PLACES: self.without_places,
+        }
+        trains = list(trains)
+        for train in trains:
+            trains_by_status[train.status].append(train)
+        self.numbers = frozenset(train.normalized_number for train in trains)
+        self.gone_numbers = frozenset(train.normalized_number for train in self.gone)
+
+    def __bool__(self):
+        return bool(self.numbers)
+
+    def __repr__(self):
+        return (f'<Trains(with_places={len(self.with_places)}, gone={len(self.gone)}, '
+                f'without_places={len(self.without_places)})>')
+
+
+class Search:
+    """User search record."""
+
+    __slots__ = ('search_id', 'url', 'train_numbers', 'normalized_numbers',
+                 'price_limit', 'start_search_time', 'car_classes', 'min_seats')
+
+    def __init__(self, search_id: str, url: str, train_numbers: str, price_limit: int,
+                 start_search_time: Optional[str] = None, car_classes: str = '',
+                 min_seats: int = 1):
+        self.search_id = search_id
+        self.url = url
+        self.train_numbers = list(dict.fromkeys(utils.parse_train_numbers(train_numbers)))
+        self.normalized_numbers: FrozenSet[str] = frozenset(
+            normalize_train_number(train_number) for train_number in self.train_numbers)
+        self.price_limit = price_limit
+        self.start_search_time = start_search_time
+        # Empty if any car class fits
+        self.car_classes: FrozenSet[str] = frozenset(
+            car_class.strip() for car_class in car_classes.split(',') if car_class.strip())
+        self.min_seats = min_seats
+
+    @classmethod
+    def from_db(cls, search_id: str, search_info: Dict[str, str]) -> Optional['Search']:
+        """Make search record from decoded db hash.
+
+        Args:
+            search_id: Db key for search.
+            search_info: Decoded search hash.
+
+        Returns:
+            search: Search record. None if user hasn't finished search creation yet.
+        """
+        if search_info.get('price_limit') is None or not search_info.get('train_numbers'):
+            return None
+        return cls(
+            search_id=search_id,
+            url=search_info['url'],
+            train_numbers=search_info['train_numbers'],
+            price_limit=int(search_info['price_limit']),
+            start_search_time=search_info.get('start_search_time'),
+            car_classes=search_info.get('car_classes', ''),
+            min_seats=int(search_info.get('min_seats', 1)),
+        )
+
+    @property
+    def car_filter(self) -> Tuple[FrozenSet[str], int]:
+        """Car classes and min number of seats, searches with the same filter share checks."""
+        return self.car_classes, self.min_seats
+
+    @property
+    def chat_id(self) -> str:
+        """Chat id without platform prefix."""
+        return utils.get_chat_key(self.search_id)[3:]
+
+    def __repr__(self):
+        return f'<Search(id={self.search_id}, trains={",".join(self.train_numbers)})>'
@@ -0,0 +1,203 @@
+"""Route cache module.
+
+Parsed route pages (answer about bad url and trains) are cached by normalized
+url for a short time, so repeated checks of the same route reuse fresh data
+instead of loading the page again. Concurrent fetches of the same route are
+coalesced: only one fetch is made, others wait for its result.
+
+Cache is limited by size of serialized pages, least recently used pages are
+evicted first. Optionally pages are shared through Redis, so several hunter
+processes reuse each other's fetches.
+
+Module needs environment variables:
+    ROUTE_CACHE_TTL: Page lifetime in seconds, 0 disables cache (default = 10).
+    ROUTE_CACHE_MAX_BYTES: Max size of cached pages (default = 10 MB).
+    ROUTE_CACHE_REDIS: Share cached pages through Redis, 1 or 0 (default = 0).
+
+"""
+
+import asyncio
+from collections import OrderedDict
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from train_places.hunter.records import Train, Trains
+from train_places.utils import metrics, utils
+
+
+# Answer about bad url and collected trains
+Page = Tuple[Optional[str], Trains]
+
+REDIS_KEY_PREFIX = 'route_cache:'
+
+_route_cache = None
+
+
+class CachedPage:
+    """Cached page with its expiration time and serialized size."""
+
+    __slots__ = ('page', 'expires_at', 'size')
+
+    def __init__(self, page: Page, expires_at: float, size: int):
+        self.page = page
+        self.expires_at = expires_at
+        self.size = size
+
+
+class RouteCache:
+    """LRU cache of parsed route pages with TTL and single-flight fetches."""
+
+    def __init__(self, ttl: float, max_bytes: int, use_redis: bool = False):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.use_redis = use_redis
+        self.size = 0
+        self._pages: 'OrderedDict[str, CachedPage]' = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def get_or_fetch(self, url: str,
+                           fetch: Callable[[], Awaitable[Optional[Page]]]) -> Optional[Page]:
+        """Get fresh route page from cache or fetch it.
+
+        Failed fetches (None) aren't cached.
+
+        Args:
+            url: Normalized search url.
+            fetch: Coroutine function that fetches route page.
+
+        Returns:
+            page: Answer about bad url and collected trains. None if page wasn't fetched.
+        """
+        if self.ttl <= 0:
+            return await fetch()
+
+        page = self.get(url)
+        if page:
+            metrics.ROUTE_CACHE_REQUESTS.inc(result='hit')
+            return page
+
+        in_flight = self._in_flight.get(url)
+        if in_flight:
+            metrics.ROUTE_CACHE_REQUESTS.inc(result='coalesced')
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_event_loop().create_future()
+        self._in_flight[url] = future
+        try:
+            page, ttl = await self._get_from_redis(url)
+            if page:
+                metrics.ROUTE_CACHE_REQUESTS.inc(result='redis_hit')
+            else:
+                metrics.ROUTE_CACHE_REQUESTS.inc(result='miss')
+                page = await fetch()
+                if page:
+                    await self._put_to_redis(url, page)
+            if page:
+                self.put(url, page, ttl)
+            future.set_result(page)
+        except Exception as ex:
+            future.set_exception(ex)
+            # Waiters get exception, so it's not unretrieved
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[url]
+        return page
+
+    def get(self, url: str) -> Optional[Page]:
+        """Get fresh page from local cache."""
+        cached_page = self._pages.get(url)
+        if not cached_page:
+            return None
+        if cached_page.expires_at <= time.monotonic():
+            self._remove(url)
+            return None
+        self._pages.move_to_end(url)
+        return cached_page.page
+
+    def put(self, url: str, page: Page, ttl: Optional[float] = None) -> None:
+        """Put page into local cache, least recently used pages are evicted if cache is full.
+
+        Args:
+            url: Normalized search url.
+            page: Route page.
+            ttl: Page lifetime in seconds (default = cache ttl).
+        """
+        size = len(dump_page(page))
+        if size > self.max_bytes:
+            return
+        if url in self._pages:
+            self._remove(url)
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._pages[url] = CachedPage(page, expires_at, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            oldest_url = next(iter(self._pages))
+            self._remove(oldest_url)
+            metrics.ROUTE_CACHE_EVICTIONS.inc()
+        metrics.ROUTE_CACHE_BYTES.set(self.size)
+
+    def _remove(self, url: str) -> None:
+        cached_page = self._pages.pop(url)
+        self.size -= cached_page.size
+        metrics.ROUTE_CACHE_BYTES.set(self.size)
+
+    async def _get_from_redis(self, url: str) -> Tuple[Optional[Page], Optional[float]]:
+        """Get page shared by other hunter process and its remaining lifetime."""
+        if not self.use_redis:
+            return None, None
+        db = await utils.get_db_connection()
+        pipe = db.pipeline()
+        pipe.get(REDIS_KEY_PREFIX + url)
+        pipe.pttl(REDIS_KEY_PREFIX + url)
+        with metrics.REDIS_SECONDS.time(operation='route_cache_get'):
+            dumped_page, ttl_ms = await pipe.execute()
+        if not dumped_page or ttl_ms <= 0:
+            return None, None
+        return load_page(dumped_page), ttl_ms / 1000
+
+    async def _put_to_redis(self, url: str, page: Page) -> None:
+        """Share page with other hunter processes."""
+        if not self.use_redis:
+            return
+        db = await utils.get_db_connection()
+        with metrics.REDIS_SECONDS.time(operation='route_cache_set'):
+            await db.set(REDIS_KEY_PREFIX + url, dump_page(page), pexpire=int(self.ttl * 1000))
+
+
+def dump_page(page: Page) -> str:
+    """Serialize route page to json."""
+    bad_url_answer, trains = page
+    return json.dumps({
+        'bad_url_answer': bad_url_answer,
+        'trains': [
+            [train.number, train.time, train.status, list(train.prices.items()),
+             list(train.seats.items())]
+            for train in trains.with_places + trains.gone + trains.without_places
+        ],
+    }, ensure_ascii=False)
+
+
+def load_page(dumped_page: str) -> Page:
+    """Deserialize route page from json."""
+    page_data = json.loads(dumped_page)
+    trains = Trains(
+        Train(number=number, time=train_time, status=status, prices=dict(prices),
+              seats=dict(seats))
+        for number, train_time, status, prices, seats in page_data['trains']
+    )
+    return page_data['bad_url_answer'], trains
+
+
+def get_route_cache() -> RouteCache:
+    """Get route cache (Singletone)."""
+    global _route_cache
+    if not _route_cache:
+        _route_cache = RouteCache(
+            ttl=float(os.environ.get('ROUTE_CACHE_TTL', 10)),
+            max_bytes=int(os.environ.get('ROUTE_CACHE_MAX_BYTES', 10 * 1024 * 1024)),
+            use_redis=os.environ.get('ROUTE_CACHE_REDIS', '0') == '1',
+        )
+    return _route_cache
@@ -0,0 +1,226 @@
+"""Rzd timetable api module.
+
+Direct HTTP fetch backend for place hunter. It requests timetable json from
+the same endpoint that pass.rzd.ru page uses, so no browser is needed.
+
+Rzd api is asynchronous: first request returns request id (RID) and the same
+url with this id must be polled until trains are ready:
+    ?layer_id=5827&dir=0&tfl=3&checkSeats=0&code0=...&dt0=...&code1=...
+        -> {"result": "RID", "RID": 12345}
+    ?layer_id=5827&rid=12345
+        -> {"result": "RID", ...} (still searching)
+        -> {"result": "OK", "tp": [{"list": [...trains...], "msgList": [...]}]}
+
+Module needs environment variables:
+    RZD_TIMETABLE_URL: Timetable endpoint (default = https://pass.rzd.ru/timetable/public/ru).
+    RZD_API_TIMEOUT: Request timeout in seconds (default = 15).
+    RZD_API_POLL_DELAY: Delay between RID polls in seconds (default = 1).
+    RZD_API_MAX_POLLS: Max number of RID polls (default = 10).
+
+"""
+
+import asyncio
+import datetime
+import json
+import os
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import aiohttp
+
+from train_places.hunter.records import (
+    Train, Trains, TRAIN_GONE, TRAIN_WITH_PLACES, TRAIN_WITHOUT_PLACES)
+
+
+TIMETABLE_URL = 'https://pass.rzd.ru/timetable/public/ru'
+TIMETABLE_LAYER_ID = 5827
+SEARCH_PARAMS = ('code0', 'code1', 'dt0')
+
+_session = None
+
+
+class SearchUrlError(Exception):
+    """Search url can't be converted to api request, rzd isn't to blame."""
+
+
+async def fetch_timetable(url: str) -> Optional[dict]:
+    """Fetch route timetable for search url.
+
+    Args:
+        url: Search url from user.
+
+    Returns:
+        timetable: Route timetable. None if api didn't answer properly.
+
+    Raises:
+        SearchUrlError: Url can't be converted to api request.
+    """
+    search_params = parse_search_url(url)
+    if not search_params:
+        raise SearchUrlError(url)
+    query = {
+        'layer_id': TIMETABLE_LAYER_ID,
+        'dir': 0,
+        'tfl': 3,
+        'checkSeats': 0,
+        **search_params,
+    }
+    max_polls = int(os.environ.get('RZD_API_MAX_POLLS', 10))
+    poll_delay = float(os.environ.get('RZD_API_POLL_DELAY', 1))
+    try:
+        data = await request_json(query)
+        for _ in range(max_polls):
+            if not isinstance(data, dict) or data.get('result') != 'RID':
+                break
+            await asyncio.sleep(poll_delay)
+            data = await request_json({'layer_id': TIMETABLE_LAYER_ID, 'rid': data['RID']})
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError):
+        return None
+    if not isinstance(data, dict) or data.get('result') != 'OK':
+        return None
+    timetables = data.get('tp')
+    if not isinstance(timetables, list) or not timetables or not isinstance(timetables[0], dict):
+        return None
+    return timetables[0]
+
+
+async def request_json(query: dict) -> dict:
+    """Make api request and decode json answer.
+
+    Rzd sends json with text/html content type, so it is decoded manually.
+
+    Raises:
+        aiohttp.ClientError: Request failed.
+        asyncio.TimeoutError: Request timed out.
+        ValueError: Answer is not json.
+    """
+    session = get_session()
+    timetable_url = os.environ.get('RZD_TIMETABLE_URL', TIMETABLE_URL)
+    async with session.get(timetable_url, params=query) as response:
+        response.raise_for_status()
+        text = await response.text()
+    return json.loads(text)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Get api http session (Singletone).
+
+    Session keeps rzd cookies, RID answers are bound to them.
+    """
+    global _session
+    if not _session or _session.closed:
+        timeout = aiohttp.ClientTimeout(total=float(os.environ.get('RZD_API_TIMEOUT', 15)))
+        _session = aiohttp.ClientSession(timeout=timeout)
+    return _session
+
+
+async def close_session() -> None:
+    """Close api http session."""
+    global _session
+    if _session:
+        await _session.close()
+        _session = None
+
+
+def parse_search_url(url: str) -> Optional[Dict[str, str]]:
+    """Get route parameters from search url.
+
+    Parameters can be placed in url query (?code0=2000000&dt0=...) or
+    in fragment (#code0=2000000|dt0=...), it depends on the way search was made.
+
+    Args:
+        url: Search url from user.
+
+    Returns:
+        search_params: Route codes and date. None if some of them are missing.
+    """
+    split_url = urlsplit(url.strip())
+    params = dict(parse_qsl(split_url.query))
+    for fragment_param in split_url.fragment.split('|'):
+        key, _, value = fragment_param.partition('=')
+        if value:
+            params[key] = value
+    if not all(params.get(param) for param in SEARCH_PARAMS):
+        return None
+    return {param: params[param] for param in SEARCH_PARAMS}
+
+
+def get_timetable_messages(timetable: dict) -> str:
+    """Get text of rzd messages about route (bad date, no trains, etc.)."""
+    messages = timetable.get('msgList') or []
+    return '\n'.join(str(message.get('message', '')) for message in messages)
+
+
+def collect_timetable_trains(timetable: dict,
+                             now: Optional[datetime.datetime] = None) -> Trains:
+    """Collect all trains from route timetable.
+
+    Malformed trains and cars are skipped, so one bad record doesn't break route check.
+
+    Args:
+        timetable: Route timetable.
+        now: Current Moscow time, train is gone if it departed before it.
+
+    Returns:
+        trains: Trains with places, trains that gone and trains without places.
+    """
+    if not now:
+        now = datetime.datetime.utcnow() + datetime.timedelta(hours=3)
+    trains: List[Train] = []
+    trains_data = timetable.get('list') or []
+    if not isinstance(trains_data, list):
+        trains_data = []
+    for train_data in trains_data:
+        train = collect_timetable_train(train_data, now)
+        if train:
+            trains.append(train)
+    return Trains(trains)
+
+
+def collect_timetable_train(train_data: dict, now: datetime.datetime) -> Optional[Train]:
+    """Collect train record from timetable train, malformed cars are skipped.
+
+    Args:
+        train_data: Timetable train.
+        now: Current Moscow time, train is gone if it departed before it.
+
+    Returns:
+        train: Train record. None if train data is malformed.
+    """
+    if not isinstance(train_data, dict) or not train_data.get('number'):
+        return None
+    try:
+        departure = datetime.datetime.strptime(
+            f'{train_data["date0"]} {train_data["time0"]}', '%d.%m.%Y %H:%M')
+    except (KeyError, TypeError, ValueError):
+        return None
+    cars = train_data.get('cars') or []
+    if not isinstance(cars, list):
+        return None
+    cars_with_places = [car for car in cars if isinstance(car, dict) and car.get('freeSeats')]
+    prices: Dict[str, int] = {}
+    seats: Dict[str, int] = {}
+    for car in cars_with_places:
+        if not car.get('tariff'):
+            continue
+        try:
+            car_type = car.get('typeLoc', '')
+            price, free_seats = int(car['tariff']), int(car['freeSeats'])
+        except (TypeError, ValueError):
+            continue
+        prices[car_type] = min(price, prices.get(car_type, price))
+        seats[car_type] = seats.get(car_type, 0) + free_seats
+
+    if departure < now:
+        status = TRAIN_GONE
+    elif cars_with_places:
+        status = TRAIN_WITH_PLACES
+    else:
+        status = TRAIN_WITHOUT_PLACES
+    return Train(
+        number=str(train_data['number']),
+        time=train_data['time0'],
+        status=status,
+        prices=prices,
+        seats=seats,
+    )
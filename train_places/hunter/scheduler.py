@@ -0,0 +1,234 @@
+"""Route polling scheduler module.
+
+Every route has its own poll interval, so trains that depart soon or often
+change their availability are checked much more often than trains that
+depart in months. Routes are kept in a heap by next due time.
+
+Poll interval depends on:
+    time to departure of the nearest searched train,
+    route volatility (how often its availability changed recently),
+    number of route subscribers.
+
+If all routes together need more requests than global budget allows,
+all intervals are stretched proportionally.
+
+Module needs environment variables:
+    HUNTER_REQUESTS_PER_MINUTE: Global budget of rzd requests (default = 30).
+    MIN_POLL_INTERVAL: Min route poll interval in seconds (default = 20).
+    MAX_POLL_INTERVAL: Max route poll interval in seconds (default = 3600).
+
+"""
+
+import datetime
+import heapq
+import itertools
+import math
+import os
+import time
+from typing import AbstractSet, Dict, List, Optional, Tuple
+
+from train_places.hunter import rzd_api
+from train_places.hunter.records import Trains
+
+
+# Time to departure -> base poll interval, seconds
+DEPARTURE_POLL_INTERVALS = (
+    (datetime.timedelta(hours=1), 20),
+    (datetime.timedelta(hours=6), 60),
+    (datetime.timedelta(days=1), 3 * 60),
+    (datetime.timedelta(days=7), 10 * 60),
+    (datetime.timedelta(days=30), 30 * 60),
+)
+FAR_DEPARTURE_POLL_INTERVAL = 60 * 60
+UNKNOWN_DEPARTURE_POLL_INTERVAL = 2 * 60
+
+# Weight of the last check in route volatility
+VOLATILITY_WEIGHT = 0.3
+
+_route_scheduler = None
+
+
+class RouteSchedule:
+    """Route poll schedule."""
+
+    __slots__ = ('interval', 'volatility', 'subscribers', 'departure', 'due_time', 'version')
+
+    def __init__(self, subscribers: int):
+        self.interval = float(UNKNOWN_DEPARTURE_POLL_INTERVAL)
+        self.volatility = 0.0
+        self.subscribers = subscribers
+        self.departure: Optional[datetime.datetime] = None
+        self.due_time = 0.0
+        self.version = 0
+
+
+class RouteScheduler:
+    """Scheduler that decides which routes should be polled now."""
+
+    def __init__(self, requests_per_minute: float, min_interval: float, max_interval: float):
+        self.requests_per_minute = requests_per_minute
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._routes: Dict[str, RouteSchedule] = {}
+        # Heap of (due time, sequence number, version, url), outdated entries are skipped
+        self._heap: List[Tuple[float, int, int, str]] = []
+        self._counter = itertools.count()
+
+    def update_routes(self, subscribers: Dict[str, int],
+                      due_urls: AbstractSet[str] = frozenset()) -> None:
+        """Add new routes, update subscribers count and drop routes without searches.
+
+        New routes and routes with new searches are due immediately, so new
+        searches get the first answer without waiting for route poll.
+
+        Args:
+            subscribers: Normalized url -> number of route searches.
+            due_urls: Normalized urls of routes with new searches.
+        """
+        now = time.monotonic()
+        for url in list(self._routes):
+            if url not in subscribers:
+                del self._routes[url]
+        for url, subscribers_count in subscribers.items():
+            route = self._routes.get(url)
+            if route:
+                route.subscribers = subscribers_count
+                if url in due_urls and route.due_time > now:
+                    self._push(url, due_time=now)
+                continue
+            self._routes[url] = RouteSchedule(subscribers_count)
+            self._push(url, due_time=now)
+
+    def pop_due_routes(self) -> List[str]:
+        """Pop routes that should be polled now.
+
+        Popped routes aren't popped again until they are rescheduled.
+
+        Returns:
+            urls: Normalized urls of due routes.
+        """
+        now = time.monotonic()
+        urls = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, version, url = heapq.heappop(self._heap)
+            route = self._routes.get(url)
+            if route and route.version == version:
+                urls.append(url)
+        return urls
+
+    def reschedule(self, url: str, changed: bool = False,
+                   departure: Optional[datetime.datetime] = None,
+                   now: Optional[datetime.datetime] = None) -> None:
+        """Schedule next route poll.
+
+        Args:
+            url: Normalized search url.
+            changed: Route availability changed since the last poll.
+            departure: Moscow departure time of the nearest searched train.
+            now: Current Moscow time.
+        """
+        route = self._routes.get(url)
+        if not route:
+            return
+        route.volatility = (1 - VOLATILITY_WEIGHT) * route.volatility \
+            + VOLATILITY_WEIGHT * changed
+        route.departure = departure
+        if not now:
+            now = datetime.datetime.utcnow() + datetime.timedelta(hours=3)
+        route.interval = self.get_poll_interval(route, now)
+        budget_factor = max(1.0, self.get_requests_demand() / self.requests_per_minute)
+        self._push(url, due_time=time.monotonic() + route.interval * budget_factor)
+
+    def get_poll_interval(self, route: RouteSchedule, now: datetime.datetime) -> float:
+        """Get route poll interval without global budget limit.
+
+        Args:
+            route: Route schedule.
+            now: Current Moscow time.
+
+        Returns:
+            interval: Poll interval in seconds.
+        """
+        # Departure is in the past if all searched trains are gone
+        if not route.departure or route.departure < now:
+            interval = UNKNOWN_DEPARTURE_POLL_INTERVAL
+        else:
+            time_to_departure = route.departure - now
+            interval = FAR_DEPARTURE_POLL_INTERVAL
+            for max_time_to_departure, departure_interval in DEPARTURE_POLL_INTERVALS:
+                if time_to_departure <= max_time_to_departure:
+                    interval = departure_interval
+                    break
+        # Volatile routes are checked up to 2 times more often, as well as popular routes
+        interval *= 1 - route.volatility / 2
+        interval /= math.sqrt(min(max(route.subscribers, 1), 4))
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def get_requests_demand(self) -> float:
+        """Get number of requests per minute that all routes need."""
+        return sum(60 / route.interval for route in self._routes.values())
+
+    def seconds_until_next_due(self) -> Optional[float]:
+        """Get time until the nearest route poll, None if there are no scheduled routes."""
+        while self._heap:
+            due_time, _, version, url = self._heap[0]
+            route = self._routes.get(url)
+            if route and route.version == version:
+                return max(due_time - time.monotonic(), 0.0)
+            heapq.heappop(self._heap)
+        return None
+
+    def _push(self, url: str, due_time: float) -> None:
+        """Push route to heap, previous route entries become outdated."""
+        route = self._routes[url]
+        route.version += 1
+        route.due_time = due_time
+        heapq.heappush(self._heap, (due_time, next(self._counter), route.version, url))
+
+
+def get_route_scheduler() -> RouteScheduler:
+    """Get route scheduler (Singletone)."""
+    global _route_scheduler
+    if not _route_scheduler:
+        _route_scheduler = RouteScheduler(
+            requests_per_minute=float(os.environ.get('HUNTER_REQUESTS_PER_MINUTE', 30)),
+            min_interval=float(os.environ.get('MIN_POLL_INTERVAL', 20)),
+            max_interval=float(os.environ.get('MAX_POLL_INTERVAL', 3600)),
+        )
+    return _route_scheduler
+
+
+def get_nearest_departure(url: str, trains: Trains, searched_numbers: AbstractSet[str],
+                          now: datetime.datetime) -> Optional[datetime.datetime]:
+    """Get departure time of the nearest searched train that isn't gone.
+
+    Search page shows only departure time, date is taken from search url.
+
+    Args:
+        url: Search url.
+        trains: Trains collected from search page.
+        searched_numbers: Normalized train numbers of route searches.
+        now: Current Moscow time.
+
+    Returns:
+        departure: Moscow departure time. None if it can't be found.
+    """
+    search_params = rzd_api.parse_search_url(url)
+    if not search_params:
+        return None
+    try:
+        date = datetime.datetime.strptime(search_params['dt0'], '%d.%m.%Y')
+    except ValueError:
+        return None
+    departures = []
+    for train in trains.with_places + trains.without_places:
+        if train.normalized_number not in searched_numbers:
+            continue
+        try:
+            train_time = datetime.datetime.strptime(train.time, '%H:%M').time()
+        except ValueError:
+            continue
+        departure = datetime.datetime.combine(date, train_time)
+        if departure >= now:
+            departures.append(departure)
+    return min(departures, default=None)
@@ -0,0 +1,140 @@
+"""Search index module.
+
+Hunter keeps active searches in memory grouped by normalized route url and
+indexed by train number, so searches interested in some trains of a page are
+found with dict lookups instead of looping over all route searches.
+
+Index is updated incrementally with searches collected on every sweep: new
+and restarted searches are added, removed searches are dropped. Added searches
+are unchecked until they are taken with `RouteSearches.pop_unchecked`.
+
+"""
+
+from typing import Dict, Iterable, List, Set
+
+from train_places.hunter.records import Search
+from train_places.utils import utils
+
+
+class RouteSearches:
+    """Searches of one route indexed by normalized train number."""
+
+    __slots__ = ('url', 'searches', 'by_train', 'unchecked', '_positions', '_added_count')
+
+    def __init__(self, url: str):
+        self.url = url
+        # Search id -> search, in order of adding
+        self.searches: Dict[str, Search] = {}
+        # Normalized train number -> search id -> search
+        self.by_train: Dict[str, Dict[str, Search]] = {}
+        # Searches that weren't checked since they were added or forgotten
+        self.unchecked: Dict[str, Search] = {}
+        # Search id -> number of search in order of adding
+        self._positions: Dict[str, int] = {}
+        self._added_count = 0
+
+    def add(self, search: Search) -> None:
+        """Add search to route, search is unchecked."""
+        self.searches[search.search_id] = search
+        for number in search.normalized_numbers:
+            self.by_train.setdefault(number, {})[search.search_id] = search
+        self.unchecked[search.search_id] = search
+        self._positions[search.search_id] = self._added_count
+        self._added_count += 1
+
+    def remove(self, search_id: str) -> None:
+        """Remove search from route."""
+        search = self.searches.pop(search_id)
+        for number in search.normalized_numbers:
+            train_searches = self.by_train[number]
+            del train_searches[search_id]
+            if not train_searches:
+                del self.by_train[number]
+        self.unchecked.pop(search_id, None)
+        del self._positions[search_id]
+
+    def get_train_searches(self, numbers: Iterable[str]) -> List[Search]:
+        """Get searches of any of trains without duplicates.
+
+        Args:
+            numbers: Normalized train numbers.
+
+        Returns:
+            searches: Searches in order of adding.
+        """
+        found: Dict[str, Search] = {}
+        for number in numbers:
+            found.update(self.by_train.get(number, {}))
+        return sorted(found.values(), key=lambda search: self._positions[search.search_id])
+
+    def forget_check(self, search: Search) -> None:
+        """Mark search as unchecked, so it's checked next time."""
+        # Search could be restarted while it was being checked
+        if search.search_id in self.searches:
+            self.unchecked[search.search_id] = self.searches[search.search_id]
+
+    def pop_unchecked(self) -> List[Search]:
+        """Take unchecked searches, they are considered checked after that."""
+        unchecked = list(self.unchecked.values())
+        self.unchecked.clear()
+        return unchecked
+
+    @property
+    def search_url(self) -> str:
+        """Url of route exactly as the first user sent it."""
+        return next(iter(self.searches.values())).url
+
+
+class SearchIndex:
+    """Active searches by route url and train number."""
+
+    def __init__(self):
+        self.routes: Dict[str, RouteSearches] = {}
+        # Search id -> indexed search
+        self._searches: Dict[str, Search] = {}
+
+    def update(self, searches: Dict[str, Search]) -> Set[str]:
+        """Update index with active searches.
+
+        Search with changed start time is restarted, so it's indexed again.
+
+        Args:
+            searches: Active searches of all users.
+
+        Returns:
+            added_urls: Normalized urls of routes with added searches.
+        """
+        added_urls = set()
+        for search_id in self._searches.keys() - searches.keys():
+            self._remove(search_id)
+        for search_id, search in searches.items():
+            indexed_search = self._searches.get(search_id)
+            if indexed_search:
+                if indexed_search.start_search_time == search.start_search_time:
+                    continue
+                self._remove(search_id)
+            added_urls.add(self._add(search))
+        return added_urls
+
+    def forget_check(self, search: Search) -> None:
+        """Mark search as unchecked, so it's checked next time."""
+        route = self.routes.get(utils.normalize_url(search.url))
+        if route:
+            route.forget_check(search)
+
+    def _add(self, search: Search) -> str:
+        url = utils.normalize_url(search.url)
+        route = self.routes.get(url)
+        if not route:
+            route = self.routes[url] = RouteSearches(url)
+        route.add(search)
+        self._searches[search.search_id] = search
+        return url
+
+    def _remove(self, search_id: str) -> None:
+        search = self._searches.pop(search_id)
+        url = utils.normalize_url(search.url)
+        route = self.routes[url]
+        route.remove(search_id)
+        if not route.searches:
+            del self.routes[url]
@@ -0,0 +1,139 @@
+"""Hunter shards module.
+
+Several hunter workers (processes or dynos) share routes with rendezvous
+hashing: every route belongs to the live worker with the highest hash of
+(worker id, route url), so every worker can compute owners itself and
+only routes of a gone worker move to other workers.
+
+Workers are registered in Redis sorted set with heartbeat time as score.
+Worker is live while its last heartbeat is younger than lease, so routes of
+a crashed worker are reassigned after lease expiration. Stopped worker leaves
+the set at once.
+
+While workers list is changing, two workers can check the same route for
+a short time, so every notification is claimed in Redis first and only one
+worker sends it, see claim_notification.
+
+Module needs environment variables:
+    HUNTER_WORKER_ID: Unique worker id (default = hostname-pid).
+    HUNTER_LEASE: Worker lease in seconds, worker is considered dead if it
+                  didn't send heartbeat for this time (default = 30).
+
+"""
+
+import asyncio
+import hashlib
+import os
+import socket
+import time
+from typing import List
+
+from train_places.utils import utils
+
+
+WORKERS_KEY = 'hunter_workers'
+NOTIFICATION_CLAIM_PREFIX = 'notification_claim:'
+# Finished searches are removed from db right after notification, so claim
+# is needed only until then
+NOTIFICATION_CLAIM_TTL = 24 * 60 * 60
+
+_shard_worker = None
+
+
+class ShardWorker:
+    """Hunter worker that owns part of routes."""
+
+    def __init__(self, worker_id: str, lease: float):
+        self.worker_id = worker_id
+        self.lease = lease
+        # Worker owns all routes until it sees other workers
+        self.live_workers: List[str] = [worker_id]
+
+    async def heartbeat(self) -> None:
+        """Renew worker lease, drop dead workers and update live workers list."""
+        db = await utils.get_db_connection()
+        now = time.time()
+        transaction = db.multi_exec()
+        transaction.zadd(WORKERS_KEY, now, self.worker_id)
+        transaction.zremrangebyscore(WORKERS_KEY, max=now - self.lease)
+        transaction.zrange(WORKERS_KEY)
+        _, _, live_workers = await transaction.execute()
+        self.live_workers = sorted(live_workers) or [self.worker_id]
+
+    async def leave(self) -> None:
+        """Remove worker from live workers, so its routes are reassigned at once."""
+        db = await utils.get_db_connection()
+        await db.zrem(WORKERS_KEY, self.worker_id)
+
+    def owns(self, url: str) -> bool:
+        """Check if route belongs to this worker.
+
+        Args:
+            url: Normalized search url.
+        """
+        return get_route_owner(url, self.live_workers) == self.worker_id
+
+
+def get_route_owner(url: str, workers: List[str]) -> str:
+    """Get route owner with rendezvous hashing.
+
+    Args:
+        url: Normalized search url.
+        workers: Ids of live workers.
+
+    Returns:
+        worker_id: Id of route owner.
+    """
+    return max(
+        workers,
+        key=lambda worker_id: hashlib.md5(f'{worker_id}|{url}'.encode('UTF-8')).digest(),
+    )
+
+
+async def keep_alive(worker: ShardWorker) -> None:
+    """Send worker heartbeats until cancelled."""
+    while True:
+        try:
+            await worker.heartbeat()
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            print(f'Hunter worker heartbeat failed: {ex!r}')
+        await asyncio.sleep(worker.lease / 3)
+
+
+async def claim_notification(search_id: str, start_search_time: str) -> bool:
+    """Claim right to notify user about search result.
+
+    Args:
+        search_id: Db key for search.
+        start_search_time: Start time of search, restarted search is claimed again.
+
+    Returns:
+        claimed: False if other worker already claimed this notification.
+    """
+    db = await utils.get_db_connection()
+    claimed = await db.set(
+        f'{NOTIFICATION_CLAIM_PREFIX}{search_id}:{start_search_time}',
+        get_shard_worker().worker_id,
+        expire=NOTIFICATION_CLAIM_TTL,
+        exist=db.SET_IF_NOT_EXIST,
+    )
+    return bool(claimed)
+
+
+async def release_notification(search_id: str, start_search_time: str) -> None:
+    """Release notification claim, so notification can be sent again."""
+    db = await utils.get_db_connection()
+    await db.delete(f'{NOTIFICATION_CLAIM_PREFIX}{search_id}:{start_search_time}')
+
+
+def get_shard_worker() -> ShardWorker:
+    """Get worker of this process (Singletone)."""
+    global _shard_worker
+    if not _shard_worker:
+        _shard_worker = ShardWorker(
+            worker_id=os.environ.get('HUNTER_WORKER_ID', f'{socket.gethostname()}-{os.getpid()}'),
+            lease=float(os.environ.get('HUNTER_LEASE', 30)),
+        )
+    return _shard_worker
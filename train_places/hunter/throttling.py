@@ -0,0 +1,129 @@
+"""Rzd requests throttling module.
+
+All route fetches go through one token bucket, so hunter never requests
+pass.rzd.ru faster than allowed, whatever fetch backend is used.
+
+Circuit breaker stops fetches when rzd.ru fails again and again (timeouts,
+errors, bans), so browsers don't waste time on requests that are bound to fail.
+After a pause one probe request is allowed (half-open state), breaker closes
+if it succeeds and opens again otherwise. If probe result isn't recorded
+(probe was cancelled), the next probe is allowed after the same pause.
+
+Module needs environment variables:
+    RZD_RPS: Max number of rzd requests per second (default = 1).
+    RZD_BURST: Max number of rzd requests made at once after idle time (default = 3).
+    RZD_BREAKER_FAILURES: Number of consecutive failures that opens breaker (default = 5).
+    RZD_BREAKER_RESET_TIMEOUT: Pause before probe request in seconds (default = 60).
+
+"""
+
+import asyncio
+import os
+import time
+
+
+# Circuit breaker states
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+
+_rzd_limiter = None
+_rzd_breaker = None
+
+
+class TokenBucket:
+    """Token bucket rate limiter.
+
+    Bucket is refilled with `rate` tokens per second up to `burst` tokens,
+    every request takes one token.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait for a token and take it.
+
+        Waiters are served one by one in arrival order.
+        """
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+class CircuitBreaker:
+    """Circuit breaker of rzd requests."""
+
+    def __init__(self, max_failures: int, reset_timeout: float):
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at = 0.0
+
+    def allow_request(self) -> bool:
+        """Check if request can be made now.
+
+        Only one probe request is allowed in half-open state, until its result is recorded.
+        Probe can be cancelled before its result is recorded, so another probe is
+        allowed if there is no result for reset timeout.
+        """
+        if self.state == BREAKER_CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == BREAKER_OPEN and now - self._opened_at >= self.reset_timeout \
+                or self.state == BREAKER_HALF_OPEN \
+                and now - self._probe_started_at >= self.reset_timeout:
+            self.state = BREAKER_HALF_OPEN
+            self._probe_started_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Record successful request, breaker closes."""
+        self.state = BREAKER_CLOSED
+        self._failures = 0
+
+    def record_failure(self) -> None:
+        """Record failed request, breaker opens after too many consecutive failures."""
+        self._failures += 1
+        if self.state == BREAKER_HALF_OPEN or self._failures >= self.max_failures:
+            if self.state != BREAKER_OPEN:
+                print(f'Rzd requests are paused after {self._failures} failures in a row')
+            self.state = BREAKER_OPEN
+            self._opened_at = time.monotonic()
+
+
+def get_rzd_limiter() -> TokenBucket:
+    """Get rzd requests rate limiter (Singletone)."""
+    global _rzd_limiter
+    if not _rzd_limiter:
+        _rzd_limiter = TokenBucket(
+            rate=float(os.environ.get('RZD_RPS', 1)),
+            burst=int(os.environ.get('RZD_BURST', 3)),
+        )
+    return _rzd_limiter
+
+
+def get_rzd_breaker() -> CircuitBreaker:
+    """Get rzd requests circuit breaker (Singletone)."""
+    global _rzd_breaker
+    if not _rzd_breaker:
+        _rzd_breaker = CircuitBreaker(
+            max_failures=int(os.environ.get('RZD_BREAKER_FAILURES', 5)),
+            reset_timeout=float(os.environ.get('RZD_BREAKER_RESET_TIMEOUT', 60)),
+        )
+    return _rzd_breaker
@@ -5,6 +5,18 @@ The need for this utility appeared due of using free Redis Labs database
 which allows to store only 30 MB of data, so we can clear the database
 from logs that take up the most space.
 
+Logs are appended to archive in JSON lines format (one log per line), archive
+is gzipped if its path ends with .gz. Logs list is read in chunks and every
+chunk is trimmed from db only after it's written to archive, so memory usage
+doesn't depend on number of logs and archive size, and logs pushed by bot
+during export aren't lost.
+
+Archive of old format (one json list) is converted to JSON lines on first run.
+
+Only one collector exports logs at a time: export is guarded with lock key in
+db, otherwise two collectors would read and trim the same chunks, so logs
+would be duplicated and unread logs trimmed.
+
 Module needs environment variables:
     Redis:
         DB_HOST: Database host.
@@ -12,107 +24,138 @@ Module needs environment variables:
         DB_PASS: Database password.
         LOGS_KEY: Key in database where list with logs are located.
 
-    LOGS_PATH: Path to json log file, where logs will be stored.
+    LOGS_PATH: Path to JSON lines log file (.jsonl or .jsonl.gz), where logs will be stored.
+    LOGS_CHUNK_SIZE: Number of logs read from db at once (default = 1000).
 
 Examples:
     $ python3 collect_logs.py
 
 """
 
+import gzip
 import os
 import json
-from typing import List, Optional
+import socket
+from typing import IO, Iterator, Optional
 
 import redis
 from dotenv import load_dotenv
 
 
-load_dotenv()
-
-db = redis.Redis(
-    host=os.environ['DB_HOST'],
-    port=int(os.environ['DB_PORT']),
-    password=os.environ['DB_PASS'],
-)
+# Lock lifetime in seconds, lock is renewed after every chunk, so crashed
+# collector doesn't block export for long
+EXPORT_LOCK_TTL = 60
 
 
 def main():
-    """Fetch logs from db, add them to local file, delete logs from db."""
-    logs_db_key = os.environ['LOGS_KEY']
+    """Fetch logs from db, append them to local file, delete logs from db."""
+    load_dotenv()
+    db = redis.Redis(
+        host=os.environ['DB_HOST'],
+        port=int(os.environ['DB_PORT']),
+        password=os.environ['DB_PASS'],
+    )
     logs_path = os.environ['LOGS_PATH']
-    if download_logs(logs_db_key, logs_path):
-        db.delete(logs_db_key)
-
-
-def download_logs(logs_key: str, logs_path: str) -> bool:
-    """Download logs from db and add them to json file.
-
-    Args:
-        logs_key: Key in db where list with logs are located.
-        logs_path: Path to json file.
-
-    Returns:
-        logs_downloaded: download status
-    """
-    db_logs = get_logs_from_db(db, logs_key)
-    if not db_logs:
+    convert_json_archive(logs_path)
+    exported = export_logs(
+        db, os.environ['LOGS_KEY'], logs_path, int(os.environ.get('LOGS_CHUNK_SIZE', 1000)))
+    if exported is None:
+        print('Logs are being exported by another collector')
+        return
+    if not exported:
         print('No new logs')
-        logs_downloaded = False
-    update_log_file(logs_path, db_logs)
-    print('Logs downloaded')
-    logs_downloaded = True
-    return logs_downloaded
+        return
+    print(f'{exported} logs downloaded')
+
 
+def export_logs(db: redis.Redis, logs_key: str, logs_path: str,
+                chunk_size: int) -> Optional[int]:
+    """Move logs from db list to the end of archive chunk by chunk.
 
-def get_logs_from_db(db: redis.Redis, logs_key: str) -> List[dict]:
-    """Get logs from list key in db.
+    Bot pushes logs to the end of list, so logs from the head of list can be
+    trimmed after they are written without losing logs pushed in the meantime.
+    If export fails between write and trim, chunk is exported again next time.
+    Export stops if lock is lost (collector was paused for longer than lock TTL).
 
     Args:
         db: Redis db connection.
         logs_key: Key in db where list with logs are located.
+        logs_path: Path to archive.
+        chunk_size: Number of logs read from db at once.
 
     Returns:
-        logs: decoded logs.
+        exported: Number of exported logs. None if logs are exported by another collector.
     """
-    logs = db.lrange(logs_key, 0, -1)
-    logs = [json.loads(log.decode('UTF-8')) for log in logs]
-    return logs
-
-
-def update_log_file(file_path: str, logs: List[dict]) -> None:
-    """Update log file with logs.
+    lock_key = f'{logs_key}:export_lock'
+    lock_token = f'{socket.gethostname()}-{os.getpid()}'.encode('UTF-8')
+    if not db.set(lock_key, lock_token, nx=True, ex=EXPORT_LOCK_TTL):
+        return None
+    exported = 0
+    try:
+        with open_archive(logs_path, 'ab') as archive:
+            while db.get(lock_key) == lock_token:
+                db.expire(lock_key, EXPORT_LOCK_TTL)
+                logs = db.lrange(logs_key, 0, chunk_size - 1)
+                if not logs:
+                    break
+                # Logs are stored as json dumps, they are written as is
+                archive.write(b''.join(log + b'\n' for log in logs))
+                archive.flush()
+                os.fsync(archive.fileno())
+                db.ltrim(logs_key, len(logs), -1)
+                exported += len(logs)
+    finally:
+        if db.get(lock_key) == lock_token:
+            db.delete(lock_key)
+    return exported
+
+
+def open_archive(logs_path: str, mode: str) -> IO[bytes]:
+    """Open archive in binary mode, gzipped archive is opened with gzip."""
+    if logs_path.endswith('.gz'):
+        return gzip.open(logs_path, mode)  # type: ignore
+    return open(logs_path, mode)
+
+
+def read_archive(logs_path: str) -> Iterator[dict]:
+    """Read logs from archive one by one.
 
     Args:
-        filepath: Path to log file.
-        logs: Fetched logs.
+        logs_path: Path to archive.
 
-    Returns:
-        None
+    Yields:
+        log: Decoded log.
     """
-    stored_logs = get_logs_from_file(file_path)
-    if not stored_logs:
-        stored_logs = []
-    stored_logs.extend(logs)
+    with open_archive(logs_path, 'rb') as archive:
+        for line in archive:
+            if line.strip():
+                yield json.loads(line.decode('UTF-8'))
 
-    logs_json = json.dumps(stored_logs)
-    with open(file_path, 'w') as json_file:
-        json_file.write(logs_json)
 
+def convert_json_archive(logs_path: str) -> None:
+    """Convert archive of old format (json list) to JSON lines.
 
-def get_logs_from_file(file_path: str) -> Optional[List[dict]]:
-    """Get logs from json log file.
+    Old archive is loaded into memory once, after conversion it is appended only.
 
     Args:
-        file_path: Path to json file.
-
-    Returns:
-        logs: logs from file.
+        logs_path: Path to archive.
     """
-    if not os.path.exists(file_path):
-        return None
-    with open(file_path, 'r') as log_file:
-        logs_json = log_file.read()
-    return json.loads(logs_json)
+    if not os.path.exists(logs_path):
+        return
+    with open_archive(logs_path, 'rb') as archive:
+        first_char = archive.read(1)
+    if first_char != b'[':
+        return
+    with open_archive(logs_path, 'rb') as archive:
+        logs = json.loads(archive.read().decode('UTF-8'))
+    # Suffix is kept, so converted archive is gzipped like the old one
+    logs_dir, logs_file = os.path.split(logs_path)
+    converted_path = os.path.join(logs_dir, f'converting_{logs_file}')
+    with open_archive(converted_path, 'wb') as converted_archive:
+        for log in logs:
+            converted_archive.write(json.dumps(log).encode('UTF-8') + b'\n')
+    os.replace(converted_path, logs_path)
+    print(f'Archive converted to JSON lines, {len(logs)} logs')
 
 
 if __name__ == '__main__':
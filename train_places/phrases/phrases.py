@@ -40,20 +40,43 @@ help_half_1 = '''\
 Учти, номера поездов содержат цифры, РУССКИЕ буквы и значки, например «123*А, 456Е».
 5. Отправь ограничение на стоимость билетов в рублях (число без букв, знаков или пробелов).\
  Если цена не важна, отправь «1».
+6. Отправь типы вагонов (плацкарт, купе, св, люкс, сидячий, общий) и, если нужно,\
+ сколько мест нужно в одном поезде, например «купе, св 2». Если тип вагонов не важен,\
+ отправь «любые».
 '''
 help_half_2 = '''
-Поиск можно прекратить в любой момент командой /cancel
+Можно запустить несколько поисков, список твоих поисков покажет команда /searches
+Поиск можно прекратить в любой момент командой /cancel с номером поиска из списка,\
+ например «/cancel 2», просто /cancel отменит все поиски
 Пример твоих сообщений:
 https://pass.rzd.ru/tickets/public/ru?STRUCT(очень_длинная_ссылка)...
 00032, 002А, Е*100
 2500
+купе 2
 '''
 
 cancel_msg = 'Поиск отменен. Можешь начать новый поиск командой /start_search'
 
+all_searches_cancelled = 'Все поиски отменены. Можешь начать новый поиск командой /start_search'
+
 useless_cancel = 'Поиск еще не запущен, начни новый /start_search'
 
-second_search = 'Поиск уже запущен, ты можешь остановить его, если нужен новый (/cancel)'
+bad_search_number = 'Нет поиска с таким номером, посмотри номера поисков командой /searches'
+
+too_many_searches = 'Уже запущено {max_searches} поисков, больше нельзя. Отмени ненужный\
+ командой /cancel с номером поиска из списка /searches'
+
+no_searches = 'Поисков нет, начни новый /start_search'
+
+searches_list = 'Твои поиски:'
+
+search_item = '{search_number}. Поезда {train_numbers}, цена до {price_limit} ₽'
+
+search_item_without_limit = '{search_number}. Поезда {train_numbers}'
+
+search_item_car_filter = ', вагоны: {car_classes}, мест от {min_seats}'
+
+any_car_class = 'любые'
 
 waiting_url = dedent('''\
     Ожидаю ссылку на расписание, пример:
@@ -69,6 +92,13 @@ waiting_train_numbers = 'Хорошо, теперь отправь мне ном
 waiting_price_limit = 'Отлично, теперь отправь мне ограничение на цену билетов.\
  Целым числом: без копеек, запятых и пробелов, например:\n5250\nЕсли цена не важна, отправь 1'
 
+waiting_car_filter = 'Принято. Какие вагоны подойдут: плацкарт, купе, св, люкс, сидячий,\
+ общий? Можно добавить, сколько мест нужно, например:\nкупе, св 2\nЕсли подойдут любые\
+ вагоны, отправь «любые»'
+
+bad_car_filter = 'Не понял. Перечисли типы вагонов из списка: плацкарт, купе, св, люкс,\
+ сидячий, общий и, если нужно, число мест, например:\nплацкарт 3\nИли отправь «любые»'
+
 bad_price = '''\
 Неверное число. Цена должна быть в виде ОДНОГО целого числа, без лишних знаков\
  препинания, пробелов и т.д. Например:
@@ -76,11 +106,12 @@ bad_price = '''\
 Попробуй ещё раз (отправь 1, если цена неважна)
 '''
 
-start_placehunt = 'Пойду искать места. Если захочешь отменить поиск, нажми /cancel'
+start_placehunt = 'Пойду искать места. Список поисков: /searches, отменить поиск: /cancel'
 
 my_commands = '''\
 Я бот. Общаюсь на языке команд:
 /help - помощь
 /start_search - начать поиск
+/searches - список поисков
 /cancel - отменить поиск
 '''
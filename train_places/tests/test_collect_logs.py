@@ -0,0 +1,51 @@
+"""Tests for logs collector."""
+
+import json
+
+import fakeredis
+
+from train_places.logs_collector import collect_logs
+
+
+LOGS_KEY = 'search_logs'
+
+
+def test_logs_exported_by_chunks(tmp_path):
+    db = fakeredis.FakeRedis()
+    db.rpush(LOGS_KEY, *[json.dumps({'id': f'tg-{log_id}'}) for log_id in range(5)])
+    logs_path = str(tmp_path / 'logs.jsonl.gz')
+
+    first_exported = collect_logs.export_logs(db, LOGS_KEY, logs_path, chunk_size=2)
+    db.rpush(LOGS_KEY, json.dumps({'id': 'tg-5'}))
+    second_exported = collect_logs.export_logs(db, LOGS_KEY, logs_path, chunk_size=2)
+
+    assert (first_exported, second_exported) == (5, 1)
+    assert not db.llen(LOGS_KEY)
+    assert [log['id'] for log in collect_logs.read_archive(logs_path)] == \
+        [f'tg-{log_id}' for log_id in range(6)]
+
+
+def test_logs_exported_by_one_collector(tmp_path):
+    db = fakeredis.FakeRedis()
+    db.rpush(LOGS_KEY, json.dumps({'id': 'tg-1'}))
+    logs_path = str(tmp_path / 'logs.jsonl')
+    db.set(f'{LOGS_KEY}:export_lock', b'other-collector')
+
+    exported_while_locked = collect_logs.export_logs(db, LOGS_KEY, logs_path, chunk_size=2)
+    db.delete(f'{LOGS_KEY}:export_lock')
+    exported = collect_logs.export_logs(db, LOGS_KEY, logs_path, chunk_size=2)
+
+    assert exported_while_locked is None
+    assert exported == 1
+    assert not db.exists(f'{LOGS_KEY}:export_lock')
+
+
+def test_json_archive_converted(tmp_path):
+    logs_path = str(tmp_path / 'logs.json')
+    with open(logs_path, 'w') as json_file:
+        json.dump([{'id': 'tg-1'}, {'id': 'tg-2'}], json_file)
+
+    collect_logs.convert_json_archive(logs_path)
+    collect_logs.convert_json_archive(logs_path)
+
+    assert list(collect_logs.read_archive(logs_path)) == [{'id': 'tg-1'}, {'id': 'tg-2'}]
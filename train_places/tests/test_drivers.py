@@ -0,0 +1,81 @@
+"""Tests for selenium drivers pool."""
+
+import asyncio
+
+import pytest
+
+from train_places.hunter import drivers
+
+
+loop = asyncio.get_event_loop()
+
+
+class FakeDriver:
+    def __init__(self):
+        self.alive = True
+        self.quitted = False
+
+    @property
+    def window_handles(self):
+        if not self.alive:
+            raise ConnectionRefusedError
+        return ['window']
+
+    def quit(self):
+        self.quitted = True
+
+
+@pytest.fixture
+def started_drivers(monkeypatch):
+    started = []
+
+    def start_driver():
+        driver = FakeDriver()
+        started.append(driver)
+        return driver
+
+    monkeypatch.setattr(drivers, 'start_driver', start_driver)
+    return started
+
+
+async def use_driver(pool):
+    async with pool.driver() as driver:
+        return driver
+
+
+def test_driver_reused(started_drivers):
+    pool = drivers.DriversPool(size=1, max_pages=10)
+    first_driver = loop.run_until_complete(use_driver(pool))
+    second_driver = loop.run_until_complete(use_driver(pool))
+    assert first_driver is second_driver
+    assert len(started_drivers) == 1
+
+
+def test_driver_restarted_after_max_pages(started_drivers):
+    pool = drivers.DriversPool(size=1, max_pages=2)
+    for _ in range(3):
+        loop.run_until_complete(use_driver(pool))
+    assert len(started_drivers) == 2
+    assert started_drivers[0].quitted
+
+
+def test_crashed_driver_replaced(started_drivers):
+    pool = drivers.DriversPool(size=1, max_pages=10)
+    first_driver = loop.run_until_complete(use_driver(pool))
+    first_driver.alive = False
+    second_driver = loop.run_until_complete(use_driver(pool))
+    assert second_driver is not first_driver
+    assert first_driver.quitted
+
+
+def test_driver_quitted_on_exception(started_drivers):
+    async def break_driver(pool):
+        async with pool.driver():
+            raise ValueError
+
+    pool = drivers.DriversPool(size=1, max_pages=10)
+    with pytest.raises(ValueError):
+        loop.run_until_complete(break_driver(pool))
+    assert started_drivers[0].quitted
+    loop.run_until_complete(use_driver(pool))
+    assert len(started_drivers) == 2
@@ -8,7 +8,14 @@ import asyncio
 import os
 import pathlib
 
+import fakeredis.aioredis
+import pytest
+from selenium.common.exceptions import NoSuchElementException
+
+from train_places.hunter import hunter
 from train_places.hunter.hunter import *
+from train_places.hunter.records import (
+    Search, Train, Trains, TRAIN_GONE, TRAIN_WITH_PLACES, parse_car_filter)
 from train_places.phrases import phrases
 
 
@@ -40,8 +47,9 @@ def test_found_places_with_price():
     train_with_places = '780А'
     train_numbers = f'122*С,{train_with_places}'
     price_limit = '5000'
+    # The cheapest car type of train is reported
     phrase = phrases.place_found_with_price.format(train_number=train_with_places, time='21:00',
-                                                   spaced_price='4 579')
+                                                   spaced_price='4 520')
 
     answer = loop.run_until_complete(check_trains_data(normal_response, train_numbers, price_limit))
     assert answer == phrase
@@ -98,3 +106,559 @@ def test_url_with_yesterday_date():
 def test_bad_date_or_route():
     answer = check_for_bad_url(wrong_date_response)
     assert answer == phrases.bad_date_or_route
+
+
+def test_searches_indexed_by_route_and_train():
+    url = 'https://pass.rzd.ru/tickets/public/ru?b=2&a=1#code0=2000000'
+    same_url = ' HTTPS://pass.rzd.ru/tickets/public/ru?a=1&b=2#code0=2000000'
+    other_url = 'https://pass.rzd.ru/tickets/public/ru?a=1&b=2#code0=2004000'
+    index = search_index.SearchIndex()
+    index.update({
+        'tg-1:1': Search('tg-1:1', url, '780А', 1, '2019-09-29 20:00:00'),
+        'tg-1:2': Search('tg-1:2', same_url, '122*С, 780А', 1, '2019-09-29 20:00:00'),
+        'tg-2': Search('tg-2', other_url, '780А', 1, '2019-09-29 20:00:00'),
+    })
+    route = index.routes[utils.normalize_url(url)]
+    first_unchecked = [search.search_id for search in route.pop_unchecked()]
+    index.update({
+        'tg-1:2': Search('tg-1:2', same_url, '122*С', 1, '2019-09-29 21:00:00'),
+    })
+
+    route = index.routes[utils.normalize_url(url)]
+
+    assert first_unchecked == ['tg-1:1', 'tg-1:2']
+    assert list(index.routes) == [utils.normalize_url(url)]
+    assert [search.search_id for search in route.pop_unchecked()] == ['tg-1:2']
+    assert route.get_train_searches(['780А']) == []
+    assert [search.chat_id for search in route.get_train_searches(['122С', '780А'])] == ['1']
+
+
+def test_unfinished_search_skipped():
+    assert Search.from_db('tg-1', {'url': 'url', 'train_numbers': '780А'}) is None
+
+
+def test_renumbered_train_found():
+    # Star is removed from train number near departure, user typed latin C
+    response = normal_response.replace('780А', '122С')
+    train_numbers = '122*C'
+    price_limit = 1
+    phrase = phrases.place_found.format(train_number='122С', time='21:00')
+
+    answer = loop.run_until_complete(check_trains_data(response, train_numbers, price_limit))
+    assert answer == phrase
+
+
+class FakeSearchPageDriver:
+    def __init__(self, polls_before_ready):
+        self.polls_before_ready = polls_before_ready
+        self.page_source = normal_response
+
+    def get(self, url):
+        pass
+
+    def find_element(self, by, selector):
+        if self.polls_before_ready:
+            self.polls_before_ready -= 1
+            raise NoSuchElementException
+        return object()
+
+
+def test_search_page_ready():
+    timings = {}
+    driver = FakeSearchPageDriver(polls_before_ready=1)
+    data = loop.run_until_complete(load_search_page(driver, 'url', timings))
+    assert data == normal_response
+    assert set(timings) == {'load', 'ready_wait', 'page_source'}
+
+
+def test_search_page_timed_out(monkeypatch):
+    monkeypatch.setenv('SEARCH_PAGE_TIMEOUT', '0.5')
+    driver = FakeSearchPageDriver(polls_before_ready=100)
+    with pytest.raises(SearchPageTimeout):
+        loop.run_until_complete(load_search_page(driver, 'url', {}))
+
+
+@pytest.mark.parametrize('parse_workers', ['1', '0'])
+def test_page_parsed_in_executor(parse_workers, monkeypatch):
+    monkeypatch.setenv('PARSE_WORKERS', parse_workers)
+    monkeypatch.setattr(parser, '_parse_executor', None)
+
+    def dump_trains(trains):
+        return [(train.number, train.time, train.status, train.prices, train.seats)
+                for train in trains.with_places + trains.without_places + trains.gone]
+
+    try:
+        bad_url_answer, trains = loop.run_until_complete(
+            parser.parse_search_page_in_executor(normal_response))
+        uses_executor = parser.get_parse_executor() is not None
+    finally:
+        parser.shutdown_parse_executor()
+    expected_bad_url_answer, expected_trains = parser.parse_search_page(normal_response)
+
+    assert uses_executor == (parse_workers != '0')
+    assert bad_url_answer == expected_bad_url_answer
+    assert dump_trains(trains) == dump_trains(expected_trains)
+    assert trains.numbers == expected_trains.numbers
+
+
+def test_train_record_collected():
+    _, trains = parser.parse_search_page(normal_response)
+    train = next(train for train in trains.with_places if train.number == '780А')
+    assert train.time == '21:00'
+    assert train.status == TRAIN_WITH_PLACES
+    assert list(train.prices.items()) == [
+        ('Купе-переговорная', 51925), ('Первый класс', 15292), ('Эконом+', 4579), ('Эконом', 4520)]
+    assert train.car_classes == {'купе': (51925, 4), 'сидячий': (4520, 12)}
+    assert len(trains.gone) == 22
+    assert '122*С' in [train.number for train in trains.without_places]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    async def create_db():
+        return await fakeredis.aioredis.create_redis_pool(encoding='UTF-8')
+
+    async def close_db():
+        await db.flushall()
+        db.close()
+        await db.wait_closed()
+
+    db = loop.run_until_complete(create_db())
+    monkeypatch.setattr(utils, '_db_connetion', db)
+    yield db
+    loop.run_until_complete(close_db())
+
+
+def test_searches_collected(fake_db, monkeypatch):
+    monkeypatch.setenv('DB_BATCH_SIZE', '1')
+    search_info = {
+        'url': 'https://pass.rzd.ru/tickets/public/ru',
+        'train_numbers': '122*С,780А,122С',
+        'price_limit': '5000',
+        'start_search_time': '2019-09-29 20:00:00',
+    }
+
+    async def collect_and_cancel():
+        await fake_db.hmset_dict('tg-1', search_info)
+        await fake_db.hmset_dict('tg-2', {'url': search_info['url']})
+        await fake_db.sadd(utils.SEARCHES_KEY, 'tg-3')  # cancelled search
+        await index_searches()
+        searches = await collect_searches()
+        assert await fake_db.smembers(utils.SEARCHES_KEY) == ['tg-1']
+        actual_before_cancel = await is_search_actual(searches['tg-1'])
+        await utils.remove_search_from_db('tg-1')
+        actual_after_cancel = await is_search_actual(searches['tg-1'])
+        assert not await fake_db.smembers(utils.SEARCHES_KEY)
+        return searches, actual_before_cancel, actual_after_cancel
+
+    searches, actual_before_cancel, actual_after_cancel = loop.run_until_complete(
+        collect_and_cancel())
+    assert list(searches) == ['tg-1']
+    assert searches['tg-1'].price_limit == 5000
+    assert searches['tg-1'].normalized_numbers == {'122С', '780А'}
+    assert actual_before_cancel
+    assert not actual_after_cancel
+
+
+def test_only_changed_route_searches_checked():
+    _, trains = parser.parse_search_page(normal_response)
+    _, changed_trains = parser.parse_search_page(
+        normal_response.replace('4\xa0579', '3\xa0579'))
+    first_search = Search('tg-1', 'url', '780А', 4000, '2019-09-29 20:00:00')
+    second_search = Search('tg-2', 'url', '122*С', 1, '2019-09-29 20:00:00')
+    new_search = Search('tg-3', 'url', '122*С', 1, '2019-09-29 20:00:00')
+    route = search_index.RouteSearches('url')
+    route.add(first_search)
+    route.add(second_search)
+    tracker = changes.RouteChangesTracker()
+
+    assert tracker.select_searches_to_check('url', trains, route) == [first_search, second_search]
+    assert tracker.select_searches_to_check('url', trains, route) == []
+    route.add(new_search)
+    assert tracker.select_searches_to_check('url', trains, route) == [new_search]
+    route.forget_check(second_search)
+    assert tracker.select_searches_to_check('url', changed_trains, route) == \
+        [second_search, first_search]
+
+
+def test_routes_scheduled_by_departure():
+    _, trains = parser.parse_search_page(normal_response)
+    train = trains.with_places[0]
+    url = 'https://pass.rzd.ru/tt/ru#code0=2000000|code1=2004000|dt0=29.09.2019'
+    route_scheduler = scheduler.RouteScheduler(
+        requests_per_minute=30, min_interval=20, max_interval=3600)
+    route_scheduler.update_routes({'soon': 1, 'later': 1})
+
+    due_routes = route_scheduler.pop_due_routes()
+    departure = scheduler.get_nearest_departure(
+        url, trains, {train.normalized_number}, datetime.datetime(2019, 9, 29))
+    route_scheduler.reschedule('soon', departure=departure, now=departure)
+    route_scheduler.reschedule(
+        'later', departure=departure, now=departure - datetime.timedelta(days=20))
+
+    assert sorted(due_routes) == ['later', 'soon']
+    assert departure.strftime('%d.%m.%Y %H:%M') == f'29.09.2019 {train.time}'
+    assert route_scheduler.pop_due_routes() == []
+    assert 0 < route_scheduler.seconds_until_next_due() <= 20
+
+
+def test_routes_with_new_searches_due_at_once():
+    now = datetime.datetime(2019, 9, 29, 12)
+    route_scheduler = scheduler.RouteScheduler(
+        requests_per_minute=30, min_interval=20, max_interval=3600)
+    route_scheduler.update_routes({'far': 1, 'gone': 1})
+    route_scheduler.pop_due_routes()
+    route_scheduler.reschedule('far', departure=now + datetime.timedelta(days=60), now=now)
+    route_scheduler.reschedule('gone', departure=now + datetime.timedelta(minutes=30), now=now)
+    # Searched trains departed, so nearest departure isn't found any more
+    route_scheduler.reschedule('gone', departure=None, now=now + datetime.timedelta(hours=1))
+    index = search_index.SearchIndex()
+    index.update({'tg-1': Search('tg-1', 'far', '001А', 1)})
+    added_urls = index.update({
+        'tg-1': Search('tg-1', 'far', '001А', 1),
+        'tg-2': Search('tg-2', 'far', '002А', 1),
+    })
+
+    route_scheduler.update_routes({'far': 2, 'gone': 1}, due_urls=added_urls)
+
+    assert added_urls == {'far'}
+    assert route_scheduler.pop_due_routes() == ['far']
+    assert route_scheduler.pop_due_routes() == []
+    assert route_scheduler.get_requests_demand() < 1
+
+
+def test_rzd_requests_throttled():
+    limiter = throttling.TokenBucket(rate=20, burst=2)
+    breaker = throttling.CircuitBreaker(max_failures=2, reset_timeout=0.05)
+
+    async def make_requests():
+        for _ in range(4):
+            await limiter.acquire()
+
+    start = time.monotonic()
+    loop.run_until_complete(make_requests())
+    duration = time.monotonic() - start
+    breaker.record_failure()
+    allowed_after_failure = breaker.allow_request()
+    breaker.record_failure()
+    allowed_when_open = breaker.allow_request()
+    time.sleep(0.05)
+    allowed_probe = breaker.allow_request()
+    allowed_during_probe = breaker.allow_request()
+    # Probe was cancelled and its result was never recorded
+    time.sleep(0.05)
+    allowed_after_lost_probe = breaker.allow_request()
+    breaker.record_success()
+
+    assert 0.09 <= duration < 0.5
+    assert allowed_after_failure
+    assert not allowed_when_open
+    assert allowed_probe and not allowed_during_probe
+    assert allowed_after_lost_probe
+    assert breaker.state == throttling.BREAKER_CLOSED
+
+
+def test_rzd_breaker_counts_only_rzd_failures(monkeypatch):
+    breaker = throttling.CircuitBreaker(max_failures=2, reset_timeout=60)
+    monkeypatch.setattr(throttling, '_rzd_breaker', breaker)
+    monkeypatch.setattr(throttling, '_rzd_limiter', throttling.TokenBucket(rate=1000, burst=10))
+    monkeypatch.setenv('RZD_FETCH_BACKEND', 'http')
+    selenium_requests = []
+
+    async def request_rzd_api(query):
+        raise asyncio.TimeoutError
+
+    async def crash_browser(url):
+        selenium_requests.append(url)
+        raise BrowserError('Chrome crashed')
+
+    async def fail_page_loading(url):
+        selenium_requests.append(url)
+        return None
+
+    monkeypatch.setattr(rzd_api, 'request_json', request_rzd_api)
+    monkeypatch.setattr(hunter, 'make_rzd_request', crash_browser)
+    monkeypatch.setenv('RZD_SELENIUM_FALLBACK', '0')
+    loop.run_until_complete(fetch_route('https://pass.rzd.ru/tickets/public/ru'))
+    monkeypatch.setenv('RZD_SELENIUM_FALLBACK', '1')
+    loop.run_until_complete(fetch_route(
+        'https://pass.rzd.ru/tt/ru#code0=2000000|code1=2004000|dt0=01.01.2030'))
+    closed_after_local_errors = breaker.state == throttling.BREAKER_CLOSED
+    monkeypatch.setattr(hunter, 'make_rzd_request', fail_page_loading)
+    loop.run_until_complete(fetch_route(
+        'https://pass.rzd.ru/tt/ru#code0=2000000|code1=2004000|dt0=01.01.2030'))
+
+    assert closed_after_local_errors
+    # Api and selenium failures of one route fetch are one breaker failure
+    assert breaker.state == throttling.BREAKER_CLOSED
+    assert len(selenium_requests) == 2
+
+
+def test_benchmark_pages_scaled():
+    from train_places.benchmarks import benchmark_pipeline
+
+    scaled_page = benchmark_pipeline.make_scaled_page(normal_response, 120)
+    _, trains = parser.parse_search_page(scaled_page)
+    baseline = {'collect_trains[page]': {'ops_per_sec': 100, 'mean_ms': 10, 'peak_kb': 50}}
+    results = {'collect_trains[page]': {'ops_per_sec': 70, 'mean_ms': 14, 'peak_kb': 50}}
+
+    assert len(trains.numbers) == 120
+    assert len(benchmark_pipeline.find_regressions(baseline, results, threshold=0.2)) == 1
+    assert benchmark_pipeline.find_regressions(baseline, results, threshold=0.4) == []
+    # Stages measured with reference are compared by relative speed widened by noise
+    baseline['collect_trains[page]'].update(relative=10, noise=0.05)
+    results['collect_trains[page]'].update(relative=9.8, noise=0.02)
+    assert benchmark_pipeline.find_regressions(baseline, results, threshold=0.2) == []
+    results['collect_trains[page]'].update(relative=7.4)
+    assert len(benchmark_pipeline.find_regressions(baseline, results, threshold=0.2)) == 1
+
+
+def test_route_fetches_cached_and_coalesced():
+    page = parser.parse_search_page(normal_response)
+    fetches = []
+    cache = route_cache.RouteCache(ttl=60, max_bytes=len(route_cache.dump_page(page)) * 2)
+
+    async def fetch():
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        return page
+
+    async def fetch_routes():
+        coalesced = await asyncio.gather(
+            cache.get_or_fetch('first', fetch), cache.get_or_fetch('first', fetch))
+        cached = await cache.get_or_fetch('first', fetch)
+        await cache.get_or_fetch('second', fetch)
+        await cache.get_or_fetch('third', fetch)
+        return coalesced, cached
+
+    coalesced, cached = loop.run_until_complete(fetch_routes())
+    _, loaded_trains = route_cache.load_page(route_cache.dump_page(page))
+
+    assert len(fetches) == 3
+    assert coalesced == [page, page] and cached == page
+    assert cache.get('first') is None and cache.get('third') == page
+    assert loaded_trains.numbers == page[1].numbers
+    assert [train.prices for train in loaded_trains.with_places] == \
+        [train.prices for train in page[1].with_places]
+
+
+def test_routes_sharded_between_workers(fake_db, monkeypatch):
+    first, second = shards.ShardWorker('first', lease=30), shards.ShardWorker('second', lease=30)
+    monkeypatch.setattr(shards, '_shard_worker', first)
+    urls = [f'https://pass.rzd.ru/tt/ru#code0={code}|code1=2004000|dt0=01.01.2030'
+            for code in range(2000000, 2000100)]
+
+    async def share_routes():
+        await first.heartbeat()
+        await second.heartbeat()
+        await first.heartbeat()
+        shared = [first.owns(url) for url in urls], [second.owns(url) for url in urls]
+        await second.leave()
+        await first.heartbeat()
+        claims = [await shards.claim_notification('tg-1', '2030-01-01 00:00:00')
+                  for _ in range(2)]
+        return shared, claims
+
+    (first_owns, second_owns), claims = loop.run_until_complete(share_routes())
+
+    assert all(owned != other_owned for owned, other_owned in zip(first_owns, second_owns))
+    assert 20 < sum(first_owns) < 80
+    assert all(first.owns(url) for url in urls)
+    assert claims == [True, False]
+
+
+def test_cancelled_hunter_leaves_shards(fake_db, monkeypatch):
+    worker = shards.ShardWorker('worker', lease=30)
+    monkeypatch.setattr(shards, '_shard_worker', worker)
+    monkeypatch.setattr(live_searches, '_live_searches', live_searches.LiveSearches(300))
+    search = Search('tg-1', 'https://pass.rzd.ru/tickets/public/ru', '780А', 1)
+
+    async def refresh():
+        return {search.search_id: search}
+
+    async def search_places_forever(searches):
+        sweep_started.set()
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(hunter, 'refresh_searches', refresh)
+    monkeypatch.setattr(hunter, 'search_places', search_places_forever)
+
+    async def cancel_mid_sweep():
+        hunting = asyncio.ensure_future(start_searching())
+        await asyncio.wait_for(sweep_started.wait(), 1)
+        await worker.heartbeat()
+        workers_before = await fake_db.zrange(shards.WORKERS_KEY)
+        hunting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await hunting
+        return workers_before, await fake_db.zrange(shards.WORKERS_KEY)
+
+    sweep_started = asyncio.Event()
+    workers_before, workers_after = loop.run_until_complete(cancel_mid_sweep())
+    assert workers_before == ['worker']
+    assert workers_after == []
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def hunter_state(monkeypatch):
+    monkeypatch.setattr(hunter, 'searches_index', search_index.SearchIndex())
+    monkeypatch.setattr(hunter, 'route_changes', changes.RouteChangesTracker())
+    monkeypatch.setattr(scheduler, '_route_scheduler', None)
+    monkeypatch.setattr(route_cache, '_route_cache', route_cache.RouteCache(ttl=0, max_bytes=0))
+    monkeypatch.setattr(shards, '_shard_worker', shards.ShardWorker('worker', lease=30))
+    bot = FakeBot()
+    monkeypatch.setattr(tg_bot, '_bot', bot)
+    return bot
+
+
+def test_route_checks_limited_by_workers(fake_db, hunter_state, monkeypatch):
+    monkeypatch.setenv('HUNTER_WORKERS', '2')
+    searches = {
+        f'tg-{code}': Search(
+            f'tg-{code}', f'https://pass.rzd.ru/tt/ru#code0={code}|code1=2004000|dt0=01.01.2030',
+            '780А', 1)
+        for code in range(2000000, 2000005)
+    }
+    fetching = []
+    max_fetching = 0
+
+    async def fetch_route(url):
+        nonlocal max_fetching
+        fetching.append(url)
+        max_fetching = max(max_fetching, len(fetching))
+        await asyncio.sleep(0.01)
+        fetching.remove(url)
+        return None, Trains([])
+
+    monkeypatch.setattr(hunter, 'fetch_route', fetch_route)
+    loop.run_until_complete(search_places(searches))
+
+    assert max_fetching == 2
+    assert scheduler.get_route_scheduler().pop_due_routes() == []
+
+
+def test_search_cancelled_during_check_not_notified(fake_db, hunter_state, monkeypatch):
+    url = 'https://pass.rzd.ru/tickets/public/ru'
+    search_info = {'url': url, 'train_numbers': '780А', 'price_limit': '1',
+                   'start_search_time': '2019-09-29 20:00:00'}
+    page = parser.parse_search_page(normal_response)
+
+    async def fetch_route(search_url):
+        # User cancels the first search while route page is loading
+        await utils.remove_search_from_db('tg-1:1')
+        return page
+
+    async def check_route():
+        for search_id in ('tg-1:1', 'tg-2:1'):
+            await fake_db.hmset_dict(search_id, search_info)
+        searches = await fetch_searches(['tg-1:1', 'tg-2:1'])
+        await search_places(searches)
+        await notifier.close_notifiers()
+
+    monkeypatch.setattr(hunter, 'fetch_route', fetch_route)
+    loop.run_until_complete(check_route())
+
+    assert hunter_state.sent == [
+        ('2', phrases.place_found.format(train_number='780А', time='21:00'))]
+
+
+def test_route_searches_evaluated_in_one_pass():
+    trains = Trains([
+        Train('001А', '10:00', TRAIN_WITH_PLACES, {'Купе': 5000, 'Плацкарт': 3000}),
+        Train('002А', '11:00', TRAIN_WITH_PLACES, {'Купе': 2500}),
+        Train('001А', '12:00', TRAIN_WITH_PLACES, {'Плацкарт': 2000}),
+        Train('003А', '13:00', TRAIN_GONE, {}),
+    ])
+    searches = [
+        Search('tg-1', 'url', '001А, 002А', 1),
+        Search('tg-2', 'url', '001А', 2000),
+        Search('tg-3', 'url', '001А', 1000),
+        Search('tg-4', 'url', '003А', 1),
+        Search('tg-5', 'url', '999А', 1),
+    ]
+
+    answers = {search.search_id: answer
+               for search, answer in evaluator.evaluate_searches(trains, searches)}
+
+    assert answers == {
+        'tg-1': phrases.place_found.format(train_number='001А', time='10:00'),
+        'tg-2': phrases.place_found_with_price.format(
+            train_number='001А', time='12:00', spaced_price='2 000'),
+        'tg-4': phrases.all_trains_gone,
+        'tg-5': phrases.bad_train_number,
+    }
+
+
+def test_searches_filtered_by_car_class_and_seats():
+    trains = Trains([
+        Train('001А', '10:00', TRAIN_WITH_PLACES, {'Плацкартный': 2000, 'Купе': 5000},
+              {'Плацкартный': 1, 'Купе': 4}),
+        Train('001А', '12:00', TRAIN_WITH_PLACES, {'Плацкартный': 2500}, {'Плацкартный': 3}),
+        Train('002А', '11:00', TRAIN_WITH_PLACES, {'СВ': 9000}),
+    ])
+    searches = [
+        Search('tg-1', 'url', '001А', 1, car_classes='купе'),
+        Search('tg-2', 'url', '001А', 3000, car_classes='плацкарт', min_seats=2),
+        Search('tg-3', 'url', '001А', 3000, car_classes='купе'),
+        Search('tg-4', 'url', '002А', 1, car_classes='св', min_seats=2),
+        Search('tg-5', 'url', '002А', 1, car_classes='люкс'),
+    ]
+
+    answers = {search.search_id: answer
+               for search, answer in evaluator.evaluate_searches(trains, searches)}
+
+    assert answers == {
+        'tg-1': phrases.place_found.format(train_number='001А', time='10:00'),
+        'tg-2': phrases.place_found_with_price.format(
+            train_number='001А', time='12:00', spaced_price='2 500'),
+        # Page doesn't show seats of the train, so it fits any number of seats
+        'tg-4': phrases.place_found.format(train_number='002А', time='11:00'),
+    }
+    assert parse_car_filter('Купе, СВ 2') == (['купе', 'св'], 2)
+    assert parse_car_filter('любые') == ([], 1)
+    assert parse_car_filter('купе и св') is None
+    assert parser.parse_number('4\xa0579') == parser.parse_number('4,579') == 4579
+
+
+def test_live_searches_updated_with_events(fake_db, monkeypatch):
+    hunter_searches = live_searches.LiveSearches(reconcile_interval=300)
+    monkeypatch.setattr(live_searches, '_live_searches', hunter_searches)
+    search_info = {
+        'url': 'https://pass.rzd.ru/tickets/public/ru',
+        'train_numbers': '780А',
+        'price_limit': '1',
+        'start_search_time': '2019-09-29 20:00:00',
+    }
+
+    async def create_and_cancel():
+        search_events = asyncio.ensure_future(
+            live_searches.listen_search_events(hunter_searches))
+        await hunter_searches.wait_for_events(1)
+        searches_before = dict(await refresh_searches())
+        await fake_db.hmset_dict('tg-1:1', search_info)
+        transaction = fake_db.multi_exec()
+        transaction.sadd(utils.SEARCHES_KEY, 'tg-1:1')
+        utils.publish_search_event(transaction, utils.SEARCH_CREATED, 'tg-1:1')
+        await transaction.execute()
+        await hunter_searches.wait_for_events(1)
+        searches_created = dict(await refresh_searches())
+        await utils.remove_search_from_db('tg-1:1')
+        await hunter_searches.wait_for_events(1)
+        searches_removed = dict(await refresh_searches())
+        search_events.cancel()
+        return searches_before, searches_created, searches_removed
+
+    searches_before, searches_created, searches_removed = loop.run_until_complete(
+        create_and_cancel())
+    assert searches_before == {}
+    assert list(searches_created) == ['tg-1:1']
+    assert searches_removed == {}
+    assert not hunter_searches.is_reconcile_due()
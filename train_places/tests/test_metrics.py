@@ -0,0 +1,40 @@
+"""Tests for metrics endpoint."""
+
+import asyncio
+import socket
+
+import aiohttp
+
+from train_places.utils import metrics
+
+
+loop = asyncio.get_event_loop()
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def test_metrics_served():
+    port = get_free_port()
+    parse_count = metrics.PARSE_SECONDS.get_count()
+    metrics.PARSE_SECONDS.observe(0.02)
+    metrics.NOTIFICATIONS.inc(result='sent')
+
+    async def get_metrics():
+        await metrics.start_metrics_server(port)
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f'http://localhost:{port}/metrics') as response:
+                    return await response.text()
+        finally:
+            await metrics.stop_metrics_server()
+
+    text = loop.run_until_complete(get_metrics())
+
+    assert metrics.PARSE_SECONDS.get_count() == parse_count + 1
+    assert '# TYPE hunter_parse_seconds histogram' in text
+    assert 'hunter_parse_seconds_bucket{le="0.025"}' in text
+    assert 'notifications_total{result="sent"}' in text
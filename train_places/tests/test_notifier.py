@@ -0,0 +1,71 @@
+"""Tests for telegram notifications queue."""
+
+import asyncio
+import time
+
+from aiogram.utils.exceptions import RetryAfter
+
+from train_places.utils import notifier
+
+
+loop = asyncio.get_event_loop()
+
+
+class FakeBot:
+    def __init__(self, retry_after_messages=()):
+        self.sent = []
+        self.retry_after_messages = set(retry_after_messages)
+
+    async def send_message(self, chat_id, text):
+        if text in self.retry_after_messages:
+            self.retry_after_messages.remove(text)
+            raise RetryAfter(0)
+        self.sent.append((chat_id, text, time.monotonic()))
+
+
+def make_notifier(bot):
+    return notifier.Notifier(bot, workers=3, rate=100, chat_interval=0.1, max_retries=2)
+
+
+def test_chat_messages_spaced():
+    bot = FakeBot(retry_after_messages=['second'])
+    chat_notifier = make_notifier(bot)
+    sent_searches = []
+
+    async def on_sent():
+        sent_searches.append('tg-1')
+
+    async def send():
+        chat_notifier.notify('1', 'first', on_sent=on_sent, key='tg-1')
+        duplicate_queued = chat_notifier.notify('1', 'first again', key='tg-1')
+        chat_notifier.notify('1', 'second')
+        chat_notifier.notify('2', 'other chat')
+        await chat_notifier.close()
+        return duplicate_queued
+
+    duplicate_queued = loop.run_until_complete(send())
+    chat_messages = [(text, sent_time) for chat_id, text, sent_time in bot.sent if chat_id == '1']
+
+    assert not duplicate_queued
+    assert sent_searches == ['tg-1']
+    assert [text for text, _ in chat_messages] == ['first', 'second']
+    assert chat_messages[1][1] - chat_messages[0][1] >= 0.1
+    assert ('2', 'other chat') in [(chat_id, text) for chat_id, text, _ in bot.sent]
+
+
+def test_failed_message_reported():
+    bot = FakeBot(retry_after_messages=['lost'])
+    chat_notifier = notifier.Notifier(bot, workers=1, rate=100, chat_interval=0, max_retries=0)
+    failed = []
+
+    async def on_failed():
+        failed.append('lost')
+
+    async def send():
+        chat_notifier.notify('1', 'lost', on_failed=on_failed)
+        await chat_notifier.close()
+
+    loop.run_until_complete(send())
+
+    assert failed == ['lost']
+    assert bot.sent == []
@@ -0,0 +1,148 @@
+"""Tests for rzd timetable api backend.
+
+Api is replaced with local server that replays recorded responses.
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import pathlib
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from train_places.hunter import rzd_api
+from train_places.hunter.hunter import check_trains
+from train_places.hunter.records import Search
+from train_places.phrases import phrases
+
+
+loop = asyncio.get_event_loop()
+
+path_dir = pathlib.Path(__file__).parent.absolute()
+
+with open(os.path.join(path_dir, 'rzd_responses', 'timetable_rid.json'), 'r') as f:
+    rid_response = f.read()
+
+with open(os.path.join(path_dir, 'rzd_responses', 'timetable.json'), 'r') as f:
+    timetable_response = f.read()
+
+search_url = 'https://pass.rzd.ru/tickets/public/ru?STRUCTURE_ID=735&layer_id=5371\
+#dir=0|tfl=3|checkSeats=0|st0=МОСКВА|code0=2000000|dt0=29.09.2019|st1=САНКТ-ПЕТЕРБУРГ|code1=2004000'
+
+# Moscow time when timetable was recorded
+recording_time = datetime.datetime(2019, 9, 29, 20, 37)
+
+
+async def fetch_from_local_server(requests, monkeypatch):
+    async def timetable_handler(request):
+        requests.append(dict(request.query))
+        if 'rid' in request.query:
+            return web.Response(text=timetable_response, content_type='text/html')
+        return web.Response(text=rid_response, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/timetable/public/ru', timetable_handler)
+    async with TestServer(app) as server:
+        monkeypatch.setenv('RZD_TIMETABLE_URL', str(server.make_url('/timetable/public/ru')))
+        timetable = await rzd_api.fetch_timetable(search_url)
+        await rzd_api.get_session().close()
+    return timetable
+
+
+def test_search_url_parsed():
+    assert rzd_api.parse_search_url(search_url) == {
+        'code0': '2000000', 'code1': '2004000', 'dt0': '29.09.2019'}
+    assert rzd_api.parse_search_url('https://pass.rzd.ru/tickets/public/ru') is None
+
+
+def test_timetable_fetched(monkeypatch):
+    monkeypatch.setenv('RZD_API_POLL_DELAY', '0')
+    requests = []
+    timetable = loop.run_until_complete(fetch_from_local_server(requests, monkeypatch))
+
+    assert timetable == json.loads(timetable_response)['tp'][0]
+    assert requests[0]['code0'] == '2000000'
+    assert requests[0]['dt0'] == '29.09.2019'
+    assert requests[1]['rid'] == str(json.loads(rid_response)['RID'])
+
+
+def test_found_places_with_price_in_timetable():
+    timetable = json.loads(timetable_response)['tp'][0]
+    trains = rzd_api.collect_timetable_trains(timetable, now=recording_time)
+    phrase = phrases.place_found_with_price.format(train_number='780А', time='21:00',
+                                                   spaced_price='4 520')
+    search = Search('tg-1', search_url, '122*С,780А', 5000)
+
+    answer = check_trains(trains, search)
+    assert answer == phrase
+
+
+def test_all_trains_gone_in_timetable():
+    timetable = json.loads(timetable_response)['tp'][0]
+    trains = rzd_api.collect_timetable_trains(timetable, now=recording_time)
+    search = Search('tg-1', search_url, '768А,757Н', 1)
+
+    answer = check_trains(trains, search)
+    assert answer == phrases.all_trains_gone
+
+
+def test_malformed_timetable_records_skipped():
+    timetable = json.loads(timetable_response)['tp'][0]
+    train_data = {train['number']: train for train in timetable['list']}
+    train_data['780А']['cars'][-1]['tariff'] = 'нет данных'
+    train_data['056А']['date0'] = None
+    train_data['026А']['cars'] = [None, 'купе', *train_data['026А']['cars']]
+    train_data['034А']['cars'] = None
+    del train_data['006А']['number']
+    timetable['list'].append('поезд')
+    trains = rzd_api.collect_timetable_trains(timetable, now=recording_time)
+    phrase = phrases.place_found_with_price.format(train_number='780А', time='21:00',
+                                                   spaced_price='4 579')
+    search = Search('tg-1', search_url, '122*С,780А', 5000)
+
+    assert check_trains(trains, search) == phrase
+    assert '056А' not in trains.numbers and '' not in trains.numbers
+    assert [train.prices for train in trains.with_places if train.number == '026А'] == [
+        {'Купе': 3333}]
+    assert '034А' in [train.number for train in trains.without_places]
+
+
+def test_malformed_timetable_answer_skipped(monkeypatch):
+    answers = iter(['[]', json.dumps({'result': 'OK', 'tp': 'поезда'})])
+
+    async def request_json(query):
+        return json.loads(next(answers))
+
+    monkeypatch.setattr(rzd_api, 'request_json', request_json)
+
+    assert loop.run_until_complete(rzd_api.fetch_timetable(search_url)) is None
+    assert loop.run_until_complete(rzd_api.fetch_timetable(search_url)) is None
+
+
+def test_simulator_timetable_fetched(monkeypatch):
+    from train_places.benchmarks import rzd_simulator
+
+    monkeypatch.setenv('RZD_API_POLL_DELAY', '0.05')
+    simulator = rzd_simulator.Simulator(latency=0, jitter=0, loading_time=0.1, open_share=0.5)
+    route = ('2000000', '2004000', '29.09.2019')
+
+    async def fetch_from_simulator():
+        async with TestServer(rzd_simulator.make_app(simulator)) as server:
+            monkeypatch.setenv('RZD_TIMETABLE_URL', str(server.make_url(
+                rzd_simulator.TIMETABLE_PATH)))
+            timetable = await rzd_api.fetch_timetable(search_url)
+            await rzd_api.close_session()
+        return timetable
+
+    timetable = loop.run_until_complete(fetch_from_simulator())
+    open_numbers = {
+        train['number'] for train in timetable['list']
+        if simulator.is_train_open(route, train['number'], simulator.get_period())
+    }
+    day_before = recording_time - datetime.timedelta(days=1)
+    trains = rzd_api.collect_timetable_trains(timetable, now=day_before)
+
+    assert simulator.requests_count >= 3
+    assert {train.number for train in trains.with_places} == open_numbers
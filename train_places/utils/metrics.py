@@ -0,0 +1,219 @@
+"""Metrics module.
+
+Counters, gauges and histograms of hunter and bot hot paths in Prometheus
+text format. Metrics are served by aiohttp on /metrics in the same process
+as bots, so dynos can be sized and regressions can be found.
+
+Module needs environment variables:
+    METRICS_PORT: Port of /metrics endpoint, endpoint isn't started if it isn't set.
+
+"""
+
+import contextlib
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+
+# Default histogram buckets, seconds
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_registry: List['Metric'] = []
+
+_metrics_runner = None
+
+
+class Metric:
+    """Base metric, every created metric is registered for /metrics."""
+
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        _registry.append(self)
+
+    def collect(self) -> List[str]:
+        """Get metric samples lines."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Get metric in Prometheus text format."""
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}',
+            *self.collect(),
+        ]
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Counter that only goes up."""
+
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase value of metric with labels."""
+        key = make_labels(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        """Get value of metric with labels."""
+        return self._values.get(make_labels(labels), 0)
+
+    def collect(self) -> List[str]:
+        return [f'{self.name}{format_labels(labels)} {value}'
+                for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set value of metric with labels."""
+        self._values[make_labels(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        """Decrease value of metric with labels."""
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Histogram of observed values with cumulative buckets."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = TIME_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        # Labels -> (bucket counts, sum, count)
+        self._values: Dict[Labels, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Add observed value to histogram with labels."""
+        key = make_labels(labels)
+        bucket_counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                bucket_counts[index] += 1
+        self._values[key] = (bucket_counts, total + value, count + 1)
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe duration of with block in seconds."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def get_count(self, **labels: str) -> int:
+        """Get number of observed values of histogram with labels."""
+        values = self._values.get(make_labels(labels))
+        return values[2] if values else 0
+
+    def collect(self) -> List[str]:
+        lines = []
+        for labels, (bucket_counts, total, count) in self._values.items():
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                bucket_labels = labels + (('le', str(bound)),)
+                lines.append(f'{self.name}_bucket{format_labels(bucket_labels)} {bucket_count}')
+            inf_labels = labels + (('le', '+Inf'),)
+            lines.append(f'{self.name}_bucket{format_labels(inf_labels)} {count}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {count}')
+        return lines
+
+
+def make_labels(labels: Dict[str, str]) -> Labels:
+    """Convert labels to hashable key."""
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(labels: Labels) -> str:
+    """Format labels in Prometheus text format, like {name="value"}."""
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def render_metrics() -> str:
+    """Get all metrics in Prometheus text format."""
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+
+# Hunter metrics
+DRIVER_START_SECONDS = Histogram(
+    'hunter_driver_start_seconds', 'Time of Chrome driver startup.')
+PAGE_LOAD_SECONDS = Histogram(
+    'hunter_page_load_seconds', 'Time of search page loading by driver.')
+PAGE_READY_POLLS = Histogram(
+    'hunter_page_ready_polls', 'Number of search page readiness polls.', buckets=COUNT_BUCKETS)
+PARSE_SECONDS = Histogram(
+    'hunter_parse_seconds', 'Time of search page parsing.')
+SWEEP_SECONDS = Histogram(
+    'hunter_sweep_seconds', 'Time of one sweep over due routes.')
+SWEEP_SEARCHES = Histogram(
+    'hunter_sweep_searches', 'Number of searches checked in one sweep.', buckets=COUNT_BUCKETS)
+ACTIVE_SEARCHES = Gauge(
+    'hunter_active_searches', 'Number of active searches.')
+REDIS_SECONDS = Histogram(
+    'redis_call_seconds', 'Time of Redis db calls.')
+ROUTE_CACHE_REQUESTS = Counter(
+    'hunter_route_cache_requests_total',
+    'Number of route cache requests by result (hit, redis_hit, coalesced, miss).')
+ROUTE_CACHE_EVICTIONS = Counter(
+    'hunter_route_cache_evictions_total', 'Number of pages evicted from full route cache.')
+ROUTE_CACHE_BYTES = Gauge(
+    'hunter_route_cache_bytes', 'Size of serialized pages in route cache.')
+
+# Notifications metrics
+NOTIFICATIONS = Counter(
+    'notifications_total', 'Number of telegram messages by result (queued, sent, failed).')
+NOTIFICATIONS_QUEUED = Gauge(
+    'notifications_queued', 'Number of telegram messages waiting to be sent.')
+
+# Bot metrics
+HANDLER_SECONDS = Histogram(
+    'bot_handler_seconds', 'Time of bot update handling.')
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """Metrics endpoint handler."""
+    return web.Response(text=render_metrics(), content_type='text/plain', charset='utf-8')
+
+
+async def start_metrics_server(port: Optional[int] = None) -> None:
+    """Start /metrics endpoint on METRICS_PORT, nothing is started if port isn't set."""
+    global _metrics_runner
+    port = port or int(os.environ.get('METRICS_PORT', 0))
+    if not port or _metrics_runner:
+        return
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    _metrics_runner = web.AppRunner(app)
+    await _metrics_runner.setup()
+    await web.TCPSite(_metrics_runner, port=port).start()
+
+
+async def stop_metrics_server() -> None:
+    """Stop /metrics endpoint."""
+    global _metrics_runner
+    if _metrics_runner:
+        await _metrics_runner.cleanup()
+        _metrics_runner = None
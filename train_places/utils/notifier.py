@@ -0,0 +1,198 @@
+"""Telegram notifications module.
+
+Messages are put into a queue and sent by worker tasks, so a burst of found
+places or error logs never blocks the code that produced them.
+
+Workers keep telegram limits: about 30 messages per second for the whole bot
+and 1 message per second for one chat. If telegram still answers with
+RetryAfter, bot waits the asked time and message is sent again, network
+errors are retried with exponential backoff.
+
+Module needs environment variables:
+    NOTIFIER_WORKERS: Number of sender tasks of one bot (default = 4).
+    NOTIFIER_RATE: Max number of messages per second for one bot (default = 30).
+    NOTIFIER_CHAT_INTERVAL: Min interval between messages to one chat in seconds
+                            (default = 1).
+    NOTIFIER_MAX_RETRIES: Max number of message send retries (default = 5).
+
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from aiogram import Bot
+from aiogram.utils.exceptions import NetworkError, RetryAfter
+
+from train_places.utils import metrics
+
+
+Callback = Callable[[], Awaitable[None]]
+
+_notifiers: Dict[int, 'Notifier'] = {}
+
+
+class Notification:
+    """Message waiting to be sent."""
+
+    __slots__ = ('chat_id', 'text', 'on_sent', 'on_failed', 'key')
+
+    def __init__(self, chat_id: str, text: str, on_sent: Optional[Callback],
+                 on_failed: Optional[Callback], key: Optional[Hashable]):
+        self.chat_id = chat_id
+        self.text = text
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.key = key
+
+
+class Notifier:
+    """Telegram messages queue of one bot."""
+
+    def __init__(self, bot: Bot, workers: int, rate: float, chat_interval: float,
+                 max_retries: int, on_error: Optional[Callback] = None):
+        self.bot = bot
+        self.workers = workers
+        self.interval = 1 / rate
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        # Called inside except block if message wasn't sent
+        self.on_error = on_error
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending_keys: Set[Hashable] = set()
+        # Send slots are reserved in advance, so limits are kept by all workers together
+        self._next_send_time = 0.0
+        self._next_chat_send_times: Dict[str, float] = {}
+
+    def notify(self, chat_id: str, text: str, on_sent: Optional[Callback] = None,
+               on_failed: Optional[Callback] = None, key: Optional[Hashable] = None) -> bool:
+        """Put message into queue.
+
+        Args:
+            chat_id: Telegram chat id.
+            text: Message text.
+            on_sent: Coroutine function called after message is sent.
+            on_failed: Coroutine function called if message wasn't sent.
+            key: Message key, message isn't queued while message with the same key is pending.
+
+        Returns:
+            queued: False if message with the same key is pending.
+        """
+        if key is not None:
+            if key in self._pending_keys:
+                return False
+            self._pending_keys.add(key)
+        if not self._queue:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+        self._queue.put_nowait(Notification(chat_id, text, on_sent, on_failed, key))
+        metrics.NOTIFICATIONS.inc(result='queued')
+        metrics.NOTIFICATIONS_QUEUED.inc()
+        return True
+
+    def is_pending(self, key: Hashable) -> bool:
+        """Check if message with the key is waiting to be sent."""
+        return key in self._pending_keys
+
+    async def close(self, timeout: float = 10) -> None:
+        """Wait for queued messages to be sent and stop workers.
+
+        Args:
+            timeout: Max time to wait for queued messages in seconds.
+        """
+        if not self._queue:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f'{self._queue.qsize()} telegram messages weren\'t sent')
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queue, self._tasks = None, []
+
+    async def _work(self) -> None:
+        while True:
+            notification = await self._queue.get()  # type: ignore
+            metrics.NOTIFICATIONS_QUEUED.dec()
+            try:
+                await self._send(notification)
+                metrics.NOTIFICATIONS.inc(result='sent')
+            except Exception:
+                metrics.NOTIFICATIONS.inc(result='failed')
+                if self.on_error:
+                    await self._call(self.on_error)
+                else:
+                    print(f'Message to {notification.chat_id} wasn\'t sent')
+                if notification.on_failed:
+                    await self._call(notification.on_failed)
+            finally:
+                self._pending_keys.discard(notification.key)
+                self._queue.task_done()  # type: ignore
+
+    @staticmethod
+    async def _call(callback: Callback) -> None:
+        try:
+            await callback()
+        except Exception:
+            pass
+
+    async def _send(self, notification: Notification) -> None:
+        for retry in range(self.max_retries + 1):
+            await self._wait_for_send_slot(notification.chat_id)
+            try:
+                await self.bot.send_message(notification.chat_id, notification.text)
+                break
+            except RetryAfter as ex:
+                if retry == self.max_retries:
+                    raise
+                # Limit is exceeded for the whole bot, so other workers wait too
+                self._next_send_time = max(self._next_send_time, time.monotonic() + ex.timeout)
+            except NetworkError:
+                if retry == self.max_retries:
+                    raise
+                await asyncio.sleep(2 ** retry)
+        if notification.on_sent:
+            await notification.on_sent()
+
+    async def _wait_for_send_slot(self, chat_id: str) -> None:
+        now = time.monotonic()
+        send_time = max(now, self._next_send_time, self._next_chat_send_times.get(chat_id, 0))
+        self._next_send_time = send_time + self.interval
+        self._next_chat_send_times[chat_id] = send_time + self.chat_interval
+        # Chats without planned messages are forgotten
+        if len(self._next_chat_send_times) > 1000:
+            self._next_chat_send_times = {
+                chat: chat_time for chat, chat_time in self._next_chat_send_times.items()
+                if chat_time > now
+            }
+        await asyncio.sleep(send_time - now)
+
+
+def get_notifier(bot: Bot, on_error: Optional[Callback] = None) -> Notifier:
+    """Get messages queue of bot (Singletone for every bot).
+
+    Args:
+        bot: Telegram bot.
+        on_error: Coroutine function called inside except block if message wasn't sent.
+                  Used only when notifier is created.
+    """
+    notifier = _notifiers.get(id(bot))
+    if not notifier:
+        notifier = _notifiers[id(bot)] = Notifier(
+            bot,
+            workers=int(os.environ.get('NOTIFIER_WORKERS', 4)),
+            rate=float(os.environ.get('NOTIFIER_RATE', 30)),
+            chat_interval=float(os.environ.get('NOTIFIER_CHAT_INTERVAL', 1)),
+            max_retries=int(os.environ.get('NOTIFIER_MAX_RETRIES', 5)),
+            on_error=on_error,
+        )
+    return notifier
+
+
+async def close_notifiers() -> None:
+    """Send queued messages of all bots and stop workers."""
+    for notifier in list(_notifiers.values()):
+        await notifier.close()
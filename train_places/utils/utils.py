@@ -3,37 +3,94 @@
 Core funcs:
     handle_exception()
     remove_search_from_db()
+    publish_search_event()
     get_db_connection()
+    close_db_connection()
     get_logger_bot()
+    normalize_url()
 
 """
 
-import asyncio
 import datetime
 import os
 import traceback
 from typing import Optional, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 from aiogram import Bot
-from redis import Redis
+import aioredis
 
+from train_places.utils import metrics, notifier
+
+
+# Db key of set with ids of all completed searches
+SEARCHES_KEY = 'searches'
+# Db key prefix of set with ids of chat searches, chat key is added to it
+CHAT_SEARCHES_PREFIX = 'chat_searches:'
+# Db key prefix of chat search numbers counter
+SEARCH_COUNTER_PREFIX = 'search_counter:'
+# Db channel of search lifecycle events, hunter keeps live searches with them
+SEARCH_EVENTS_CHANNEL = 'search_events'
+SEARCH_CREATED = 'created'
+SEARCH_REMOVED = 'removed'
 
 _log_bot = None
 
 _db_connetion = None
 
 
-async def remove_search_from_db(chat_id: str) -> None:
-    """Remove search from db.
+async def remove_search_from_db(search_id: str) -> None:
+    """Remove search from db, from searches index and from chat searches.
 
     Args:
-        chat_id: Db key for search.
+        search_id: Db key for search.
 
     Returns:
         None
     """
-    db = get_db_connection()
-    db.delete(chat_id)
+    db = await get_db_connection()
+    transaction = db.multi_exec()
+    transaction.delete(search_id)
+    transaction.srem(SEARCHES_KEY, search_id)
+    transaction.srem(get_chat_searches_key(get_chat_key(search_id)), search_id)
+    publish_search_event(transaction, SEARCH_REMOVED, search_id)
+    with metrics.REDIS_SECONDS.time(operation='remove_search'):
+        await transaction.execute()
+
+
+def publish_search_event(transaction: aioredis.commands.MultiExec, event: str,
+                         search_id: str) -> None:
+    """Add search event publishing to transaction that changes search.
+
+    Event is published only if search change is applied, hunter refetches
+    search when it gets event, see hunter/live_searches.py.
+
+    Args:
+        transaction: Db transaction.
+        event: Search event, SEARCH_CREATED or SEARCH_REMOVED.
+        search_id: Db key for search.
+    """
+    transaction.publish_json(SEARCH_EVENTS_CHANNEL, {'event': event, 'search_id': search_id})
+
+
+def get_chat_key(search_id: str) -> str:
+    """Get chat key of search.
+
+    Search id is chat key with search number, like "tg-123:2". Searches made
+    before several searches per chat were allowed have chat key as id.
+
+    Args:
+        search_id: Db key for search.
+
+    Returns:
+        chat_key: Chat id with platform prefix ('tg-' for telegram).
+    """
+    return search_id.split(':', 1)[0]
+
+
+def get_chat_searches_key(chat_key: str) -> str:
+    """Get db key of set with ids of chat searches."""
+    return f'{CHAT_SEARCHES_PREFIX}{chat_key}'
 
 
 def get_log_traceback(logger_name: str):
@@ -69,18 +126,37 @@ async def handle_exception(log_bot: Bot, logger_name: str, text: Optional[str] =
     await send_error_log_async_to_telegram(log_bot, log_traceback)
 
 
-def get_db_connection():
-    """Get Redis db connection (Singletone)."""
+async def get_db_connection() -> aioredis.Redis:
+    """Get Redis db connections pool (Singletone).
+
+    Values are decoded to str by connection, pool size is set with
+    DB_POOL_SIZE environment variable (default = 10).
+    """
     global _db_connetion
     if not _db_connetion:
-        _db_connetion = Redis(
-            host=os.environ['DB_HOST'],
-            port=os.environ['DB_PORT'],
+        db_connection = await aioredis.create_redis_pool(
+            f'redis://{os.environ["DB_HOST"]}:{os.environ["DB_PORT"]}',
             password=os.environ['DB_PASS'],
+            encoding='UTF-8',
+            maxsize=int(os.environ.get('DB_POOL_SIZE', 10)),
         )
+        # Other coroutine could create pool while this one was connecting
+        if _db_connetion:
+            db_connection.close()
+        else:
+            _db_connetion = db_connection
     return _db_connetion
 
 
+async def close_db_connection() -> None:
+    """Close Redis db connections pool."""
+    global _db_connetion
+    if _db_connetion:
+        _db_connetion.close()
+        await _db_connetion.wait_closed()
+        _db_connetion = None
+
+
 def split_text_on_parts(text: str, part_max_length: int) -> List[str]:
     """Split text on parts with part max length.
 
@@ -120,6 +196,9 @@ def get_logger_bot():
 async def send_error_log_async_to_telegram(logger_bot: Bot, text: str) -> None:
     """Send error log asynchronously to tg logger.
 
+    Log parts are put into logger bot messages queue, so caller doesn't wait
+    for telegram, see notifier module.
+
     Args:
         logger_bot: Logger bot.
         text: Error log text.
@@ -129,15 +208,15 @@ async def send_error_log_async_to_telegram(logger_bot: Bot, text: str) -> None:
     """
     chat_id = os.environ.get('TG_LOG_CHAT_ID')
     message_max_length = 4096
+    log_notifier = notifier.get_notifier(logger_bot)
 
     if len(text) <= message_max_length:
-        await logger_bot.send_message(chat_id, text)
+        log_notifier.notify(chat_id, text)  # type: ignore
         return
 
     parts = split_text_on_parts(text, message_max_length)
     for part in parts:
-        await logger_bot.send_message(chat_id, part)
-        await asyncio.sleep(0)
+        log_notifier.notify(chat_id, part)  # type: ignore
 
 
 def parse_train_numbers(train_numbers: str) -> List[str]:
@@ -159,3 +238,20 @@ def parse_train_numbers(train_numbers: str) -> List[str]:
         if '*' in train_number:
             parsed_numbers.append(train_number.replace('*', ''))
     return parsed_numbers
+
+
+def normalize_url(url: str) -> str:
+    """Normalize search url, so urls of the same search page are equal.
+
+    Scheme and host are lowercased, query parameters are sorted. Fragment is
+    kept, rzd.ru stores search parameters there.
+
+    Args:
+        url: Search url from user.
+
+    Returns:
+        normalized_url: Normalized url.
+    """
+    scheme, netloc, path, query, fragment = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return urlunsplit((scheme.lower(), netloc.lower(), path, query, fragment))